@@ -1,21 +1,14 @@
 from typing import List, Tuple
-from backend.models import SessionState, OrderItem, Reservation
-from backend.rag import load_menu, get_retriever
+from backend.models import SessionState, Reservation
+from backend.rag import retrieve
+from backend.menu_catalog import get_catalog
+from backend.orders import MAX_QUANTITY, get_order, vat_label
 import re
 
 
-# Load menu data
-MENU = load_menu()
-RETRIEVER = get_retriever()
-
-
 def find_menu_item_by_name(name: str):
     """Find menu item by partial name match."""
-    name_lower = name.lower()
-    for item in MENU:
-        if name_lower in item["name"].lower():
-            return item
-    return None
+    return get_catalog().find_by_name(name)
 
 
 def add_item_to_order(state: SessionState, dish_name: str, quantity: int = 1) -> Tuple[SessionState, str]:
@@ -25,25 +18,23 @@ def add_item_to_order(state: SessionState, dish_name: str, quantity: int = 1) ->
     if not item_data:
         return state, f"Sorry, I could not find a dish matching '{dish_name}'. Please check the menu."
     
-    # Check if item already in order
-    existing = next((i for i in state.current_order if i.item_id == item_data["id"]), None)
-    
-    if existing:
-        existing.quantity += quantity
-    else:
-        state.current_order.append(
-            OrderItem(
-                item_id=item_data["id"],
-                name=item_data["name"],
-                quantity=quantity,
-                price=item_data["price"],
-            )
-        )
-    
-    # Recalculate total
-    state.current_total = sum(i.price * i.quantity for i in state.current_order)
+    return add_items_to_order(state, [(item_data, quantity)])
+
+
+def add_items_to_order(state: SessionState, items: List[Tuple[dict, int]]) -> Tuple[SessionState, str]:
+    """Add several (menu item, quantity) lines in one update."""
+    # Merges with existing lines and updates the totals
+    order = get_order(state)
+    before = {item["id"]: order.room(item["id"]) for item, _ in items}
+    lines = order.add_many(items)
     
-    return state, f"Added {quantity} x {item_data['name']} to your order. Current total is €{state.current_total:.2f}."
+    names = {line.item_id: line.name for line in lines}
+    added = [f"{before[item_id] - order.room(item_id)} x {name}" for item_id, name in names.items()]
+    listing = ", ".join(added[:-1]) + " and " + added[-1] if len(added) > 1 else added[0]
+    reply = f"Added {listing} to your order. Current total is €{order.subtotal:.2f}."
+    if sum(quantity for _, quantity in items) > sum(before.values()) - sum(map(order.room, before)):
+        reply += f" (We take at most {MAX_QUANTITY} of one dish per order.)"
+    return state, reply
 
 
 def remove_item_from_order(state: SessionState, dish_name: str) -> Tuple[SessionState, str]:
@@ -53,13 +44,10 @@ def remove_item_from_order(state: SessionState, dish_name: str) -> Tuple[Session
     if not item_data:
         return state, f"Sorry, I could not find '{dish_name}' in the menu."
     
-    # Find and remove item
-    state.current_order = [i for i in state.current_order if i.item_id != item_data["id"]]
-    
-    # Recalculate total
-    state.current_total = sum(i.price * i.quantity for i in state.current_order)
+    order = get_order(state)
+    order.remove(item_data["id"])
     
-    return state, f"Removed {item_data['name']} from your order. Current total is €{state.current_total:.2f}."
+    return state, f"Removed {item_data['name']} from your order. Current total is €{order.subtotal:.2f}."
 
 
 def set_allergens(state: SessionState, allergens: List[str]) -> Tuple[SessionState, str]:
@@ -75,10 +63,8 @@ def check_dish_allergens(dish_name: str, allergens: List[str]) -> str:
     if not item:
         return f"I could not find a dish named '{dish_name}'."
     
-    dish_allergens = [a.lower() for a in item["allergens"]]
     user_allergens_lower = [a.lower() for a in allergens]
-    
-    risky = [a for a in user_allergens_lower if a in dish_allergens]
+    risky = get_catalog().allergens.conflicts(item, user_allergens_lower)
     
     if risky:
         return f"⚠️ Warning: {item['name']} contains {', '.join(risky)}. This dish is NOT safe for you."
@@ -94,7 +80,7 @@ def make_reservation(state: SessionState, date: str, time: str, people: int) ->
 
 def answer_with_rag(question: str, user_allergens: List[str]) -> str:
     """Answer questions using RAG over menu and FAQ."""
-    docs = RETRIEVER.invoke(question)
+    docs = retrieve(question)
     
     if not docs:
         return "I'm sorry, I couldn't find relevant information. Please ask about our menu, allergens, or policies."
@@ -121,15 +107,13 @@ def get_order_summary(state: SessionState) -> str:
     if not state.current_order:
         return "Your order is currently empty."
     
+    order = get_order(state)
     lines = ["Your current order:"]
-    for item in state.current_order:
-        line_total = item.price * item.quantity
-        lines.append(f"  • {item.quantity}x {item.name} - €{line_total:.2f}")
-    
-    lines.append(f"\nSubtotal: €{state.current_total:.2f}")
-    vat = state.current_total * 0.12
-    total = state.current_total + vat
-    lines.append(f"VAT (12%): €{vat:.2f}")
-    lines.append(f"Total: €{total:.2f}")
+    for item in order.lines:
+        lines.append(f"  • {item.quantity}x {item.name} - €{order.line_total(item):.2f}")
+    
+    lines.append(f"\nSubtotal: €{order.subtotal:.2f}")
+    lines.append(f"{vat_label()}: €{order.vat:.2f}")
+    lines.append(f"Total: €{order.total:.2f}")
     
     return "\n".join(lines)
@@ -0,0 +1,76 @@
+"""
+Allergen vocabulary and per-item bitmasks for fast dish safety checks.
+"""
+from typing import Dict, Iterable, List
+
+
+# Allergens we recognise in user messages
+COMMON_ALLERGENS = [
+    "milk", "dairy", "eggs", "fish", "shellfish", "nuts",
+    "peanuts", "wheat", "gluten", "soy", "sesame", "sulfites",
+]
+
+# Alternative names that refer to the same allergen
+ALLERGEN_ALIASES = {
+    "dairy": "milk",
+}
+
+
+def canonical_allergen(name: str) -> str:
+    """Normalize an allergen name to its canonical form."""
+    name = name.lower().strip()
+    return ALLERGEN_ALIASES.get(name, name)
+
+
+class AllergenIndex:
+    """Maps each allergen to a bit and stores a precomputed mask per menu item."""
+
+    def __init__(self, items: List[Dict]):
+        self.bits: Dict[str, int] = {}
+        for name in COMMON_ALLERGENS:
+            self._add(name)
+
+        self.item_masks: Dict[str, int] = {}
+        for item in items:
+            mask = 0
+            for allergen in item.get("allergens", []):
+                mask |= self._add(allergen)
+            self.item_masks[item["id"]] = mask
+
+    def _add(self, name: str) -> int:
+        key = canonical_allergen(name)
+        if key not in self.bits:
+            self.bits[key] = 1 << len(self.bits)
+        return self.bits[key]
+
+    def bit(self, name: str) -> int:
+        """Get the bit for an allergen (0 if no dish can contain it)."""
+        return self.bits.get(canonical_allergen(name), 0)
+
+    def mask(self, allergens: Iterable[str]) -> int:
+        """Combine a list of allergen names into a single mask."""
+        mask = 0
+        for name in allergens or []:
+            mask |= self.bit(name)
+        return mask
+
+    def item_mask(self, item: Dict) -> int:
+        """Get the precomputed allergen mask of a menu item."""
+        mask = self.item_masks.get(item["id"])
+        if mask is None:
+            mask = self.mask(item.get("allergens", []))
+        return mask
+
+    def is_safe(self, item: Dict, user_mask: int) -> bool:
+        """Check a menu item against a mask built with mask()."""
+        return not (self.item_mask(item) & user_mask)
+
+    def conflicts_for_mask(self, dish_mask: int, allergens: Iterable[str]) -> List[str]:
+        """Return the given allergen names that are present in a dish mask."""
+        if not dish_mask:
+            return []
+        return [name for name in allergens or [] if self.bit(name) & dish_mask]
+
+    def conflicts(self, item: Dict, allergens: Iterable[str]) -> List[str]:
+        """Return the given allergen names that a menu item contains."""
+        return self.conflicts_for_mask(self.item_mask(item), allergens)
@@ -1,15 +1,19 @@
 """
 Advanced conversational AI that understands context and responds naturally.
 """
+import re
+
+HOURS_WORDS = {"open", "opening", "opens", "close", "closing", "closes", "hours"}
 
 
 def get_context_aware_response(user_message: str, state, last_action: str = None) -> str:
     """Generate contextually aware responses."""
     
     text = user_message.lower()
+    words = set(re.findall(r"[a-z]+", text))
     
-    # Restaurant hours
-    if any(w in text for w in ["open", "hours", "time", "when", "available"]):
+    # Restaurant hours (whole words, so "is the tiramisu available" is not about them)
+    if words & HOURS_WORDS or "what time" in text:
         if "reservation" in text or state.reservation or last_action == "reservation":
             return """We're open every day from **11:00 AM to 10:00 PM**.
 
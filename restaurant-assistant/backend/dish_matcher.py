@@ -0,0 +1,136 @@
+"""
+Prebuilt dish-name matcher: a token inverted index plus character-trigram
+indexes, so matching cost depends on the query rather than the menu size.
+"""
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Minimum trigram similarity for a misspelled word to count as a dish word
+FUZZY_TOKEN_THRESHOLD = 0.65
+
+
+def trigrams(text: str) -> Set[str]:
+    """Get the set of character trigrams of a string."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def name_tokens(text: str) -> Set[str]:
+    """Get the significant words of a dish name or query."""
+    return {w for w in text.split() if len(w) > 3}
+
+
+class DishMatcher:
+    """Scored dish lookup built once per menu version."""
+
+    def __init__(self, items: List[Dict]):
+        self.items = items
+        self.names: List[str] = [item["name"].lower() for item in items]
+        self.exact: Dict[str, int] = {}
+
+        # Word -> dishes containing it
+        self.token_index: Dict[str, Set[int]] = {}
+        # Trigram -> dishes whose name contains it (for substring matches)
+        self.name_trigram_index: Dict[str, Set[int]] = {}
+        self.name_trigram_counts: List[int] = []
+        # Names too short to have trigrams, checked directly
+        self.short_names: List[int] = []
+        # Trigram -> known words (for misspellings)
+        self.token_trigram_index: Dict[str, Set[str]] = {}
+        self.token_trigram_counts: Dict[str, int] = {}
+
+        for idx, name in enumerate(self.names):
+            self.exact.setdefault(name, idx)
+
+            grams = trigrams(name)
+            self.name_trigram_counts.append(len(grams))
+            if not grams:
+                self.short_names.append(idx)
+            for gram in grams:
+                self.name_trigram_index.setdefault(gram, set()).add(idx)
+
+            for token in name_tokens(name):
+                self.token_index.setdefault(token, set()).add(idx)
+
+        for token in self.token_index:
+            grams = trigrams(f" {token} ")
+            self.token_trigram_counts[token] = len(grams)
+            for gram in grams:
+                self.token_trigram_index.setdefault(gram, set()).add(token)
+
+    def _fuzzy_token(self, token: str) -> Tuple[Optional[str], float]:
+        """Find the known word closest to a misspelled one."""
+        grams = trigrams(f" {token} ")
+        shared: Dict[str, int] = {}
+        for gram in grams:
+            for known in self.token_trigram_index.get(gram, ()):
+                shared[known] = shared.get(known, 0) + 1
+
+        best, best_score = None, 0.0
+        for known, count in shared.items():
+            score = 2 * count / (len(grams) + self.token_trigram_counts[known])
+            if score > best_score or (score == best_score and best and known < best):
+                best, best_score = known, score
+
+        if best_score >= FUZZY_TOKEN_THRESHOLD:
+            return best, best_score
+        return None, 0.0
+
+    def _substring_scores(self, query: str) -> Dict[int, float]:
+        """Score dishes whose name contains the query or is contained in it."""
+        scores: Dict[int, float] = {}
+        grams = trigrams(query)
+
+        if grams:
+            shared: Dict[int, int] = {}
+            for gram in grams:
+                for idx in self.name_trigram_index.get(gram, ()):
+                    shared[idx] = shared.get(idx, 0) + 1
+            candidates = [
+                idx for idx, count in shared.items()
+                if count == len(grams) or count == self.name_trigram_counts[idx]
+            ]
+        else:
+            candidates = range(len(self.names))
+
+        for idx in list(candidates) + self.short_names:
+            name = self.names[idx]
+            if query in name or name in query:
+                scores[idx] = max(len(query), len(name))
+
+        return scores
+
+    def _token_scores(self, query: str) -> Dict[int, float]:
+        """Score dishes by the words they share with the query."""
+        scores: Dict[int, float] = {}
+        for token in name_tokens(query):
+            weight = 1.0
+            hits = self.token_index.get(token)
+            if hits is None:
+                known, weight = self._fuzzy_token(token)
+                hits = self.token_index.get(known, ()) if known else ()
+            for idx in hits:
+                scores[idx] = scores.get(idx, 0) + 20 * weight
+        return scores
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        """Return up to k (score, item) pairs, best first."""
+        query = query.lower().strip()
+        if not query:
+            return []
+
+        idx = self.exact.get(query)
+        if idx is not None:
+            return [(float("inf"), self.items[idx])]
+
+        scores = self._substring_scores(query)
+        for idx, score in self._token_scores(query).items():
+            if score > scores.get(idx, 0):
+                scores[idx] = score
+
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(score, self.items[idx]) for idx, score in ranked[:k]]
+
+    def best_match(self, query: str) -> Optional[Dict]:
+        """Return the best matching dish, or None."""
+        results = self.search(query, k=1)
+        return results[0][1] if results else None
@@ -0,0 +1,66 @@
+"""
+Blocking calls as values.
+
+Conversation logic is written as generators that yield the blocking calls
+they need (LLM requests, emails) and receive the results back. run_steps
+executes those calls inline; arun_steps awaits their async versions. One
+implementation of the logic then serves both the sync and async endpoints;
+astream_steps additionally streams the text of calls that support it.
+"""
+import asyncio
+from typing import Any, Generator
+
+
+class BlockingCall:
+    """A blocking function call; its async version runs in a worker thread."""
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self) -> Any:
+        return self.func(*self.args, **self.kwargs)
+
+    async def arun(self) -> Any:
+        return await asyncio.to_thread(self.run)
+
+
+def run_steps(steps: Generator) -> Any:
+    """Drive a step generator, running each yielded call inline."""
+    result = None
+    try:
+        while True:
+            result = steps.send(result).run()
+    except StopIteration as done:
+        return done.value
+
+
+async def astream_steps(steps: Generator):
+    """Drive a step generator, yielding ("token", text) while streamable calls
+    produce output and finally ("result", value) with the generator's return value.
+    """
+    result = None
+    try:
+        while True:
+            call = steps.send(result)
+            if hasattr(call, "astream"):
+                parts = []
+                async for token in call.astream():
+                    parts.append(token)
+                    yield "token", token
+                result = "".join(parts).strip() or None
+            else:
+                result = await call.arun()
+    except StopIteration as done:
+        yield "result", done.value
+
+
+async def arun_steps(steps: Generator) -> Any:
+    """Drive a step generator, awaiting each yielded call."""
+    result = None
+    try:
+        while True:
+            result = await steps.send(result).arun()
+    except StopIteration as done:
+        return done.value
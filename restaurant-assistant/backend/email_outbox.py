@@ -0,0 +1,564 @@
+"""
+Persistent email outbox.
+
+Emails are written to a SQLite queue and the chat turn moves on; a small
+pool of worker threads drains the queue in the background. Each worker
+keeps one authenticated SMTP session open and reuses it for every message
+until it sits idle for SMTP_IDLE_TIMEOUT, so STARTTLS and LOGIN are paid
+once per burst instead of once per email.
+
+Workers claim up to EMAIL_BATCH_SIZE due messages for one recipient domain
+at a time and send them over one session, pipelined when the server
+supports it (RFC 2920).
+
+Failed sends are retried with exponential backoff; after EMAIL_MAX_ATTEMPTS
+(or straight away for a permanent 5xx rejection) a message is dead-lettered
+and kept in the table for inspection. A message claimed by a worker that
+dies is picked up again once its lease runs out; every claim counts as an
+attempt, so a message that keeps taking its worker down is dead-lettered too.
+"""
+import os
+import random
+import re
+import smtplib
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OUTBOX_DB = os.getenv("EMAIL_OUTBOX_DB", "outbox.sqlite3")
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "10"))
+MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "6"))
+RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "5"))
+RETRY_MAX = float(os.getenv("EMAIL_RETRY_MAX", "600"))
+POLL_INTERVAL = 1.0
+
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# How long a claimed message stays invisible to other workers: long enough for
+# a whole batch to time out message by message, plus connecting
+LEASE = float(os.getenv("EMAIL_LEASE", str((EMAIL_BATCH_SIZE + 1) * SMTP_TIMEOUT)))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+# Plain local relays (or a test server) may not offer TLS
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+
+PENDING = "pending"
+SENDING = "sending"
+DEAD = "dead"
+
+# Recipient domain, for batching and per-domain queue depth
+_DOMAIN = "lower(substr(recipient, instr(recipient, '@') + 1))"
+
+
+# Characters an envelope address cannot carry: non-ASCII needs SMTPUTF8, which
+# we do not negotiate, and CR, LF or angle brackets would break the command line
+_BAD_ADDRESS = re.compile(r"[^\x21-\x7e]|[<>]")
+
+
+def _address_error(sender: str, recipients: List[str]) -> Optional[Exception]:
+    """A permanent rejection for addresses that cannot be sent as-is, else None."""
+    if _BAD_ADDRESS.search(sender):
+        return smtplib.SMTPSenderRefused(553, b"5.1.7 Sender address not valid for SMTP", sender)
+    refused = {r: (553, b"5.1.3 Recipient address not valid for SMTP") for r in recipients if _BAD_ADDRESS.search(r)}
+    if refused:
+        return smtplib.SMTPRecipientsRefused(refused)
+    return None
+
+
+def _dot_stuff(data: bytes) -> bytes:
+    """Message content as sent after DATA, terminator included."""
+    data = re.sub(rb"(?m)^\.", b"..", data)
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    return data + b".\r\n"
+
+
+class SmtpConnection:
+    """One SMTP session, opened on first use and reused across messages."""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, user: Optional[str] = None,
+                 password: Optional[str] = None, starttls: bool = SMTP_STARTTLS,
+                 timeout: float = SMTP_TIMEOUT, idle_timeout: float = SMTP_IDLE_TIMEOUT):
+        self.host = host or os.getenv("SMTP_SERVER")
+        self.port = port or int(os.getenv("SMTP_PORT", "587"))
+        self.user = user if user is not None else os.getenv("SMTP_USER")
+        self.password = password if password is not None else os.getenv("SMTP_PASS")
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self.opened = 0
+        self.sent = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self) -> smtplib.SMTP:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                smtp.starttls()
+            if self.user and self.password:
+                smtp.login(self.user, self.password)
+            # Learn the server's extensions (PIPELINING, SIZE) up front
+            smtp.ehlo_or_helo_if_needed()
+        except BaseException:
+            smtp.close()
+            raise
+        self.opened += 1
+        self._last_used = time.monotonic()
+        return smtp
+
+    def send(self, sender: str, recipients: List[str], message: bytes) -> None:
+        """Send one message, (re)connecting as needed; raises smtplib errors."""
+        error = _address_error(sender, recipients)
+        if error is not None:
+            raise error
+        self.close_if_idle()
+        reused = self._smtp is not None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.sendmail(sender, recipients, message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped a session we kept open; retry once on a new one
+            self.close()
+            if not reused:
+                raise
+            self._smtp = self._connect()
+            self._smtp.sendmail(sender, recipients, message)
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+            # The message was rejected but the session is still usable
+            raise
+        except BaseException:
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+        self.sent += 1
+
+    def send_many(self, messages: List[Tuple[str, List[str], bytes]]) -> List[Optional[Exception]]:
+        """Send (sender, recipients, message) tuples over this session.
+
+        Returns one entry per message: None if it was accepted, else the
+        error. With PIPELINING each message's MAIL, RCPT and DATA go out in
+        one write together with the previous message's content, so a batch
+        costs about one round trip per message instead of four.
+        """
+        self.close_if_idle()
+        if self._smtp is not None:
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self.close()
+        try:
+            if self._smtp is None:
+                self._smtp = self._connect()
+        except Exception as e:
+            return [e] * len(messages)
+
+        results: List[Optional[Exception]] = []
+        if not self._smtp.has_extn("pipelining"):
+            for sender, recipients, message in messages:
+                try:
+                    self.send(sender, recipients, message)
+                    results.append(None)
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        try:
+            self._pipeline(messages, results)
+        except (smtplib.SMTPException, OSError) as e:
+            # Session broke mid-batch; messages without a final reply get the error
+            self.close()
+            results += [e] * (len(messages) - len(results))
+        self._last_used = time.monotonic()
+        self.sent += results.count(None)
+        return results
+
+    def _pipeline(self, messages: List[Tuple[str, List[str], bytes]], results: list) -> None:
+        smtp = self._smtp
+        size = smtp.has_extn("size")
+        # Content of the previous message, written ahead of the next envelope
+        carry = b""
+        for sender, recipients, message in messages:
+            error = _address_error(sender, recipients)
+            if error is not None:
+                # Rejected without touching the wire; settle the previous message first
+                if carry:
+                    smtp.send(carry)
+                    results.append(self._data_result(smtp.getreply()))
+                    carry = b""
+                results.append(error)
+                continue
+
+            mail = f"MAIL FROM:<{sender}>" + (f" SIZE={len(message)}" if size else "")
+            commands = [mail] + [f"RCPT TO:<{r}>" for r in recipients] + ["DATA"]
+            smtp.send(carry + "".join(c + "\r\n" for c in commands).encode("ascii"))
+            if carry:
+                results.append(self._data_result(smtp.getreply()))
+                carry = b""
+
+            replies = [smtp.getreply() for _ in commands]
+            error = self._envelope_error(sender, recipients, replies)
+            if error is None:
+                carry = _dot_stuff(message)
+                continue
+            if replies[-1][0] == 354:
+                smtp.send(b".\r\n")
+                smtp.getreply()
+            smtp.rset()
+            results.append(error)
+
+        if carry:
+            smtp.send(carry)
+            results.append(self._data_result(smtp.getreply()))
+
+    @staticmethod
+    def _envelope_error(sender: str, recipients: List[str], replies: List[tuple]) -> Optional[Exception]:
+        code, resp = replies[0]
+        if code != 250:
+            return smtplib.SMTPSenderRefused(code, resp, sender)
+        refused = {r: reply for r, reply in zip(recipients, replies[1:-1]) if reply[0] not in (250, 251)}
+        if len(refused) == len(recipients):
+            return smtplib.SMTPRecipientsRefused(refused)
+        code, resp = replies[-1]
+        if code != 354:
+            return smtplib.SMTPDataError(code, resp)
+        return None
+
+    @staticmethod
+    def _data_result(reply: tuple) -> Optional[Exception]:
+        code, resp = reply
+        return None if code == 250 else smtplib.SMTPDataError(code, resp)
+
+    def close_if_idle(self) -> None:
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+
+def is_permanent(error: Exception) -> bool:
+    """True for 5xx rejections that will fail the same way on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        # A credentials problem; fixing the config lets queued mail through
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at RETRY_MAX."""
+    delay = min(RETRY_MAX, RETRY_BASE * 2 ** max(0, attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class Outbox:
+    """SQLite-backed queue of outgoing emails (WAL, safe to share between processes)."""
+
+    def __init__(self, path: str = OUTBOX_DB, max_attempts: int = MAX_ATTEMPTS, lease: float = LEASE):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY,"
+            " sender TEXT NOT NULL,"
+            " recipient TEXT NOT NULL,"
+            " message BLOB NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt REAL NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt)")
+        self._conn.commit()
+
+    def enqueue(self, sender: str, recipient: str, message: bytes) -> int:
+        """Store a message for delivery; returns its id."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO outbox (sender, recipient, message, status, next_attempt, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (sender, recipient, message, PENDING, now, now),
+            )
+            self._conn.commit()
+        self.wakeup.set()
+        return cur.lastrowid
+
+    def claim(self, limit: int = 1) -> List[Tuple]:
+        """Lease up to limit due messages: [(id, sender, recipient, message, attempts, created)].
+
+        All of them go to the same recipient domain, the one whose oldest
+        message has waited longest. Claiming counts as an attempt.
+        """
+        now = time.time()
+        with self._lock:
+            # Leased max_attempts times and never settled: it keeps crashing or stalling its worker
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, last_error = ?"
+                " WHERE status = ? AND next_attempt <= ? AND attempts >= ?",
+                (DEAD, "Lease expired on every attempt", SENDING, now, self.max_attempts),
+            )
+            rows = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt = ? WHERE id IN ("
+                " SELECT id FROM outbox WHERE status IN (?, ?) AND next_attempt <= ?"
+                f" AND {_DOMAIN} = ("
+                f"  SELECT {_DOMAIN} FROM outbox WHERE status IN (?, ?) AND next_attempt <= ?"
+                "   ORDER BY next_attempt LIMIT 1)"
+                " ORDER BY next_attempt LIMIT ?)"
+                " RETURNING id, sender, recipient, message, attempts, created",
+                (SENDING, now + self.lease, PENDING, SENDING, now, PENDING, SENDING, now, limit),
+            ).fetchall()
+            self._conn.commit()
+        # RETURNING gives no order guarantee
+        rows.sort(key=lambda row: row[0])
+        return rows
+
+    def mark_sent(self, message_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+            self._conn.commit()
+
+    def mark_failed(self, message_id: int, attempts: int, error: Exception) -> str:
+        """Schedule a retry, or dead-letter the message; returns its new status.
+
+        attempts is the count claim() returned, this attempt included.
+        """
+        status = DEAD if attempts >= self.max_attempts or is_permanent(error) else PENDING
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+                (status, attempts, time.time() + retry_delay(attempts), f"{type(error).__name__}: {error}"[:500],
+                 message_id),
+            )
+            self._conn.commit()
+        return status
+
+    def dead_letters(self, limit: int = 20) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, recipient, attempts, created, last_error FROM outbox WHERE status = ?"
+                " ORDER BY id DESC LIMIT ?",
+                (DEAD, limit),
+            ).fetchall()
+        return [
+            {"id": r[0], "recipient": r[1], "attempts": r[2], "created": r[3], "error": r[4]}
+            for r in rows
+        ]
+
+    def requeue_dead(self) -> int:
+        """Give dead-lettered messages a fresh set of attempts."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, next_attempt = ? WHERE status = ?",
+                (PENDING, time.time(), DEAD),
+            )
+            self._conn.commit()
+        self.wakeup.set()
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created) FROM outbox WHERE status != ?", (DEAD,)
+            ).fetchone()[0]
+            by_domain = self._conn.execute(
+                f"SELECT {_DOMAIN} AS domain, COUNT(*) AS n FROM outbox WHERE status != ?"
+                " GROUP BY domain ORDER BY n DESC LIMIT 10",
+                (DEAD,),
+            ).fetchall()
+        return {
+            "pending": counts.get(PENDING, 0),
+            "sending": counts.get(SENDING, 0),
+            "dead": counts.get(DEAD, 0),
+            "oldest_age": round(time.time() - oldest, 1) if oldest else 0.0,
+            "by_domain": dict(by_domain),
+        }
+
+
+class OutboxWorkers:
+    """Threads draining an Outbox, each over its own reused SMTP connection."""
+
+    def __init__(self, outbox: Outbox, workers: int = EMAIL_WORKERS, batch_size: int = EMAIL_BATCH_SIZE,
+                 connection_factory=SmtpConnection, poll_interval: float = POLL_INTERVAL):
+        self.outbox = outbox
+        self.workers = workers
+        self.batch_size = batch_size
+        self.connection_factory = connection_factory
+        self.poll_interval = poll_interval
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._connections: List[SmtpConnection] = []
+
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.batches = 0
+        self.total_send_time = 0.0
+        self.total_delivery_time = 0.0
+        # Recent per-message send times, for percentiles
+        self.send_times: deque = deque(maxlen=1000)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"email-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"📧 Email outbox: {self.workers} workers on {self.outbox.path}")
+
+    def stop(self, timeout: float = 10) -> None:
+        """Finish the messages in hand and close the SMTP sessions."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self.outbox.wakeup.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        connection = self.connection_factory()
+        with self._lock:
+            self._connections.append(connection)
+        try:
+            while not self._stop.is_set():
+                try:
+                    # Clear before looking, so an enqueue after an empty claim still wakes us
+                    self.outbox.wakeup.clear()
+                    jobs = self.outbox.claim(self.batch_size)
+                    if not jobs:
+                        connection.close_if_idle()
+                        self.outbox.wakeup.wait(self.poll_interval)
+                        continue
+                    self._deliver(connection, jobs)
+                except Exception as e:
+                    # Keep the worker alive; unfinished jobs come back when their lease runs out
+                    print(f"❌ Email worker error: {type(e).__name__}: {e}")
+                    connection.close()
+                    self._stop.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: SmtpConnection, jobs: List[Tuple]) -> None:
+        started = time.monotonic()
+        if len(jobs) == 1:
+            _, sender, recipient, message, _, _ = jobs[0]
+            try:
+                connection.send(sender, [recipient], message)
+                results = [None]
+            except Exception as e:
+                results = [e]
+        else:
+            results = connection.send_many([(job[1], [job[2]], job[3]) for job in jobs])
+        per_message = (time.monotonic() - started) / len(jobs)
+
+        with self._lock:
+            self.batches += 1
+        for job, error in zip(jobs, results):
+            self._finish(job, error, per_message)
+
+    def _finish(self, job: Tuple, error: Optional[Exception], send_time: float) -> None:
+        message_id, sender, recipient, message, attempts, created = job
+        if error is not None:
+            status = self.outbox.mark_failed(message_id, attempts, error)
+            with self._lock:
+                if status == DEAD:
+                    self.dead_lettered += 1
+                else:
+                    self.retried += 1
+            if status == DEAD:
+                print(f"❌ Email to {recipient} dead-lettered after {attempts} attempts: {error}")
+            else:
+                print(f"⚠️ Email to {recipient} failed, will retry: {error}")
+            return
+
+        self.outbox.mark_sent(message_id)
+        with self._lock:
+            self.sent += 1
+            self.total_send_time += send_time
+            self.total_delivery_time += time.time() - created
+            self.send_times.append(send_time)
+        print(f"✅ Email sent to {recipient}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            sent = self.sent
+            recent = sorted(self.send_times)
+            return {
+                "workers": len(self._threads),
+                "sent": sent,
+                "retried": self.retried,
+                "dead_lettered": self.dead_lettered,
+                "batches": self.batches,
+                "avg_batch": round(sent / self.batches, 1) if self.batches else 0.0,
+                "smtp_connections": sum(c.opened for c in self._connections),
+                "avg_send_ms": round(self.total_send_time / sent * 1000, 1) if sent else 0.0,
+                "p95_send_ms": round(recent[int(len(recent) * 0.95)] * 1000, 1) if recent else 0.0,
+                "avg_delivery_s": round(self.total_delivery_time / sent, 2) if sent else 0.0,
+            }
+
+
+_OUTBOX: Optional[Outbox] = None
+_WORKERS: Optional[OutboxWorkers] = None
+_INIT_LOCK = threading.Lock()
+
+
+def get_outbox() -> OutboxWorkers:
+    """The process-wide outbox and its workers, created and started on first use."""
+    global _OUTBOX, _WORKERS
+    if _WORKERS is None:
+        with _INIT_LOCK:
+            if _WORKERS is None:
+                _OUTBOX = Outbox()
+                _WORKERS = OutboxWorkers(_OUTBOX)
+    _WORKERS.start()
+    return _WORKERS
+
+
+def queue_email(sender: str, recipient: str, message: bytes) -> int:
+    """Hand a message to the background workers; returns its outbox id."""
+    return get_outbox().outbox.enqueue(sender, recipient, message)
+
+
+def stop_outbox() -> None:
+    if _WORKERS is not None:
+        _WORKERS.stop()
+
+
+def outbox_stats() -> dict:
+    if _WORKERS is None:
+        return {"started": False}
+    return {"started": True, **_WORKERS.outbox.stats(), **_WORKERS.stats()}
@@ -1,11 +1,47 @@
-import smtplib
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
+from backend.email_outbox import SmtpConnection, queue_email
+from backend.mcp_email_server.client import EmailServerClient, EmailServerError, EmailServerNoReply
 
 load_dotenv()
 
+# 1: emails go through the background outbox (see backend.email_outbox);
+# 0: sent inside the request, as before
+EMAIL_OUTBOX = os.getenv("EMAIL_OUTBOX", "1") == "1"
+# host:port of the email server process; when set, it delivers instead of this process.
+# EMAIL_SERVER_TOKEN must match the one the server was started with.
+EMAIL_SERVER = os.getenv("EMAIL_SERVER", "")
+EMAIL_SERVER_CLIENT = EmailServerClient(EMAIL_SERVER) if EMAIL_SERVER else None
+
+
+def _deliver(msg: MIMEMultipart) -> None:
+    """Hand the message to the email server or the local outbox, or send it right away."""
+    sender, recipient = msg['From'], msg['To']
+    # SMTP wants CRLF line endings; sendmail() leaves bytes untouched
+    data = msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
+    if EMAIL_SERVER_CLIENT is not None:
+        try:
+            EMAIL_SERVER_CLIENT.send_email(sender, recipient, data)
+            print(f"📨 Email to {recipient} handed to the email server")
+            return
+        except EmailServerNoReply as e:
+            # It may already be queued there; a local copy could be sent twice
+            print(f"⚠️ {e}; not queueing another copy")
+            return
+        except EmailServerError as e:
+            if not EMAIL_OUTBOX:
+                raise
+            print(f"⚠️ {e}; queueing locally")
+    if EMAIL_OUTBOX:
+        queue_email(sender, recipient, data)
+        print(f"📨 Email to {recipient} queued")
+        return
+    with SmtpConnection() as connection:
+        connection.send(sender, [recipient], data)
+    print(f"✅ Email sent successfully to {recipient}")
+
 
 def send_bill_email(recipient: str, html_content: str) -> bool:
     """Send bill via email."""
@@ -18,12 +54,7 @@ def send_bill_email(recipient: str, html_content: str) -> bool:
         html_part = MIMEText(html_content, 'html')
         msg.attach(html_part)
         
-        with smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT'))) as server:
-            server.starttls()
-            server.login(os.getenv('SMTP_USER'), os.getenv('SMTP_PASS'))
-            server.send_message(msg)
-        
-        print(f"✅ Email sent successfully to {recipient}")
+        _deliver(msg)
         return True
     
     except Exception as e:
@@ -73,12 +104,7 @@ def send_reservation_confirmation(recipient: str, reservation_details: dict, ord
         
         msg.attach(MIMEText(html, 'html'))
         
-        with smtplib.SMTP(os.getenv('SMTP_SERVER'), int(os.getenv('SMTP_PORT'))) as server:
-            server.starttls()
-            server.login(os.getenv('SMTP_USER'), os.getenv('SMTP_PASS'))
-            server.send_message(msg)
-        
-        print(f"✅ Reservation email sent to {recipient}")
+        _deliver(msg)
         return True
     
     except Exception as e:
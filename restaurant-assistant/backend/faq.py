@@ -0,0 +1,137 @@
+"""
+Nearest-neighbour FAQ lookup for the deterministic answer tier.
+
+Each line of faq.txt is a TF-IDF vector over lightly stemmed content words;
+a question is answered with the closest line when the cosine similarity
+clears FAQ_THRESHOLD and the two share at least FAQ_MIN_TERMS content words
+(or every content word of a shorter question). One rare shared word, such as
+"discount" in a question about students, is not enough. Both settings are
+calibrated against the questions in tests/test_faq.py. No model is involved,
+so a lookup takes microseconds.
+"""
+import math
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from backend.rag import FAQ_PATH
+
+FAQ_THRESHOLD = float(os.getenv("FAQ_THRESHOLD", "0.35"))
+FAQ_MIN_TERMS = int(os.getenv("FAQ_MIN_TERMS", "2"))
+
+STOP_WORDS = {
+    "the", "and", "for", "are", "you", "your", "our", "can", "all", "any", "with", "what",
+    "does", "how", "have", "has", "from", "when", "which", "who", "will", "this", "that",
+    "there", "their", "about", "into", "upon", "than", "then", "would", "could", "should",
+    "tell", "please", "is", "do", "we", "us", "me", "my", "a", "an", "to", "of", "on", "in",
+    "get", "make", "take", "want", "like", "need", "much", "many", "some", "also", "just",
+}
+
+# A few everyday words mapped onto the wording used in the FAQ
+SYNONYMS = {
+    "kid": "child",
+    "kids": "child",
+    "children": "child",
+    "wi": "wifi",
+    "internet": "wifi",
+    "tax": "vat",
+    "takeout": "takeaway",
+    "booking": "reservation",
+    "book": "reservation",
+    "reserve": "reservation",
+    "allergy": "allergies",
+    "pay": "payment",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _terms(text: str) -> List[str]:
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOP_WORDS or len(word) < 3 and word not in SYNONYMS:
+            continue
+        word = SYNONYMS.get(word, word)
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+
+class FaqIndex:
+    """TF-IDF vectors for the FAQ lines."""
+
+    def __init__(self, lines: List[str], mtime_ns: int = 0):
+        self.lines = lines
+        self.mtime_ns = mtime_ns
+
+        doc_terms = [set(_terms(line)) for line in lines]
+        n = len(lines)
+        df: Dict[str, int] = {}
+        for terms in doc_terms:
+            for t in terms:
+                df[t] = df.get(t, 0) + 1
+        self.idf = {t: math.log((n + 1) / (c + 0.5)) for t, c in df.items()}
+
+        self.vectors: List[Dict[str, float]] = []
+        for terms in doc_terms:
+            vec = {t: self.idf[t] for t in terms}
+            norm = math.sqrt(sum(w * w for w in vec.values())) or 1.0
+            self.vectors.append({t: w / norm for t, w in vec.items()})
+
+    def _best(self, terms) -> Tuple[float, int]:
+        """Cosine similarity and index of the closest line (-1 if none)."""
+        query = {t: self.idf[t] for t in terms if t in self.idf}
+        if not query:
+            return 0.0, -1
+        norm = math.sqrt(sum(w * w for w in query.values()))
+
+        best_score, best_index = 0.0, -1
+        for i, vec in enumerate(self.vectors):
+            score = sum(w * vec.get(t, 0.0) for t, w in query.items()) / norm
+            if score > best_score:
+                best_score, best_index = score, i
+        return best_score, best_index
+
+    def search(self, question: str) -> Tuple[float, Optional[str]]:
+        """Best matching line and its cosine similarity."""
+        score, i = self._best(set(_terms(question)))
+        return score, self.lines[i] if i >= 0 else None
+
+    def answer(self, question: str, threshold: float = FAQ_THRESHOLD,
+               min_terms: int = FAQ_MIN_TERMS) -> Optional[str]:
+        """The closest FAQ line, or None when nothing is similar enough."""
+        terms = set(_terms(question))
+        score, i = self._best(terms)
+        if i < 0 or score < threshold:
+            return None
+        shared = len(terms & self.vectors[i].keys())
+        if shared < min(min_terms, len(terms)):
+            return None
+        return self.lines[i]
+
+
+_INDEX: Optional[FaqIndex] = None
+_LOCK = threading.Lock()
+
+
+def get_faq_index() -> FaqIndex:
+    """Get the shared FAQ index, reloading it if faq.txt has changed."""
+    global _INDEX
+
+    try:
+        mtime_ns = os.stat(FAQ_PATH).st_mtime_ns
+    except OSError:
+        return _INDEX or FaqIndex([])
+
+    index = _INDEX
+    if index is not None and index.mtime_ns == mtime_ns:
+        return index
+
+    with _LOCK:
+        if _INDEX is None or _INDEX.mtime_ns != mtime_ns:
+            with open(FAQ_PATH, "r", encoding="utf-8") as f:
+                lines = [line.strip() for line in f if line.strip()]
+            _INDEX = FaqIndex(lines, mtime_ns)
+        return _INDEX
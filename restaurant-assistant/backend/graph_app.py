@@ -1,170 +1,152 @@
 from backend.models import SessionState, Reservation
 from backend.agents import (
     add_item_to_order,
+    add_items_to_order,
     remove_item_from_order,
     set_allergens,
-    load_menu
 )
+from backend.menu_catalog import get_catalog
 from backend.llm import (
     generate_menu_response,
     extract_order_intent_ai,
+    extract_order_items_ai,
     extract_allergens_ai,
-    generate_smart_response_ai,
+    smart_response_steps,
     check_allergen_safety_ai,
-    recommend_dishes_ai,
-    call_ollama,
+    select_recommendations,
+    system_prefix,
+    OllamaCall,
+    NUMBER_WORDS,
 )
+from backend.llm_scheduler import PRIORITY_CHAT, PRIORITY_ORDER
+from backend.prompt_budget import order_context
+from backend.effects import BlockingCall, arun_steps, astream_steps, run_steps
 from backend.email_service import send_bill_email, send_reservation_confirmation
+from backend.intents import detect_intent
+from backend.conversation import get_context_aware_response
+from backend.faq import get_faq_index
+from backend.history import append_turn
+from backend.orders import get_order, vat_label
 import re
+from typing import Dict, Optional
 
 
-def detect_intent(user_message: str, state: SessionState) -> str:
-    """Advanced intent detection with context."""
-    text = user_message.lower().strip()
-
-    # Clear whole order – BEFORE generic remove
-    if any(p in text for p in [
-        "delete my order", "delete order", "clear order",
-        "remove all", "cancel order", "empty basket", "empty my order"
-    ]):
-        return "clear_order"
-
-    # Negative order like "i don't want X anymore" → remove
-    if any(p in text for p in ["don't want", "dont want", "no longer want", "i dont want"]):
-        return "remove"
-
-    # Ingredients questions
-    if "ingredient" in text:
-        return "ingredients"
-
-    # Reservation status questions
-    if any(p in text for p in [
-        "do i have a reservation", "do i have reservation",
-        "my reservation", "any reservation for me"
-    ]):
-        return "reservation_status"
-
-    # Exit phrases
-    if text in ["no", "nope", "nah", "nothing", "that's all", "nothing else", "no thanks"]:
-        return "goodbye"
-
-    # Yes/affirmative
-    if text in ["yes", "yeah", "yep", "sure", "ok", "okay", "please", "yes please"]:
-        if state.last_question == "need_reservation_details":
-            return "reservation_followup"
-        return "affirmative"
-
-    # Dish information – avoid "what's the best..." questions
-    if (("what is" in text) or ("what's the" in text)) and "best" not in text:
-        return "dish_info"
-
-    # Show current order
-    if any(phrase in text for phrase in [
-        "show order", "show my order", "my order", "current order",
-        "what did i order", "what's in my order", "check my order"
-    ]):
-        return "show_order"
-
-    # Recommendations (with context)
-    if any(w in text for w in [
-        "recommend", "suggest", "best", "popular",
-        "good", "which", "legendary", "favorite", "favourite"
-    ]):
-        if any(w in text for w in ["drink", "wine", "beer", "beverage", "juice"]):
-            return "recommend_drinks"
-        if any(phrase in text for phrase in ["for my", "with my", "suit", "pair", "goes with", "match"]):
-            return "recommend_pairing"
-        return "recommend"
-
-    # Drink-specific queries
-    if any(w in text for w in ["drink", "wine", "beer", "beverage", "juice", "water"]) and \
-            any(w in text for w in ["have", "any", "do you", "is there", "what"]):
-        return "show_drinks"
-
-    # Order with numbers
-    if re.search(r'\d+', text) and any(w in text for w in ["want", "order", "add", "get", "wanna"]):
-        return "order"
-
-    has_reservation = any(w in text for w in ["book", "reserve", "reservation", "table"])
-    has_order = any(w in text for w in ["want", "order", "add", "get", "wanna"])
-
-    # Multi-intent: order + reservation
-    if has_reservation and has_order:
-        return "order_with_reservation"
-
-    # Menu
-    if any(w in text for w in ["menu", "show me", "what do you have", "see menu", "see your menu"]):
-        return "show_menu"
-
-    # Bill/checkout
-    if any(phrase in text for phrase in [
-        "bill", "pay", "checkout", "check out", "finish", "done", "get bill", "invoice"
-    ]):
-        return "bill"
-
-    # Order
-    if has_order or any(phrase in text for phrase in ["i'll have", "give me", "can i", "i would like", "i'd like"]):
-        return "order"
-
-    # Remove single item
-    if any(w in text for w in ["remove", "delete", "cancel", "take off"]):
-        return "remove"
-
-    # Allergen – only if explicit allergy words appear
-    if any(w in text for w in ["allergic", "allergy", "allergen"]) \
-       or "allergy to" in text or "allergic to" in text:
-        return "allergen"
-
-    # Reservation
-    if has_reservation:
-        return "reservation"
-
-    # Availability query
-    if any(phrase in text for phrase in ["available", "when", "which day", "what day", "what time"]):
-        if has_reservation or "reservation" in state.last_question:
-            return "reservation_info"
-
-    return "chat"
-
-
-def _ollama_recommendation_answer(user_message: str, state: SessionState, menu) -> str:
-    """Use Ollama to answer recommendation/opinion-style questions."""
+# How often each tier answered a chat turn
+ANSWER_TIERS = {"canned": 0, "faq": 0, "llm": 0}
+
+_QUESTION = re.compile(r"\?|^\s*(?:what|which|how|why|where|when|who|is|are|do|does|can|could|should|would)\b")
+_QUANTITY = re.compile(r"\b(?:\d+|" + "|".join(map(re.escape, NUMBER_WORDS)) + r")\b")
+
+
+def _fast_path_answer(user_message: str, state: SessionState):
+    """Deterministic answer for recognizable questions, or None to fall through to the LLM."""
+    last_action = "ordered" if state.current_order else None
+    answer = get_context_aware_response(user_message, state, last_action)
+    if answer:
+        ANSWER_TIERS["canned"] += 1
+        return answer
+
+    answer = get_faq_index().answer(user_message)
+    if answer:
+        ANSWER_TIERS["faq"] += 1
+        return answer
+
+    return None
+
+
+def _order_list(user_message: str, catalog) -> Optional[Dict]:
+    """The parsed dishes of a message without an order verb that still lists
+    dishes to order, e.g. "2 risotto, a caesar salad and 3 lemonades"; else None.
+
+    Needs two or more menu items and a quantity, and must not be a question
+    ("what is in the risotto and the caesar salad?").
+    """
+    text = user_message.lower()
+    if _QUESTION.search(text) or not _QUANTITY.search(text):
+        return None
+    parsed = extract_order_items_ai(user_message, catalog)
+    return parsed if len(parsed["items"]) > 1 else None
+
+
+def _add_to_order(state: SessionState, user_message: str, catalog, parsed: Optional[Dict] = None):
+    """Apply every dish named in the message to the order in one update.
+
+    parsed is the message's extract_order_items_ai result, if already known.
+    Returns (state, answer), or (state, None) when no dish was recognized.
+    """
+    if parsed is None:
+        parsed = extract_order_items_ai(user_message, catalog)
+    if len(parsed["items"]) > 1:
+        state, answer = add_items_to_order(state, parsed["items"])
+        if parsed["unmatched"]:
+            answer += "\n\nI couldn't find: " + ", ".join(f"'{s}'" for s in parsed["unmatched"]) + "."
+        return state, answer
+
+    # Single dish: keep the original extraction rules
+    order_data = extract_order_intent_ai(user_message, catalog)
+    if not order_data.get("dish"):
+        return state, None
+    return add_item_to_order(state, order_data["dish"], order_data.get("quantity", 1))
+
+
+def _recommendation_steps(user_message: str, state: SessionState, items, priority: int = PRIORITY_ORDER):
+    """Use Ollama to answer recommendation/opinion-style questions about the given menu items."""
     order_summary = ""
     if state.current_order:
-        items = [f"{i.quantity}x {i.name}" for i in state.current_order]
-        order_summary = "Current order: " + ", ".join(items) + "."
+        order_summary = "Current order: " + order_context(state.current_order) + "."
 
     allergens = ""
     if state.allergens:
-        allergens = "Customer allergies: " + ", ".join(state.allergens) + "."
+        allergen_index = get_catalog().allergens
+        user_mask = allergen_index.mask(state.allergens)
+        safe = [i["name"] for i in items if allergen_index.is_safe(i, user_mask)]
+        allergens = "Customer allergies: " + ", ".join(state.allergens) + ". Safe choices: " + ", ".join(safe) + "."
 
-    top_dishes = ", ".join([m["name"] for m in menu[:8]])
-
-    system_prompt = (
-        "You are a professional, friendly restaurant assistant. "
-        "Use only the dishes and prices from the provided menu context. "
-        "Never invent new dishes or prices. Answer in 2–3 sentences."
-    )
+    # The menu itself is in the shared system prefix; only name the relevant items here
+    focus = ", ".join(i["name"] for i in items)
 
     prompt = (
         f"{allergens} {order_summary}\n\n"
-        f"Menu dishes: {top_dishes}.\n\n"
+        f"Relevant dishes: {focus}.\n\n"
         f"Customer question: {user_message}"
     )
 
-    resp = call_ollama(prompt, system_prompt=system_prompt, max_tokens=180)
+    resp = yield OllamaCall(prompt, system_prefix(), 180, priority=priority)
     return resp or "Based on your preferences, any of our popular dishes would be a great choice."
 
 
 def run_turn(state: SessionState, user_message: str, user_email: str = None) -> tuple:
     """Professional conversation handler with full context."""
+    return run_steps(_turn_steps(state, user_message, user_email))
+
+
+async def arun_turn(state: SessionState, user_message: str, user_email: str = None) -> tuple:
+    """Async run_turn: LLM calls use the async client and emails run off the event loop."""
+    return await arun_steps(_turn_steps(state, user_message, user_email))
+
+
+async def astream_turn(state: SessionState, user_message: str, user_email: str = None):
+    """Streaming run_turn: yields ("token", text) events, then ("result", (state, answer))."""
+    async for event in astream_steps(_turn_steps(state, user_message, user_email)):
+        yield event
+
+
+def _turn_steps(state: SessionState, user_message: str, user_email: str = None):
+    """Step generator implementing a conversation turn (see backend.effects)."""
     intent = detect_intent(user_message, state)
-    menu = load_menu()
+    catalog = get_catalog()
+    menu = catalog.items
+    parsed = None
+    if intent == "chat":
+        parsed = _order_list(user_message, catalog)
+        if parsed:
+            intent = "order"
 
     context = {
         "order": state.current_order,
         "allergens": state.allergens,
-        "total": state.current_total
+        "total": state.current_total,
+        "summary": state.summary,
     }
 
     print(f"🎯 Intent: {intent}")
@@ -172,8 +154,7 @@ def run_turn(state: SessionState, user_message: str, user_email: str = None) ->
     # Handle intents
     if intent == "goodbye":
         answer = "Thank you for visiting! Have a wonderful day! 😊 We look forward to serving you again soon."
-        state.history.append({"role": "user", "content": user_message})
-        state.history.append({"role": "assistant", "content": answer})
+        append_turn(state, user_message, answer)
         return state, answer
 
     elif intent == "affirmative":
@@ -186,16 +167,15 @@ def run_turn(state: SessionState, user_message: str, user_email: str = None) ->
         state.last_question = None
 
     elif intent == "dish_info":
-        order_data = extract_order_intent_ai(user_message, menu)
+        order_data = extract_order_intent_ai(user_message, catalog)
 
         if order_data.get("dish"):
-            dish_item = next((item for item in menu if item["name"] == order_data["dish"]), None)
+            dish_item = catalog.get_by_name(order_data["dish"])
 
             if dish_item:
                 safe_note = ""
                 if state.allergens:
-                    item_allergens = [a.lower() for a in dish_item["allergens"]]
-                    matching = [a for a in state.allergens if a.lower() in item_allergens]
+                    matching = catalog.allergens.conflicts(dish_item, state.allergens)
                     if matching:
                         safe_note = f"\n\n⚠️ **Warning:** Contains {', '.join(matching)} - NOT safe for you!"
                     else:
@@ -226,41 +206,38 @@ def run_turn(state: SessionState, user_message: str, user_email: str = None) ->
         state.last_question = None
 
     elif intent == "recommend":
-        safe_text = recommend_dishes_ai(menu, state.allergens, user_message)
-        ollama_answer = _ollama_recommendation_answer(
-            user_message + " (system suggestion: " + safe_text.replace("\n", " ") + ")",
+        suggested, _, _ = select_recommendations(menu, state.allergens, user_message)
+        ollama_answer = yield from _recommendation_steps(
+            user_message + " (system suggestion: " + ", ".join(i["name"] for i in suggested) + ")",
             state,
-            menu,
+            menu[:8],
         )
         answer = ollama_answer
         state.last_question = None
 
     elif intent == "recommend_drinks":
-        drinks_text = show_beverages_menu(menu, state.allergens)
-        ollama_answer = _ollama_recommendation_answer(
-            user_message + " (available drinks: " + drinks_text.replace("\n", " ") + ")",
+        ollama_answer = yield from _recommendation_steps(
+            user_message,
             state,
-            menu,
+            catalog.by_category.get("beverage", []),
         )
         answer = ollama_answer
         state.last_question = "offer_drinks"
 
     elif intent == "recommend_pairing":
         base = "Recommend a drink that pairs well with the customer's current order."
-        ollama_answer = _ollama_recommendation_answer(
+        ollama_answer = yield from _recommendation_steps(
             base + " " + user_message,
             state,
-            menu,
+            catalog.by_category.get("beverage", []),
         )
         answer = ollama_answer
         state.last_question = "offer_drinks"
 
     elif intent == "order_with_reservation":
-        order_data = extract_order_intent_ai(user_message, menu)
+        state, order_msg = _add_to_order(state, user_message, catalog)
 
-        if order_data.get("dish"):
-            quantity = order_data.get("quantity", 1)
-            state, order_msg = add_item_to_order(state, order_data["dish"], quantity)
+        if order_msg:
             answer = f"""{order_msg}
 
 📅 **Reservation Noted!**
@@ -274,12 +251,9 @@ Example: 'Book for 4 people on 2025-12-15 at 19:00'"""
             answer = "I'd love to help with your order and reservation! What would you like to order?"
 
     elif intent == "order":
-        order_data = extract_order_intent_ai(user_message, menu)
-
-        if order_data.get("dish"):
-            quantity = order_data.get("quantity", 1)
-            state, answer = add_item_to_order(state, order_data["dish"], quantity)
+        state, answer = _add_to_order(state, user_message, catalog, parsed)
 
+        if answer:
             if any(item.name.startswith("Mediterranean") or item.name.startswith("Truffle")
                    for item in state.current_order):
                 if not any("Wine" in item.name or "Juice" in item.name for item in state.current_order):
@@ -289,7 +263,7 @@ Example: 'Book for 4 people on 2025-12-15 at 19:00'"""
             answer = "I couldn't find that dish. Could you try again or see the menu?"
 
     elif intent == "remove":
-        order_data = extract_order_intent_ai(user_message, menu)
+        order_data = extract_order_intent_ai(user_message, catalog)
         if order_data.get("dish"):
             state, answer = remove_item_from_order(state, order_data["dish"])
         else:
@@ -302,16 +276,23 @@ Example: 'Book for 4 people on 2025-12-15 at 19:00'"""
                 answer = "Your order is empty."
         state.last_question = None
 
+    elif intent == "undo_order":
+        order = get_order(state)
+        if order.undo():
+            answer = "Done, I've undone your last change.\n\n" + get_order_summary(state)
+        else:
+            answer = "There is nothing to undo in your order."
+        state.last_question = None
+
     elif intent == "clear_order":
-        state.current_order = []
-        state.current_total = 0.0
+        get_order(state).clear()
         answer = "Your order has been cleared. Would you like to see the menu again or start a new order?"
         state.last_question = None
 
     elif intent == "ingredients":
-        order_data = extract_order_intent_ai(user_message, menu)
+        order_data = extract_order_intent_ai(user_message, catalog)
         if order_data.get("dish"):
-            answer = get_dish_ingredients(menu, order_data["dish"])
+            answer = get_dish_ingredients(catalog, order_data["dish"])
         else:
             answer = "Which dish would you like the ingredients for?"
         state.last_question = None
@@ -328,10 +309,10 @@ Example: 'Book for 4 people on 2025-12-15 at 19:00'"""
             else:
                 answer = "Please tell me which allergens you have.\n\nExample: 'I'm allergic to milk and peanuts'"
         else:
-            order_data = extract_order_intent_ai(user_message, menu)
+            order_data = extract_order_intent_ai(user_message, catalog)
 
             if order_data.get("dish"):
-                dish_item = next((item for item in menu if item["name"] == order_data["dish"]), None)
+                dish_item = catalog.get_by_name(order_data["dish"])
 
                 if dish_item and state.allergens:
                     answer = check_allergen_safety_ai(
@@ -397,7 +378,8 @@ To book a table, please provide:
                 state.reservation = Reservation(date=date, time=time, people=people, has_preorder=has_preorder)
 
                 if user_email and has_preorder:
-                    send_reservation_confirmation(
+                    yield BlockingCall(
+                        send_reservation_confirmation,
                         user_email, {"date": date, "time": time, "people": people}, state.current_order
                     )
 
@@ -416,7 +398,9 @@ To book a table, please provide:
 
 We look forward to serving you! 😊"""
                 elif user_email:
-                    send_reservation_confirmation(user_email, {"date": date, "time": time, "people": people})
+                    yield BlockingCall(
+                        send_reservation_confirmation, user_email, {"date": date, "time": time, "people": people}
+                    )
                     answer = f"""✅ **Reservation Confirmed!**
 
 📅 {date} at {time} for {people} people
@@ -436,6 +420,13 @@ See you soon! 😊"""
 **Example:** 'Book for 4 people on 2025-12-15 at 19:00'"""
                 state.last_question = "need_reservation_details"
 
+        # Dishes named alongside a booking are not ordered; say so instead of dropping them silently
+        dishes = extract_order_items_ai(user_message, catalog)["items"] if intent == "reservation" else []
+        if dishes:
+            names = ", ".join(f"{quantity} x {item['name']}" for item, quantity in dishes)
+            answer += (f"\n\n🍽️ I haven't added {names} to your order yet. "
+                       "Say e.g. 'I want 2 risotto' and I'll add it.")
+
     elif intent == "show_order":
         if state.current_order:
             answer = get_order_summary(state)
@@ -459,11 +450,10 @@ See you soon! 😊"""
             answer = f"{get_order_summary(state)}\n\n📧 **Please enter your email above** to receive your bill."
         else:
             html = generate_bill_html(state)
-            email_sent = send_bill_email(user_email, html)
+            email_sent = yield BlockingCall(send_bill_email, user_email, html)
 
-            subtotal = state.current_total
-            vat = subtotal * 0.12
-            total = subtotal + vat
+            order = get_order(state)
+            subtotal, vat, total = order.subtotal, order.vat, order.total
 
             if email_sent:
                 answer = f"""✅ **Order Complete!**
@@ -471,7 +461,7 @@ See you soon! 😊"""
 
 📦 **Items:** {len(state.current_order)}
 💰 **Subtotal:** €{subtotal:.2f}
-📊 **VAT (12%):** €{vat:.2f}
+📊 **{vat_label()}:** €{vat:.2f}
 💳 **Total:** €{total:.2f}
 
 📧 Bill sent to **{user_email}**
@@ -484,18 +474,20 @@ Thank you! Enjoy your meal! 🍽️✨"""
 
     else:  # chat
         if any(w in user_message.lower() for w in ["legendary", "favourite", "favorite", "what do you like"]):
-            answer = _ollama_recommendation_answer(user_message, state, menu)
+            answer = yield from _recommendation_steps(user_message, state, menu[:8], PRIORITY_CHAT)
         else:
-            answer = generate_smart_response_ai(user_message, context, state.history)
+            answer = _fast_path_answer(user_message, state)
+            if answer is None:
+                ANSWER_TIERS["llm"] += 1
+                answer = yield from smart_response_steps(user_message, context, state.history)
 
-    state.history.append({"role": "user", "content": user_message})
-    state.history.append({"role": "assistant", "content": answer})
+    append_turn(state, user_message, answer)
 
     return state, answer
 
 
-def get_dish_ingredients(menu, name: str) -> str:
-    item = next((m for m in menu if m["name"].lower() == name.lower()), None)
+def get_dish_ingredients(catalog, name: str) -> str:
+    item = catalog.get_by_name(name)
     if not item:
         return "I couldn't find that dish on the menu."
     ingredients = item.get("ingredients", [])
@@ -507,6 +499,8 @@ def get_dish_ingredients(menu, name: str) -> str:
 def show_beverages_menu(menu_items, user_allergens=None):
     """Show drinks menu professionally."""
     drinks = [item for item in menu_items if item["id"].startswith("dr")]
+    allergen_index = get_catalog().allergens
+    user_mask = allergen_index.mask(user_allergens)
 
     lines = ["═" * 65]
     lines.append("🍹  **OUR BEVERAGES**")
@@ -515,8 +509,7 @@ def show_beverages_menu(menu_items, user_allergens=None):
     for item in drinks:
         safe_marker = ""
         if user_allergens:
-            item_allergens = [a.lower() for a in item["allergens"]]
-            if not any(ua.lower() in item_allergens for ua in user_allergens):
+            if allergen_index.is_safe(item, user_mask):
                 safe_marker = "  ✅ **Safe**"
 
         lines.append(f"┌─ **{item['name']}**{safe_marker}")
@@ -536,22 +529,20 @@ def get_order_summary(state: SessionState) -> str:
     if not state.current_order:
         return "Your order is empty."
 
+    order = get_order(state)
     lines = ["═" * 65]
     lines.append("📋  **YOUR CURRENT ORDER**")
     lines.append("═" * 65 + "\n")
 
-    for item in state.current_order:
-        line_total = item.price * item.quantity
+    for item in order.lines:
         lines.append(f"• **{item.quantity}x {item.name}**")
-        lines.append(f"  €{item.price:.2f} each = €{line_total:.2f}\n")
+        lines.append(f"  €{item.price:.2f} each = €{order.line_total(item):.2f}\n")
 
-    subtotal = state.current_total
-    vat = subtotal * 0.12
-    total = subtotal + vat
+    subtotal, vat, total = order.subtotal, order.vat, order.total
 
     lines.append("═" * 65)
     lines.append(f"💰 **Subtotal:** €{subtotal:.2f}")
-    lines.append(f"📊 **VAT (12%):** €{vat:.2f}")
+    lines.append(f"📊 **{vat_label()}:** €{vat:.2f}")
     lines.append(f"💳 **TOTAL:** €{total:.2f}")
     lines.append("═" * 65)
 
@@ -560,19 +551,17 @@ def get_order_summary(state: SessionState) -> str:
 
 def generate_bill_html(state: SessionState) -> str:
     """Professional HTML bill."""
+    order = get_order(state)
     rows = ""
-    for item in state.current_order:
-        line_total = item.price * item.quantity
+    for item in order.lines:
         rows += (
             f"<tr><td>{item.name}</td>"
             f"<td style='text-align:center'>{item.quantity}</td>"
             f"<td style='text-align:right'>€{item.price:.2f}</td>"
-            f"<td style='text-align:right'>€{line_total:.2f}</td></tr>"
+            f"<td style='text-align:right'>€{order.line_total(item):.2f}</td></tr>"
         )
 
-    subtotal = state.current_total
-    vat = subtotal * 0.12
-    total = subtotal + vat
+    subtotal, vat, total = order.subtotal, order.vat, order.total
 
     reservation_section = ""
     if state.reservation:
@@ -600,7 +589,7 @@ td{{padding:12px;border-bottom:1px solid #e0e0e0;}}
 <table><tr><th>Dish</th><th style='text-align:center;'>Qty</th><th style='text-align:right;'>Price</th><th style='text-align:right;'>Total</th></tr>{rows}</table>
 <div class='totals'>
 <p><strong>Subtotal:</strong> €{subtotal:.2f}</p>
-<p><strong>VAT (12%):</strong> €{vat:.2f}</p>
+<p><strong>{vat_label()}:</strong> €{vat:.2f}</p>
 <p class='grand-total'>Total: €{total:.2f}</p>
 </div>
 <div class='footer'>
@@ -0,0 +1,43 @@
+"""
+Bounded conversation history.
+
+A session keeps only the last HISTORY_WINDOW messages, each cut to the
+length the prompts actually read, with its text interned so the same canned
+answers are stored once across sessions. With HISTORY_SUMMARY=1, user
+messages that fall out of the window are folded into a short rolling
+summary instead of being forgotten.
+"""
+import os
+import sys
+
+from backend.models import SessionState
+from backend.prompt_budget import HISTORY_MESSAGE_CHARS
+
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "8"))
+HISTORY_SUMMARY = os.getenv("HISTORY_SUMMARY", "0") == "1"
+SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", "300"))
+
+ROLE_USER = sys.intern("user")
+ROLE_ASSISTANT = sys.intern("assistant")
+
+
+def _record(role: str, content: str) -> dict:
+    return {"role": role, "content": sys.intern(content[:HISTORY_MESSAGE_CHARS])}
+
+
+def append_turn(state: SessionState, user_message: str, answer: str) -> None:
+    """Record one exchange, evicting the oldest messages beyond the window."""
+    history = state.history
+    history.append(_record(ROLE_USER, user_message))
+    history.append(_record(ROLE_ASSISTANT, answer))
+
+    overflow = len(history) - HISTORY_WINDOW
+    if overflow <= 0:
+        return
+
+    if HISTORY_SUMMARY:
+        evicted = [m["content"] for m in history[:overflow] if m.get("role") == ROLE_USER]
+        if evicted:
+            summary = "; ".join(filter(None, [state.summary] + evicted))
+            state.summary = summary[-SUMMARY_CHARS:]
+    del history[:overflow]
@@ -0,0 +1,239 @@
+"""
+Compiled intent classifier.
+
+Every keyword used by detect_intent is compiled into one prefix-factored
+regex, so a message is scanned once. The rules are then checked against the set of hits in the
+same priority order as before.
+"""
+import re
+from typing import Dict, Iterable, List
+
+from backend.models import SessionState
+
+
+def _trie_pattern(phrases: Iterable[str]) -> str:
+    """Build a regex matching the longest of the given phrases at a position."""
+    trie: Dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = True
+
+    def build(node: Dict) -> str:
+        alternatives = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alternatives:
+            return ""
+        body = alternatives[0] if len(alternatives) == 1 else "(?:" + "|".join(alternatives) + ")"
+        # Greedy optional: prefer the longer phrase, fall back to this one
+        return "(?:" + body + ")?" if "" in node else body
+
+    return build(trie)
+
+
+class PhraseMatcher:
+    """Finds which of a fixed set of phrases occur in a text, in one pass."""
+
+    def __init__(self, phrases: Iterable[str]):
+        unique = sorted(set(phrases))
+        self.bits: Dict[str, int] = {p: 1 << i for i, p in enumerate(unique)}
+
+        # A phrase occurring at some position implies that all phrases which
+        # are prefixes of it occur there too.
+        self.closure: Dict[str, int] = {}
+        for phrase in unique:
+            mask = 0
+            for other in unique:
+                if phrase.startswith(other):
+                    mask |= self.bits[other]
+            self.closure[phrase] = mask
+
+        # Each position reports its longest hit
+        self.pattern = re.compile("(?=(" + _trie_pattern(unique) + "))")
+
+    def mask(self, phrases: Iterable[str]) -> int:
+        """Build the bitmask of a group of phrases."""
+        mask = 0
+        for phrase in phrases:
+            mask |= self.bits[phrase]
+        return mask
+
+    def scan(self, text: str) -> int:
+        """Return the bitmask of all phrases found in text."""
+        hits = 0
+        closure = self.closure
+        for match in self.pattern.finditer(text):
+            hits |= closure[match.group(1)]
+        return hits
+
+
+# Phrase groups, in the order detect_intent checks them
+CLEAR_ORDER_PHRASES = [
+    "delete my order", "delete order", "clear order",
+    "remove all", "cancel order", "empty basket", "empty my order",
+]
+NEGATIVE_ORDER_PHRASES = ["don't want", "dont want", "no longer want", "i dont want"]
+INGREDIENT_PHRASES = ["ingredient"]
+RESERVATION_STATUS_PHRASES = [
+    "do i have a reservation", "do i have reservation",
+    "my reservation", "any reservation for me",
+]
+DISH_INFO_PHRASES = ["what is", "what's the"]
+BEST_PHRASES = ["best"]
+SHOW_ORDER_PHRASES = [
+    "show order", "show my order", "my order", "current order",
+    "what did i order", "what's in my order", "check my order",
+]
+RECOMMEND_PHRASES = [
+    "recommend", "suggest", "best", "popular",
+    "good", "which", "legendary", "favorite", "favourite",
+]
+DRINK_RECOMMEND_PHRASES = ["drink", "wine", "beer", "beverage", "juice"]
+PAIRING_PHRASES = ["for my", "with my", "suit", "pair", "goes with", "match"]
+DRINK_PHRASES = ["drink", "wine", "beer", "beverage", "juice", "water"]
+DRINK_QUESTION_PHRASES = ["have", "any", "do you", "is there", "what"]
+ORDER_PHRASES = ["want", "order", "add", "get", "wanna"]
+RESERVATION_PHRASES = ["book", "reserve", "reservation", "table"]
+MENU_PHRASES = ["menu", "show me", "what do you have", "see menu", "see your menu"]
+BILL_PHRASES = ["bill", "pay", "checkout", "check out", "finish", "done", "get bill", "invoice"]
+POLITE_ORDER_PHRASES = ["i'll have", "give me", "can i", "i would like", "i'd like"]
+REMOVE_PHRASES = ["remove", "delete", "cancel", "take off"]
+ALLERGEN_PHRASES = ["allergic", "allergy", "allergen"]
+AVAILABILITY_PHRASES = ["available", "when", "which day", "what day", "what time"]
+
+# Whole-message replies
+GOODBYE_MESSAGES = {"no", "nope", "nah", "nothing", "that's all", "nothing else", "no thanks"}
+AFFIRMATIVE_MESSAGES = {"yes", "yeah", "yep", "sure", "ok", "okay", "please", "yes please"}
+UNDO_MESSAGES = {"undo", "undo that", "undo last", "undo the last change", "take that back"}
+
+_DIGITS = re.compile(r'\d+')
+
+_GROUPS: List[List[str]] = [
+    CLEAR_ORDER_PHRASES, NEGATIVE_ORDER_PHRASES, INGREDIENT_PHRASES,
+    RESERVATION_STATUS_PHRASES, DISH_INFO_PHRASES, BEST_PHRASES,
+    SHOW_ORDER_PHRASES, RECOMMEND_PHRASES, DRINK_RECOMMEND_PHRASES,
+    PAIRING_PHRASES, DRINK_PHRASES, DRINK_QUESTION_PHRASES,
+    ORDER_PHRASES, RESERVATION_PHRASES, MENU_PHRASES, BILL_PHRASES,
+    POLITE_ORDER_PHRASES, REMOVE_PHRASES, ALLERGEN_PHRASES, AVAILABILITY_PHRASES,
+]
+
+MATCHER = PhraseMatcher(phrase for group in _GROUPS for phrase in group)
+
+CLEAR_ORDER = MATCHER.mask(CLEAR_ORDER_PHRASES)
+NEGATIVE_ORDER = MATCHER.mask(NEGATIVE_ORDER_PHRASES)
+INGREDIENT = MATCHER.mask(INGREDIENT_PHRASES)
+RESERVATION_STATUS = MATCHER.mask(RESERVATION_STATUS_PHRASES)
+DISH_INFO = MATCHER.mask(DISH_INFO_PHRASES)
+BEST = MATCHER.mask(BEST_PHRASES)
+SHOW_ORDER = MATCHER.mask(SHOW_ORDER_PHRASES)
+RECOMMEND = MATCHER.mask(RECOMMEND_PHRASES)
+DRINK_RECOMMEND = MATCHER.mask(DRINK_RECOMMEND_PHRASES)
+PAIRING = MATCHER.mask(PAIRING_PHRASES)
+DRINK = MATCHER.mask(DRINK_PHRASES)
+DRINK_QUESTION = MATCHER.mask(DRINK_QUESTION_PHRASES)
+ORDER = MATCHER.mask(ORDER_PHRASES)
+RESERVATION = MATCHER.mask(RESERVATION_PHRASES)
+MENU = MATCHER.mask(MENU_PHRASES)
+BILL = MATCHER.mask(BILL_PHRASES)
+POLITE_ORDER = MATCHER.mask(POLITE_ORDER_PHRASES)
+REMOVE = MATCHER.mask(REMOVE_PHRASES)
+ALLERGEN = MATCHER.mask(ALLERGEN_PHRASES)
+AVAILABILITY = MATCHER.mask(AVAILABILITY_PHRASES)
+
+
+def detect_intent(user_message: str, state: SessionState) -> str:
+    """Advanced intent detection with context."""
+    text = user_message.lower().strip()
+    hits = MATCHER.scan(text)
+
+    # Undo the last order change
+    if text.rstrip(".!") in UNDO_MESSAGES:
+        return "undo_order"
+
+    # Clear whole order – BEFORE generic remove
+    if hits & CLEAR_ORDER:
+        return "clear_order"
+
+    # Negative order like "i don't want X anymore" → remove
+    if hits & NEGATIVE_ORDER:
+        return "remove"
+
+    # Ingredients questions
+    if hits & INGREDIENT:
+        return "ingredients"
+
+    # Reservation status questions
+    if hits & RESERVATION_STATUS:
+        return "reservation_status"
+
+    # Exit phrases
+    if text in GOODBYE_MESSAGES:
+        return "goodbye"
+
+    # Yes/affirmative
+    if text in AFFIRMATIVE_MESSAGES:
+        if state.last_question == "need_reservation_details":
+            return "reservation_followup"
+        return "affirmative"
+
+    # Dish information – avoid "what's the best..." questions
+    if hits & DISH_INFO and not hits & BEST:
+        return "dish_info"
+
+    # Show current order
+    if hits & SHOW_ORDER:
+        return "show_order"
+
+    # Recommendations (with context)
+    if hits & RECOMMEND:
+        if hits & DRINK_RECOMMEND:
+            return "recommend_drinks"
+        if hits & PAIRING:
+            return "recommend_pairing"
+        return "recommend"
+
+    # Drink-specific queries
+    if hits & DRINK and hits & DRINK_QUESTION:
+        return "show_drinks"
+
+    has_reservation = bool(hits & RESERVATION)
+    has_order = bool(hits & ORDER)
+
+    # Order with numbers
+    if has_order and _DIGITS.search(text):
+        return "order"
+
+    # Multi-intent: order + reservation
+    if has_reservation and has_order:
+        return "order_with_reservation"
+
+    # Menu
+    if hits & MENU:
+        return "show_menu"
+
+    # Bill/checkout
+    if hits & BILL:
+        return "bill"
+
+    # Order
+    if has_order or hits & POLITE_ORDER:
+        return "order"
+
+    # Remove single item
+    if hits & REMOVE:
+        return "remove"
+
+    # Allergen – only if explicit allergy words appear
+    if hits & ALLERGEN:
+        return "allergen"
+
+    # Reservation
+    if has_reservation:
+        return "reservation"
+
+    # Availability query
+    if hits & AVAILABILITY:
+        if has_reservation or "reservation" in (state.last_question or ""):
+            return "reservation_info"
+
+    return "chat"
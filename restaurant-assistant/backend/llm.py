@@ -1,47 +1,227 @@
-import requests
+import asyncio
+import hashlib
 import json
+import os
+import time
 from typing import Optional, List, Dict
 import re
+from backend.allergens import COMMON_ALLERGENS, canonical_allergen
+from backend.menu_catalog import get_catalog
+from backend.effects import BlockingCall, run_steps
+from backend.ollama_client import MODEL, agenerate, astream_generate, generate
+from backend.cache import DiskCache, LRUCache, TieredCache
+from backend.singleflight import AsyncSingleFlight, SingleFlight
+from backend.llm_scheduler import PRIORITY_CHAT, PRIORITY_DEFAULT, SCHEDULER
+from backend.prompt_budget import (
+    NUM_CTX,
+    history_budget,
+    history_context,
+    menu_context,
+    order_context,
+    record_prompt,
+)
+
+TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.8"))
+# How long Ollama keeps the model (and its prompt cache) loaded between calls
+KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Response cache: "deterministic" (only when temperature is 0), "on", or "off".
+# With a sampling temperature every call is meant to differ, so caching is opt-in.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE", "deterministic")
+LLM_CACHE_ENABLED = LLM_CACHE_MODE == "on" or (LLM_CACHE_MODE == "deterministic" and TEMPERATURE == 0)
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR")
+LLM_CACHE = TieredCache(
+    LRUCache(int(os.getenv("LLM_CACHE_SIZE", "512")), ttl=LLM_CACHE_TTL),
+    DiskCache(
+        os.path.join(LLM_CACHE_DIR, "llm_cache.sqlite3"),
+        ttl=LLM_CACHE_TTL,
+        max_entries=int(os.getenv("LLM_CACHE_DISK_SIZE", "10000")),
+    )
+    if LLM_CACHE_DIR and LLM_CACHE_ENABLED else None,
+)
+
+# Concurrent identical prompts share one generation
+FLIGHT = SingleFlight()
+ASYNC_FLIGHT = AsyncSingleFlight()
+
+PERSONA = """You are a professional, friendly restaurant assistant. Be warm, helpful, and concise (2-3 sentences).
+Use only the dishes and prices from the menu below. Never invent new dishes or prices.
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-MODEL = "phi3:mini"
+Guidelines:
+- Answer the customer's question directly
+- Suggest relevant next steps
+- Be enthusiastic about our food
+- Prioritize allergen safety"""
 
+_SYSTEM_PREFIX: Dict[int, str] = {}
 
-def call_ollama(prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 200) -> str:
-    """Call Ollama with optimized settings."""
-    
+
+def system_prefix() -> str:
+    """Restaurant-wide system prompt, identical for every session and turn.
+
+    Keeping it byte-for-byte stable (per menu version) lets Ollama reuse the
+    already evaluated prefix from its prompt cache; everything that varies
+    per session goes in the user part of the prompt.
+    """
+    catalog = get_catalog()
+    prefix = _SYSTEM_PREFIX.get(catalog.version)
+    if prefix is None:
+        menu_lines = menu_context(catalog.items, sep="\n")
+        prefix = f"{PERSONA}\n\nMenu (id, name, price):\n{menu_lines}"
+        _SYSTEM_PREFIX.clear()
+        _SYSTEM_PREFIX[catalog.version] = prefix
+    return prefix
+
+
+def _ollama_payload(prompt: str, system_prompt: Optional[str], max_tokens: int) -> Dict:
+    """Build the Ollama generate request."""
     if system_prompt:
         full_prompt = f"System: {system_prompt}\n\nUser: {prompt}\n\nAssistant:"
     else:
         full_prompt = prompt
+    record_prompt(full_prompt)
     
-    payload = {
+    return {
         "model": MODEL,
         "prompt": full_prompt,
         "stream": False,
+        "keep_alive": KEEP_ALIVE,
         "options": {
-            "temperature": 0.8,
+            "temperature": TEMPERATURE,
             "num_predict": max_tokens,
-            "num_ctx": 3072,
+            "num_ctx": NUM_CTX,
             "top_p": 0.9,
         }
     }
+
+
+def _ollama_answer(result: Optional[Dict]) -> Optional[str]:
+    if result is None:
+        return None
+    answer = result.get("response", "").strip()
+    print(f"✅ Response: {len(answer)} chars")
+    return answer
+
+
+def _cache_key(prompt: str, system_prompt: Optional[str], max_tokens: int) -> str:
+    """Hash of everything that determines a completion.
+
+    Allergens, order contents and history are already part of the prompts, so
+    they are covered; the user text is normalized for case and whitespace.
+    """
+    normalized = " ".join(prompt.lower().split())
+    raw = json.dumps([MODEL, TEMPERATURE, max_tokens, system_prompt or "", normalized], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cached_answer(key: str) -> Optional[str]:
+    if not LLM_CACHE_ENABLED:
+        return None
+    answer = LLM_CACHE.get(key)
+    if answer is not None:
+        print(f"⚡ Cached response: {len(answer)} chars")
+    return answer
+
+
+def _store_answer(key: str, answer: Optional[str]) -> Optional[str]:
+    if LLM_CACHE_ENABLED and answer:
+        LLM_CACHE.set(key, answer)
+    return answer
+
+
+def call_ollama(prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 200) -> str:
+    """Call Ollama with optimized settings."""
+    key = _cache_key(prompt, system_prompt, max_tokens)
+    cached = _cached_answer(key)
+    if cached is not None:
+        return cached
     
-    try:
+    def _generate():
         print(f"🤖 Calling Ollama...")
-        response = requests.post(OLLAMA_URL, json=payload, timeout=25)
-        
-        if response.status_code == 200:
-            result = response.json()
-            answer = result.get("response", "").strip()
-            print(f"✅ Response: {len(answer)} chars")
-            return answer
-        else:
-            return None
+        answer = _ollama_answer(generate(_ollama_payload(prompt, system_prompt, max_tokens)))
+        return _store_answer(key, answer)
     
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        return None
+    return FLIGHT.do(key, _generate)
+
+
+async def acall_ollama(prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 200,
+                       priority: int = PRIORITY_DEFAULT) -> str:
+    """Async version of call_ollama; does not block the event loop.
+
+    Requests are admitted through the scheduler, so under load lower-priority
+    calls may be shed and return None.
+    """
+    key = _cache_key(prompt, system_prompt, max_tokens)
+    cached = _cached_answer(key)
+    if cached is not None:
+        return cached
+    
+    async def _generate():
+        print(f"🤖 Calling Ollama...")
+        answer = _ollama_answer(await agenerate(_ollama_payload(prompt, system_prompt, max_tokens)))
+        return _store_answer(key, answer)
+    
+    return await ASYNC_FLIGHT.do(key, lambda: SCHEDULER.run(priority, _generate))
+
+
+async def astream_ollama(prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 200,
+                         priority: int = PRIORITY_DEFAULT):
+    """Stream an Ollama completion, yielding text tokens as they arrive."""
+    key = _cache_key(prompt, system_prompt, max_tokens)
+    cached = _cached_answer(key)
+    if cached is not None:
+        yield cached
+        return
+    
+    # Same prompt already generating: wait for it and send the whole answer
+    pending = ASYNC_FLIGHT.pending(key)
+    if pending is not None:
+        answer = await asyncio.shield(pending)
+        if answer:
+            yield answer
+        return
+    
+    future = ASYNC_FLIGHT.start(key)
+    admitted = False
+    parts = []
+    try:
+        # Waiters must hear back even if this stream is cancelled while still queued
+        admitted = await SCHEDULER.acquire(priority)
+        if not admitted:
+            print("🚦 Ollama queue full, using fallback")
+            ASYNC_FLIGHT.finish(key, future, None)
+            return
+
+        print(f"🤖 Streaming from Ollama...")
+        started = time.monotonic()
+        async for chunk in astream_generate(_ollama_payload(prompt, system_prompt, max_tokens)):
+            token = chunk.get("response", "")
+            if token:
+                parts.append(token)
+                yield token
+    except BaseException:
+        # Client went away or the stream failed; waiters fall back
+        ASYNC_FLIGHT.finish(key, future, None)
+        raise
+    finally:
+        if admitted:
+            SCHEDULER.release(time.monotonic() - started)
+    ASYNC_FLIGHT.finish(key, future, _store_answer(key, "".join(parts).strip()))
+
+class OllamaCall(BlockingCall):
+    """A call_ollama request yielded by step generators (see backend.effects)."""
+
+    def __init__(self, prompt: str, system_prompt: Optional[str] = None, max_tokens: int = 200,
+                 priority: int = PRIORITY_DEFAULT):
+        super().__init__(call_ollama, prompt, system_prompt, max_tokens)
+        self.priority = priority
+
+    async def arun(self):
+        return await acall_ollama(*self.args, priority=self.priority)
+
+    def astream(self):
+        return astream_ollama(*self.args, priority=self.priority)
 
 
 def generate_menu_response(menu_items: List[Dict], user_allergens: List[str] = None) -> str:
@@ -63,6 +243,8 @@ def generate_menu_response(menu_items: List[Dict], user_allergens: List[str] = N
             categories["🍰 Desserts"].append(item)
         
 
+    allergen_index = get_catalog().allergens
+
     parts: list[str] = []
     parts.append("🍽️ <b>OUR RESTAURANT MENU</b><br>")
 
@@ -81,8 +263,7 @@ def generate_menu_response(menu_items: List[Dict], user_allergens: List[str] = N
 
             safe_marker = ""
             if user_allergens:
-                lower = [a.lower() for a in item_allergens]
-                matching = [a for a in user_allergens if a.lower() in lower]
+                matching = allergen_index.conflicts(item, user_allergens)
                 if matching:
                     safe_marker = f" ⚠️ Contains: {', '.join(matching)}"
                 else:
@@ -100,8 +281,9 @@ def generate_menu_response(menu_items: List[Dict], user_allergens: List[str] = N
     return "".join(parts)
 
 
-def extract_order_intent_ai(user_message: str, menu_items: List[Dict]) -> Dict:
+def extract_order_intent_ai(user_message: str, catalog=None) -> Dict:
     """Smart order extraction with fuzzy matching."""
+    catalog = catalog or get_catalog()
     
     text = user_message.lower()
     
@@ -117,50 +299,81 @@ def extract_order_intent_ai(user_message: str, menu_items: List[Dict]) -> Dict:
         clean_text = clean_text.replace(word, " ")
     clean_text = re.sub(r'\d+\s*(x|pieces?|orders?|glass|glasses)?', '', clean_text).strip()
     
-    # Exact and fuzzy matching
-    best_match = None
-    best_score = 0
-    
-    for item in menu_items:
-        item_name_lower = item["name"].lower()
-        
-        # Exact match
-        if clean_text == item_name_lower:
-            return {"dish": item["name"], "quantity": quantity}
-        
-        # Contains match
-        if clean_text in item_name_lower or item_name_lower in clean_text:
-            score = max(len(clean_text), len(item_name_lower))
-            if score > best_score:
-                best_score = score
-                best_match = item["name"]
-        
-        # Word overlap
-        item_words = set([w for w in item_name_lower.split() if len(w) > 3])
-        text_words = set([w for w in clean_text.split() if len(w) > 3])
-        common = item_words & text_words
-        
-        if common and len(common) > 0:
-            score = len(common) * 20
-            if score > best_score:
-                best_score = score
-                best_match = item["name"]
-    
-    return {"dish": best_match, "quantity": quantity}
+    # Exact, substring, word-overlap and misspelling matching
+    item = catalog.matcher.best_match(clean_text)
+    
+    return {"dish": item["name"] if item else None, "quantity": quantity}
+
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "a couple of": 2, "a dozen": 12,
+}
+_ORDER_VERBS = re.compile(
+    r"\b(?:i'll have|i'd like|i want|give me|for me|can i (?:get|have)|could i (?:get|have)|"
+    r"add|order|want|get|wanna|please|also|too)\b"
+)
+_SEGMENT_SPLIT = re.compile(r",|;|&|\+|\band\b|\bplus\b|\bwith\b")
+_FILLER = re.compile(r"^(?:(?:to|the|some|me|us|just|then)\s+)+")
+# Parts of a mixed order/booking message that are not dishes
+_NOT_A_DISH = re.compile(r"\b(?:reservations?|table|booking|book|people|persons?)\b")
+_LEADING_QTY = re.compile(
+    r"^(?:(\d+)\s*x?|(" + "|".join(sorted(map(re.escape, NUMBER_WORDS), key=len, reverse=True)) + r"))\b\s*"
+    r"(?:(?:x|pieces?|orders?|portions?|glass(?:es)?|bottles?|cups?)\s+)?(?:of\s+)?"
+)
+_TRAILING_QTY = re.compile(r"\s*(?:x\s*(\d+)|(\d+)\s*x)$")
+
+
+def extract_order_items_ai(user_message: str, catalog=None) -> Dict:
+    """Split a message like "2 risotto, a caesar salad and 3 beers" into order lines.
+
+    Returns {"items": [(menu item, quantity), ...], "unmatched": [segment, ...]};
+    repeated dishes are merged.
+    """
+    catalog = catalog or get_catalog()
+    text = _ORDER_VERBS.sub(" ", user_message.lower())
+
+    quantities: Dict[str, int] = {}
+    items: Dict[str, Dict] = {}
+    unmatched = []
+    for segment in _SEGMENT_SPLIT.split(text):
+        segment = _FILLER.sub("", " ".join(segment.split()).strip(" .!?"))
+        if not segment or _NOT_A_DISH.search(segment):
+            continue
+
+        quantity = 1
+        match = _LEADING_QTY.match(segment)
+        if match:
+            quantity = int(match.group(1)) if match.group(1) else NUMBER_WORDS[match.group(2)]
+            segment = segment[match.end():]
+        else:
+            match = _TRAILING_QTY.search(segment)
+            if match:
+                quantity = int(match.group(1) or match.group(2))
+                segment = segment[:match.start()]
+        if not segment or quantity <= 0:
+            continue
+
+        item = catalog.matcher.best_match(segment)
+        if item is None:
+            unmatched.append(segment)
+            continue
+        items[item["id"]] = item
+        quantities[item["id"]] = quantities.get(item["id"], 0) + quantity
+
+    return {"items": [(items[i], q) for i, q in quantities.items()], "unmatched": unmatched}
 
 
 def extract_allergens_ai(user_message: str) -> List[str]:
     """Extract allergens from user message."""
     
     text = user_message.lower()
-    common = ["milk", "dairy", "eggs", "fish", "shellfish", "nuts", "peanuts", "wheat", "gluten", "soy", "sesame", "sulfites"]
     
     found = set()
-    for allergen in common:
+    for allergen in COMMON_ALLERGENS:
         if allergen in text:
             found.add(allergen)
-            if allergen == "dairy":
-                found.add("milk")
+            found.add(canonical_allergen(allergen))
     
     return list(found)
 
@@ -168,17 +381,34 @@ def extract_allergens_ai(user_message: str) -> List[str]:
 def recommend_dishes_ai(menu_items: List[Dict], user_allergens: List[str] = None, user_preference: str = "") -> str:
     """Smart recommendations based on context."""
     
+    recs, category_emoji, title = select_recommendations(menu_items, user_allergens, user_preference)
+    lines = [category_emoji + " " + title + "\n"]
+    
+    for idx, item in enumerate(recs, 1):
+        safe_note = ""
+        if user_allergens:
+            safe_note = " ✅"
+        
+        lines.append(f"**{idx}. {item['name']}** - €{item['price']:.2f}{safe_note}")
+        lines.append(f"   _{item['description']}_\n")
+    
+    lines.append("💬 Would you like to order any of these?")
+    
+    return "\n".join(lines)
+
+
+def select_recommendations(menu_items: List[Dict], user_allergens: List[str] = None, user_preference: str = ""):
+    """Pick up to three allergen-safe items for the preference; returns (items, emoji, title)."""
+    
     text = user_preference.lower()
     
     # Filter safe dishes
-    safe_dishes = []
-    for item in menu_items:
-        if user_allergens:
-            item_allergens = [a.lower() for a in item["allergens"]]
-            if not any(ua.lower() in item_allergens for ua in user_allergens):
-                safe_dishes.append(item)
-        else:
-            safe_dishes.append(item)
+    if user_allergens:
+        allergen_index = get_catalog().allergens
+        user_mask = allergen_index.mask(user_allergens)
+        safe_dishes = [item for item in menu_items if allergen_index.is_safe(item, user_mask)]
+    else:
+        safe_dishes = list(menu_items)
     
     # Context-based recommendations
     if any(w in text for w in ["vegetarian", "vegan", "plant"]):
@@ -203,36 +433,19 @@ def recommend_dishes_ai(menu_items: List[Dict], user_allergens: List[str] = None
     if not recs:
         recs = safe_dishes[:3]
     
-    lines = [category_emoji + " " + title + "\n"]
-    
-    for idx, item in enumerate(recs, 1):
-        safe_note = ""
-        if user_allergens:
-            safe_note = " ✅"
-        
-        lines.append(f"**{idx}. {item['name']}** - €{item['price']:.2f}{safe_note}")
-        lines.append(f"   _{item['description']}_\n")
-    
-    lines.append("💬 Would you like to order any of these?")
-    
-    return "\n".join(lines)
+    return recs, category_emoji, title
 
 
 def generate_smart_response_ai(user_message: str, context: Dict, conversation_history: List = None) -> str:
     """Context-aware conversation with memory."""
+    return run_steps(smart_response_steps(user_message, context, conversation_history))
+
+
+def smart_response_steps(user_message: str, context: Dict, conversation_history: List = None):
+    """Step generator behind generate_smart_response_ai; yields its Ollama call."""
     
     text = user_message.lower()
     
-    # Build conversation context
-    history_text = ""
-    if conversation_history and len(conversation_history) > 0:
-        recent = conversation_history[-4:]  # Last 2 exchanges
-        history_text = "\nRecent conversation:\n"
-        for msg in recent:
-            role = msg.get("role", "")
-            content = msg.get("content", "")[:100]
-            history_text += f"{role}: {content}\n"
-    
     # Quick pattern responses
     if any(w in text for w in ["hello", "hi", "hey"]):
         return "Hello! 👋 Welcome to our restaurant. Would you like to see our menu or place an order?"
@@ -253,26 +466,27 @@ What would you like?"""
     # Build AI context
     order_info = ""
     if context.get('order') and len(context['order']) > 0:
-        items = [f"{item.quantity}x {item.name}" for item in context['order']]
-        order_info = f"Current order: {', '.join(items)} (€{context.get('total', 0):.2f}). "
+        order_info = f"Current order: {order_context(context['order'])} (€{context.get('total', 0):.2f}). "
     
     allergen_info = ""
     if context.get('allergens'):
         allergen_info = f"Customer allergies: {', '.join(context['allergens'])}. "
     
-    # Use AI for complex queries
-    system_prompt = f"""You are a professional restaurant assistant. Be warm, helpful, and concise (2-3 sentences).
-
-Context: {order_info}{allergen_info}
-{history_text}
-
-Guidelines:
-- Answer the customer's question directly
-- Suggest relevant next steps
-- Be enthusiastic about our food
-- Prioritize allergen safety"""
+    # Shared prefix first, then this session's context
+    system_prompt = system_prefix()
+    fixed = f"{system_prompt}{order_info}{allergen_info}{context.get('summary', '')}{user_message}"
     
-    ai_response = call_ollama(user_message, system_prompt, 180)
+    # Recent conversation, oldest messages dropped first to stay within budget
+    history_text = history_context(conversation_history, history_budget(fixed, 180))
+    if history_text:
+        history_text = f"Recent conversation:\n{history_text}\n\n"
+    if context.get("summary"):
+        history_text = f"Earlier the customer said: {context['summary']}\n" + history_text
+    
+    prompt = f"Context: {order_info}{allergen_info}\n{history_text}Customer: {user_message}"
+    
+    # Use AI for complex queries
+    ai_response = yield OllamaCall(prompt, system_prompt, 180, priority=PRIORITY_CHAT)
     
     if ai_response and len(ai_response) > 20:
         # Clean up response
@@ -286,10 +500,10 @@ Guidelines:
 def check_allergen_safety_ai(dish_name: str, dish_allergens: List[str], user_allergens: List[str]) -> str:
     """Professional allergen safety check."""
     
-    dish_a = [a.lower() for a in dish_allergens]
+    allergen_index = get_catalog().allergens
     user_a = [a.lower() for a in user_allergens]
     
-    dangerous = [a for a in user_a if a in dish_a]
+    dangerous = allergen_index.conflicts_for_mask(allergen_index.mask(dish_allergens), user_a)
     
     if dangerous:
         return f"""⚠️  **ALLERGEN WARNING**
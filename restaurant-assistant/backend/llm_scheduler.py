@@ -0,0 +1,128 @@
+"""
+Admission control in front of Ollama.
+
+At most max_concurrency generations run at once; the rest wait in a priority
+queue (order-related turns before chit-chat). A request whose expected queue
+wait exceeds the budget, or that waits longer than it, is shed: the caller
+gets None and answers with its deterministic fallback text.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Awaitable, Callable, Optional
+
+# Lower runs first
+PRIORITY_ORDER = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_CHAT = 2
+
+MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
+QUEUE_BUDGET = float(os.getenv("OLLAMA_QUEUE_BUDGET", "10"))
+
+
+class OllamaScheduler:
+    """Priority-queued semaphore with queue metrics and load shedding."""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, wait_budget: float = QUEUE_BUDGET):
+        self.max_concurrency = max_concurrency
+        self.wait_budget = wait_budget
+        self.active = 0
+        self.waiting = 0
+        self._queue: list = []
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.shed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        # Moving average of generation time, used to predict queue waits
+        self.avg_service = 2.0
+
+    def estimated_wait(self, priority: int) -> float:
+        """Predicted queue wait for a new request at this priority."""
+        if self.active < self.max_concurrency and not self.waiting:
+            return 0.0
+        ahead = sum(1 for p, _, fut in self._queue if p <= priority and not fut.done())
+        return (ahead + 1) / self.max_concurrency * self.avg_service
+
+    async def acquire(self, priority: int = PRIORITY_DEFAULT) -> bool:
+        """Wait for a slot; False means the request was shed."""
+        if self.active < self.max_concurrency and not self.waiting:
+            self.active += 1
+            self.admitted += 1
+            return True
+
+        if self.estimated_wait(priority) > self.wait_budget:
+            self.shed += 1
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self.waiting += 1
+        self.max_depth = max(self.max_depth, self.waiting)
+        started = time.monotonic()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.wait_budget)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            # Caller cancelled while queued: withdraw, or give back a slot already handed over
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+        if not future.done():
+            # Timed out before a slot was handed over
+            future.cancel()
+            self.shed += 1
+            return False
+
+        self.total_wait += time.monotonic() - started
+        self.admitted += 1
+        return True
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """Free a slot and hand it to the highest-priority waiter."""
+        if service_time is not None:
+            self.avg_service = 0.8 * self.avg_service + 0.2 * service_time
+
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if not future.done():
+                # Slot passes straight to the waiter; active stays the same
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    async def run(self, priority: int, factory: Callable[[], Awaitable]):
+        """Run factory() in a slot; returns None if the request was shed."""
+        if not await self.acquire(priority):
+            print("🚦 Ollama queue full, using fallback")
+            return None
+        started = time.monotonic()
+        try:
+            return await factory()
+        finally:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_depth,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_wait_ms": round(1000 * self.total_wait / self.admitted, 1) if self.admitted else 0.0,
+            "avg_service_ms": round(1000 * self.avg_service, 1),
+        }
+
+
+SCHEDULER = OllamaScheduler()
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
+import json
+import os
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
 from backend.models import SessionState, ChatRequest, ChatResponse
-from backend.rag import load_menu
-from backend.graph_app import run_turn
+from backend.menu_catalog import get_catalog
+from backend.rag import RAG_STATUS, rag_ready, rag_stats, warm_retriever
+from backend.ollama_client import BREAKER, close_async_client
+from backend.graph_app import ANSWER_TIERS, arun_turn, astream_turn
+from backend.llm import ASYNC_FLIGHT, LLM_CACHE
+from backend.llm_scheduler import SCHEDULER
+from backend.prompt_budget import prompt_stats
+from backend.session_store import create_session_store
+from backend.email_outbox import get_outbox, outbox_stats, stop_outbox
+from backend.email_service import EMAIL_OUTBOX, EMAIL_SERVER_CLIENT
+from backend.mcp_email_server.client import EmailServerError
 
 app = FastAPI(title="AI Restaurant Assistant API")
 
@@ -16,8 +27,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session storage (use Redis in production)
-SESSIONS: Dict[str, SessionState] = {}
+# Session storage; SESSION_STORE=sqlite or redis to share sessions between workers
+SESSIONS = create_session_store()
+
+
+@app.on_event("startup")
+def load_catalog():
+    """Build the shared menu catalog once at startup."""
+    get_catalog()
+    # Load the embedding model and index without blocking startup
+    if os.getenv("RAG_WARMUP", "1") == "1":
+        warm_retriever()
+    # Deliver anything left in the outbox by a previous run. With an email
+    # server the local outbox is only its fallback and starts on first use.
+    if EMAIL_OUTBOX and EMAIL_SERVER_CLIENT is None:
+        get_outbox()
+
+
+@app.on_event("shutdown")
+async def close_clients():
+    await close_async_client()
+    stop_outbox()
 
 
 @app.get("/")
@@ -25,31 +55,78 @@ def root():
     return {"message": "AI Restaurant Assistant API", "status": "running"}
 
 
+@app.get("/ready")
+def ready(response: Response):
+    """Report whether the embedding model and vector index are loaded."""
+    is_ready = rag_ready()
+    if not is_ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if is_ready else "warming",
+        "embedding_model": RAG_STATUS["embedding_model"],
+        "index": RAG_STATUS["index"],
+        "error": RAG_STATUS["error"],
+    }
+
+
+@app.get("/stats")
+def stats():
+    """Cache and performance counters."""
+    return {
+        "rag": rag_stats(),
+        "ollama": {
+            "breaker": BREAKER.stats(),
+            "response_cache": LLM_CACHE.stats(),
+            "coalescing": ASYNC_FLIGHT.stats(),
+            "scheduler": SCHEDULER.stats(),
+            "prompts": prompt_stats(),
+        },
+        "answer_tiers": ANSWER_TIERS,
+        "sessions": SESSIONS.stats(),
+        "email_outbox": outbox_stats() if EMAIL_OUTBOX else {"enabled": False},
+        "email_server": _email_server_stats(),
+    }
+
+
+def _email_server_stats() -> dict:
+    if EMAIL_SERVER_CLIENT is None:
+        return {"enabled": False}
+    try:
+        return EMAIL_SERVER_CLIENT.stats()
+    except EmailServerError as e:
+        return {"enabled": True, "error": str(e)}
+
+
 @app.get("/menu")
 def get_menu():
     """Get full menu."""
-    return load_menu()
+    return get_catalog().items
 
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
-    """Handle chat interaction."""
-    # Get or create session
-    state = SESSIONS.get(req.session_id, SessionState())
+async def _load_session(req: ChatRequest) -> SessionState:
+    """Get or create the session for a request."""
+    state = await SESSIONS.aget(req.session_id) or SessionState()
     
     # Set allergens if provided
     if req.user_allergens:
         state.allergens = [a.lower().strip() for a in req.user_allergens]
+    return state
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    """Handle chat interaction."""
+    state = await _load_session(req)
     
     # Process turn
-    state, assistant_message = run_turn(
+    state, assistant_message = await arun_turn(
         state,
         req.user_message,
         user_email=req.user_email
     )
     
     # Save session
-    SESSIONS[req.session_id] = state
+    await SESSIONS.aset(req.session_id, state)
     
     return ChatResponse(
         assistant_message=assistant_message,
@@ -58,10 +135,51 @@ def chat(req: ChatRequest):
     )
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """Handle chat interaction, streaming model tokens as Server-Sent Events.
+
+    Emits "token" events with partial text while the model generates, then a
+    single "done" event carrying the final message, order and total.
+    """
+    state = await _load_session(req)
+
+    async def events():
+        async for kind, value in astream_turn(state, req.user_message, user_email=req.user_email):
+            if kind == "token":
+                yield _sse("token", {"text": value})
+                continue
+
+            new_state, assistant_message = value
+            await SESSIONS.aset(req.session_id, new_state)
+            response = ChatResponse(
+                assistant_message=assistant_message,
+                current_order=new_state.current_order,
+                current_total=new_state.current_total,
+            )
+            yield _sse("done", response.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/session/{session_id}/order")
+async def get_session_order(session_id: str):
+    """Current order and total of a session (e.g. after a stream that broke off)."""
+    state = await SESSIONS.aget(session_id) or SessionState()
+    return {"current_order": state.current_order, "current_total": state.current_total}
+
+
 @app.delete("/session/{session_id}")
-def clear_session(session_id: str):
+async def clear_session(session_id: str):
     """Clear a session."""
-    if session_id in SESSIONS:
-        del SESSIONS[session_id]
+    if await SESSIONS.adelete(session_id):
         return {"message": "Session cleared"}
     return {"message": "Session not found"}
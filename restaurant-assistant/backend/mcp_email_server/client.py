@@ -0,0 +1,106 @@
+"""
+Blocking client for the local email server (see server.py).
+
+One socket is kept open and reused for every request; if the server closed
+it in between, a fresh connection is opened first. A request is only retried
+when it failed before it was written: once sent, the server may already have
+queued the email, so a lost reply raises EmailServerNoReply instead. Each new
+connection starts by sending the shared EMAIL_SERVER_TOKEN.
+"""
+import itertools
+import json
+import os
+import select
+import socket
+import threading
+from typing import Optional
+
+
+class EmailServerError(Exception):
+    """The email server answered with an error, or could not be reached."""
+
+
+class EmailServerNoReply(EmailServerError):
+    """The request was sent but no reply came back; the server may have acted on it."""
+
+
+class EmailServerClient:
+    def __init__(self, address: str, timeout: float = 5.0, token: Optional[str] = None):
+        host, _, port = address.rpartition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port)
+        self.timeout = timeout
+        self.token = token if token is not None else os.getenv("EMAIL_SERVER_TOKEN", "")
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def _connect(self) -> None:
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._file = self._sock.makefile("rb")
+        response = self._request("auth", {"token": self.token})
+        if "error" in response:
+            self.close()
+            raise EmailServerError(f"email server refused the token: {response['error']['message']}")
+
+    def _request(self, method: str, params: dict) -> dict:
+        """Write one request on the open socket and read its response."""
+        self._send(method, params)
+        return self._receive()
+
+    def _send(self, method: str, params: dict) -> None:
+        request = json.dumps({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+        self._sock.sendall(request.encode("utf-8") + b"\n")
+
+    def _receive(self) -> dict:
+        line = self._file.readline()
+        if not line:
+            raise ConnectionResetError("email server closed the connection")
+        return json.loads(line)
+
+    def _stale(self) -> bool:
+        """Whether the server closed the kept-open socket while it was idle."""
+        # The server never writes unprompted, so a readable idle socket means EOF or reset
+        readable, _, _ = select.select([self._sock], [], [], 0)
+        return bool(readable)
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = None
+        self._file = None
+
+    def call(self, method: str, **params):
+        """Send one request and return its result."""
+        with self._lock:
+            if self._sock is not None and self._stale():
+                self.close()
+            for attempt in range(2):
+                reused = self._sock is not None
+                sent = False
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    self._send(method, params)
+                    sent = True
+                    response = self._receive()
+                    break
+                except OSError as e:
+                    self.close()
+                    if sent:
+                        raise EmailServerNoReply(f"no reply from the email server: {e}") from e
+                    if attempt or not reused:
+                        raise EmailServerError(f"email server unreachable: {e}") from e
+
+        if "error" in response:
+            raise EmailServerError(response["error"]["message"])
+        return response["result"]
+
+    def send_email(self, sender: str, recipient: str, message: bytes) -> int:
+        """Queue a ready MIME message on the server; returns its outbox id."""
+        return self.call("send_email", sender=sender, recipient=recipient, message=message.decode("utf-8"))["id"]
+
+    def stats(self) -> dict:
+        return self.call("stats")
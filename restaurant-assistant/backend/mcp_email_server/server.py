@@ -1,62 +1,198 @@
+"""
+Local email server.
+
+A long-running process that takes outgoing email off the API's hands. The
+backend connects over local TCP and sends one JSON-RPC request per line;
+the reply comes back as soon as the message is stored in the server's
+outbox. Worker threads then deliver the queue in batches per recipient
+domain, pipelining the messages of a batch over one kept-open SMTP session
+(see backend.email_outbox).
+
+Clients must authenticate first: the first request on a connection has to
+be {"method": "auth", "params": {"token": ...}} with the EMAIL_SERVER_TOKEN
+shared with the backend, or the connection is closed. Without the token any
+local process could send mail as SMTP_USER, so the server will not start
+without one.
+
+Methods:
+- auth {token}: must come first on every connection
+- send_email {sender, recipient, message}: queue a ready MIME message
+- send_invoice_email {recipient_email, subject, html_body}: build and queue an HTML email
+- stats: queue depth (total and per domain), send latency and batching counters
+- ping
+
+Run from the project root: python -m backend.mcp_email_server.server
+"""
+import asyncio
+import hmac
+import json
 import os
-import smtplib
+import signal
+import sys
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+from backend.email_outbox import EMAIL_BATCH_SIZE, EMAIL_WORKERS, Outbox, OutboxWorkers
+
 # Load environment variables
 load_dotenv()
 
+HOST = os.getenv("EMAIL_SERVER_HOST", "127.0.0.1")
+PORT = int(os.getenv("EMAIL_SERVER_PORT", "5000"))
+SERVER_DB = os.getenv("EMAIL_SERVER_DB", "email_server.sqlite3")
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
 SMTP_USER = os.getenv("SMTP_USER")
-SMTP_PASS = os.getenv("SMTP_PASS")
-
-
-def send_email(recipient: str, subject: str, html_body: str):
-    """Send email via SMTP."""
-    try:
-        msg = MIMEMultipart('alternative')
-        msg["Subject"] = subject
-        msg["From"] = SMTP_USER
-        msg["To"] = recipient
-        
-        html_part = MIMEText(html_body, "html")
-        msg.attach(html_part)
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
-        
-        return {"status": "success", "message": f"Email sent to {recipient}"}
-    
-    except Exception as e:
-        return {"status": "error", "message": str(e)}
-
-
-# MCP Server setup (pseudo-code - adapt to your MCP SDK)
-# This is a simplified version - you'll need to use the actual MCP SDK from your course
+SERVER_TOKEN = os.getenv("EMAIL_SERVER_TOKEN", "")
+# Longest request line accepted (a whole MIME message travels in one request)
+MAX_REQUEST_BYTES = int(os.getenv("EMAIL_SERVER_MAX_REQUEST", str(16 * 1024 * 1024)))
 
-"""
-from mcp.server import MCPServer
 
-server = MCPServer("email_server")
+def build_email(recipient: str, subject: str, html_body: str) -> bytes:
+    """An HTML email ready for SMTP (CRLF line endings)."""
+    msg = MIMEMultipart('alternative')
+    msg["Subject"] = subject
+    msg["From"] = SMTP_USER
+    msg["To"] = recipient
+    msg.attach(MIMEText(html_body, "html"))
+    return msg.as_bytes(policy=msg.policy.clone(linesep="\r\n"))
 
-@server.tool(
-    name="send_invoice_email",
-    description="Send restaurant invoice by email"
-)
-def send_invoice_email(recipient_email: str, subject: str, html_body: str):
-    return send_email(recipient_email, subject, html_body)
 
-if __name__ == "__main__":
-    server.run(port=5000)
-"""
+class EmailServer:
+    """Answers RPC requests and queues messages for the delivery workers."""
 
-# For now, simple function-based approach
-if __name__ == "__main__":
+    def __init__(self, outbox: Outbox, workers: OutboxWorkers, token: str = SERVER_TOKEN):
+        if not token:
+            raise ValueError("EMAIL_SERVER_TOKEN is not set")
+        self.outbox = outbox
+        self.workers = workers
+        self.token = token
+        self.started = time.time()
+        self.clients = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Listen for clients; request lines may be up to MAX_REQUEST_BYTES long."""
+        return await asyncio.start_server(self.handle, host, port, limit=MAX_REQUEST_BYTES)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one client connection; it stays open for many requests."""
+        self.clients += 1
+        authenticated = False
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Over the reader limit: the rest of the line cannot be framed, so answer and hang up
+                    self.errors += 1
+                    error = {"code": -32600, "message": f"Request larger than {MAX_REQUEST_BYTES} bytes"}
+                    writer.write(json.dumps({"jsonrpc": "2.0", "id": None, "error": error}).encode("utf-8") + b"\n")
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                if authenticated:
+                    response = await self.dispatch(line)
+                else:
+                    response = self.authenticate(line)
+                    authenticated = "result" in response
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+                if not authenticated:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            # Client went away, or the server is shutting down
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    def authenticate(self, line: bytes) -> dict:
+        """Check the auth request that must open every connection."""
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            token = (request.get("params") or {}).get("token", "")
+            if request.get("method") == "auth" and hmac.compare_digest(str(token).encode(), self.token.encode()):
+                return {"jsonrpc": "2.0", "id": request_id, "result": "ok"}
+        except (ValueError, AttributeError):
+            pass
+        self.rejected += 1
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32001, "message": "Unauthorized"}}
+
+    async def dispatch(self, line: bytes) -> dict:
+        self.requests += 1
+        request_id = None
+        try:
+            request = json.loads(line)
+            request_id = request.get("id")
+            result = await self.call(request.get("method"), request.get("params") or {})
+            return {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except Exception as e:
+            self.errors += 1
+            return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32000, "message": str(e)}}
+
+    async def call(self, method: str, params: dict):
+        if method == "send_email":
+            message = params["message"].encode("utf-8")
+            message_id = await asyncio.to_thread(self.outbox.enqueue, params["sender"], params["recipient"], message)
+            return {"id": message_id}
+        if method == "send_invoice_email":
+            recipient = params["recipient_email"]
+            message = build_email(recipient, params["subject"], params["html_body"])
+            message_id = await asyncio.to_thread(self.outbox.enqueue, SMTP_USER, recipient, message)
+            return {"id": message_id}
+        if method == "stats":
+            return await asyncio.to_thread(self.stats)
+        if method == "ping":
+            return "pong"
+        if method == "auth":
+            return "ok"
+        raise ValueError(f"Unknown method: {method}")
+
+    def stats(self) -> dict:
+        return {
+            "uptime": round(time.time() - self.started),
+            "clients": self.clients,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "queue": self.outbox.stats(),
+            "delivery": self.workers.stats(),
+        }
+
+
+async def main():
+    if not SERVER_TOKEN:
+        print("❌ Set EMAIL_SERVER_TOKEN (shared with the backend) to start the email server", file=sys.stderr)
+        sys.exit(1)
+    outbox = Outbox(SERVER_DB)
+    workers = OutboxWorkers(outbox, workers=EMAIL_WORKERS, batch_size=EMAIL_BATCH_SIZE)
+    workers.start()
+    email_server = EmailServer(outbox, workers)
+
+    server = await email_server.start(HOST, PORT)
     print("MCP Email Server running...")
     print(f"SMTP configured: {SMTP_SERVER}:{SMTP_PORT}")
-    print("Waiting for email requests...")
-    # In production, this would be an actual MCP server loop
+    print(f"📧 Listening on {HOST}:{PORT}, queue in {SERVER_DB}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with server:
+        await stop.wait()
+    # Messages not yet sent stay in the outbox for the next start
+    await asyncio.to_thread(workers.stop)
+    print("📧 Email server stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Process-wide menu catalog with precomputed lookup indexes.
+
+The menu is parsed once and shared by every request; it is rebuilt only when
+menu.json changes on disk.
+"""
+import os
+import threading
+from typing import Dict, List, Optional
+
+from backend.allergens import AllergenIndex
+from backend.dish_matcher import DishMatcher
+from backend.rag import MENU_PATH, load_menu
+
+
+class MenuCatalog:
+    """Immutable snapshot of the menu plus lookup indexes."""
+
+    def __init__(self, items: List[Dict], mtime_ns: int = 0, version: int = 1):
+        self.items = items
+        self.mtime_ns = mtime_ns
+        self.version = version
+
+        self.by_id: Dict[str, Dict] = {}
+        self.by_name: Dict[str, Dict] = {}
+        self.by_category: Dict[str, List[Dict]] = {}
+        self.by_allergen: Dict[str, List[Dict]] = {}
+        self._names_lower: List[tuple] = []
+
+        for item in items:
+            name_lower = item["name"].lower()
+            self.by_id[item["id"]] = item
+            self.by_name.setdefault(name_lower, item)
+            self.by_category.setdefault(item.get("category", "main"), []).append(item)
+            for allergen in item.get("allergens", []):
+                self.by_allergen.setdefault(allergen.lower(), []).append(item)
+            self._names_lower.append((name_lower, item))
+
+        self.allergens = AllergenIndex(items)
+        self.matcher = DishMatcher(items)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, item_id: str) -> Optional[Dict]:
+        """Get a menu item by id."""
+        return self.by_id.get(item_id)
+
+    def get_by_name(self, name: str) -> Optional[Dict]:
+        """Get a menu item by its exact (case-insensitive) name."""
+        return self.by_name.get(name.lower())
+
+    def find_by_name(self, name: str) -> Optional[Dict]:
+        """Find a menu item by exact name, falling back to a partial match."""
+        name_lower = name.lower()
+        item = self.by_name.get(name_lower)
+        if item:
+            return item
+        for item_name, item in self._names_lower:
+            if name_lower in item_name:
+                return item
+        return None
+
+
+_CATALOG: Optional[MenuCatalog] = None
+_LOCK = threading.Lock()
+
+
+def get_catalog() -> MenuCatalog:
+    """Get the shared menu catalog, reloading it if menu.json has changed."""
+    global _CATALOG
+
+    try:
+        mtime_ns = os.stat(MENU_PATH).st_mtime_ns
+    except OSError:
+        if _CATALOG is not None:
+            return _CATALOG
+        raise
+
+    catalog = _CATALOG
+    if catalog is not None and catalog.mtime_ns == mtime_ns:
+        return catalog
+
+    with _LOCK:
+        if _CATALOG is None or _CATALOG.mtime_ns != mtime_ns:
+            version = _CATALOG.version + 1 if _CATALOG else 1
+            _CATALOG = MenuCatalog(load_menu(), mtime_ns, version)
+            print(f"📖 Menu catalog loaded: {len(_CATALOG)} items (v{version})")
+        return _CATALOG
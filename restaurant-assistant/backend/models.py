@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from typing import List, Optional, Dict, Any
 
 
@@ -17,13 +17,18 @@ class Reservation(BaseModel):
 
 
 class SessionState(BaseModel):
-    history: List[Dict[str, Any]] = []
+    history: List[Dict[str, Any]] = []  # Last HISTORY_WINDOW messages (see backend.history)
+    summary: str = ""  # Rolling summary of older user messages
     current_order: List[OrderItem] = []
     current_total: float = 0.0
     allergens: List[str] = []
     reservation: Optional[Reservation] = None
     mode: str = "chat"
     last_question: Optional[str] = None  # Track context
+    order_undo: List[List[List[Any]]] = []  # Undo log of the order (see backend.orders)
+
+    # Cached backend.orders.Order for current_order; not serialized
+    _order: Any = PrivateAttr(default=None)
 
 
 class ChatRequest(BaseModel):
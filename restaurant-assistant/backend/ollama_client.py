@@ -0,0 +1,243 @@
+"""
+Shared HTTP client for the Ollama server.
+
+Keeps a pool of keep-alive connections, uses separate connect/read timeouts,
+retries connection failures and 5xx responses with backoff, and trips a
+circuit breaker so a saturated model server fails fast to the fallback text.
+generate() is the blocking client; agenerate() is its asyncio counterpart and
+astream_generate() yields streamed chunks as Ollama produces them.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
+MODEL = os.getenv("OLLAMA_MODEL", "phi3:mini")
+
+POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "25"))
+RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
+BACKOFF = float(os.getenv("OLLAMA_BACKOFF", "0.5"))
+
+BREAKER_THRESHOLD = int(os.getenv("OLLAMA_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET = float(os.getenv("OLLAMA_BREAKER_RESET", "30"))
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one trial call through after a cool-down."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._fail()
+
+    def settle(self) -> None:
+        """Call when a request ends, however it ends.
+
+        A half-open trial that got neither a success nor a failure recorded
+        (cancelled, bad response body, client dropped the stream) counts as a
+        failure; otherwise the breaker would wait for its verdict forever.
+        """
+        with self._lock:
+            if self._trial_in_flight:
+                self._fail()
+
+    def _fail(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+def _make_session() -> requests.Session:
+    # Read timeouts are not retried: a stalled generation would only stall again
+    retry = Retry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=0,
+        status=RETRIES,
+        backoff_factor=BACKOFF,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = _make_session()
+BREAKER = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+
+
+def generate(payload: dict) -> Optional[dict]:
+    """POST a generate request; returns the JSON body or None on failure."""
+    if not BREAKER.allow():
+        print("⚡ Ollama circuit open, using fallback")
+        return None
+
+    try:
+        try:
+            response = SESSION.post(OLLAMA_URL, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        except requests.RequestException as e:
+            BREAKER.record_failure()
+            print(f"❌ Error: {e}")
+            return None
+
+        if response.status_code != 200:
+            BREAKER.record_failure()
+            print(f"❌ Ollama returned HTTP {response.status_code}")
+            return None
+
+        try:
+            body = response.json()
+        except ValueError as e:
+            BREAKER.record_failure()
+            print(f"❌ Ollama sent a malformed body: {e}")
+            return None
+        BREAKER.record_success()
+        return body
+    finally:
+        BREAKER.settle()
+
+
+_ASYNC_CLIENT: Optional[httpx.AsyncClient] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Get the shared async client (created on first use, inside the event loop)."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = httpx.AsyncClient(
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            transport=httpx.AsyncHTTPTransport(
+                retries=RETRIES,
+                limits=httpx.Limits(max_connections=None, max_keepalive_connections=POOL_SIZE),
+            ),
+        )
+    return _ASYNC_CLIENT
+
+
+async def close_async_client() -> None:
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is not None:
+        await _ASYNC_CLIENT.aclose()
+        _ASYNC_CLIENT = None
+
+
+async def agenerate(payload: dict) -> Optional[dict]:
+    """Async generate request; returns the JSON body or None on failure."""
+    if not BREAKER.allow():
+        print("⚡ Ollama circuit open, using fallback")
+        return None
+
+    client = get_async_client()
+    try:
+        for attempt in range(RETRIES + 1):
+            try:
+                # The transport already retries failed connects
+                response = await client.post(OLLAMA_URL, json=payload)
+            except httpx.HTTPError as e:
+                BREAKER.record_failure()
+                print(f"❌ Error: {e}")
+                return None
+
+            if response.status_code in (502, 503, 504) and attempt < RETRIES:
+                await asyncio.sleep(BACKOFF * (2 ** attempt))
+                continue
+            break
+
+        if response.status_code != 200:
+            BREAKER.record_failure()
+            print(f"❌ Ollama returned HTTP {response.status_code}")
+            return None
+
+        try:
+            body = response.json()
+        except ValueError as e:
+            BREAKER.record_failure()
+            print(f"❌ Ollama sent a malformed body: {e}")
+            return None
+        BREAKER.record_success()
+        return body
+    finally:
+        BREAKER.settle()
+
+
+async def astream_generate(payload: dict):
+    """Stream a generate request, yielding each JSON chunk; yields nothing on failure."""
+    if not BREAKER.allow():
+        print("⚡ Ollama circuit open, using fallback")
+        return
+
+    client = get_async_client()
+    try:
+        async with client.stream("POST", OLLAMA_URL, json={**payload, "stream": True}) as response:
+            if response.status_code != 200:
+                BREAKER.record_failure()
+                print(f"❌ Ollama returned HTTP {response.status_code}")
+                return
+            async for line in response.aiter_lines():
+                if line.strip():
+                    try:
+                        chunk = json.loads(line)
+                    except ValueError as e:
+                        BREAKER.record_failure()
+                        print(f"❌ Ollama sent a malformed stream line: {e}")
+                        return
+                    yield chunk
+        BREAKER.record_success()
+    except httpx.HTTPError as e:
+        BREAKER.record_failure()
+        print(f"❌ Error: {e}")
+    finally:
+        # Also runs when the consumer stops early (aclose) or the body is bad
+        BREAKER.settle()
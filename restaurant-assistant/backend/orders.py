@@ -0,0 +1,180 @@
+"""
+Order aggregate over SessionState.current_order.
+
+Lines are indexed by item id and the subtotal is kept in Decimal cents and
+updated on every change, so adding to or changing a line is O(1) and totals
+are never recomputed from the whole order. VAT and total are derived from
+the subtotal with one rounding rule, shared by the chat summary, the bill
+and the bill email. Every public operation can be undone. A line holds at
+most MAX_QUANTITY of its dish; larger requests are capped.
+
+The undo log lives in SessionState.order_undo as plain lists, so it is
+saved with the session by every store and "undo" works on a later turn.
+"""
+import os
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.models import OrderItem, SessionState
+
+CENT = Decimal("0.01")
+VAT_RATE = Decimal(os.getenv("VAT_RATE", "0.12"))
+UNDO_DEPTH = 20
+MAX_QUANTITY = int(os.getenv("MAX_LINE_QUANTITY", "99"))
+
+
+def vat_label() -> str:
+    """How VAT is shown on summaries and bills, e.g. "VAT (12%)"."""
+    return f"VAT ({format(VAT_RATE.scaleb(2).normalize(), 'f')}%)"
+
+
+def money(value) -> Decimal:
+    """Exact amount in cents (floats go through their shortest repr)."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Order:
+    """Lines keyed by item id with incrementally maintained totals."""
+
+    def __init__(self, state: SessionState):
+        self.state = state
+        self.lines = state.current_order
+        self.index: Dict[str, OrderItem] = {line.item_id: line for line in self.lines}
+        self.subtotal = sum((money(line.price) * line.quantity for line in self.lines), Decimal("0.00"))
+        # One entry per operation, each a list of changes to revert in reverse:
+        # ["added", item_id], ["quantity", item_id, old], ["removed", line, position], ["cleared", lines]
+        # with lines as dicts
+        self._undo: list = state.order_undo
+        self._sync()
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    @property
+    def vat(self) -> Decimal:
+        return (self.subtotal * VAT_RATE).quantize(CENT, rounding=ROUND_HALF_UP)
+
+    @property
+    def total(self) -> Decimal:
+        return self.subtotal + self.vat
+
+    @staticmethod
+    def line_total(line: OrderItem) -> Decimal:
+        return money(line.price) * line.quantity
+
+    def get(self, item_id: str) -> Optional[OrderItem]:
+        return self.index.get(item_id)
+
+    def room(self, item_id: str) -> int:
+        """How many more of an item its line can take."""
+        line = self.index.get(item_id)
+        return MAX_QUANTITY - (line.quantity if line is not None else 0)
+
+    def add(self, item: Dict, quantity: int = 1) -> OrderItem:
+        """Add quantity of a menu item, merging with its existing line."""
+        return self.add_many([(item, quantity)])[0]
+
+    def add_many(self, items: Iterable[Tuple[Dict, int]]) -> List[OrderItem]:
+        """Add several (menu item, quantity) pairs as one undoable operation."""
+        changes = []
+        added = []
+        for item, quantity in items:
+            quantity = min(quantity, self.room(item["id"]))
+            line = self.index.get(item["id"])
+            if line is None:
+                line = OrderItem(item_id=item["id"], name=item["name"], quantity=quantity, price=item["price"])
+                self.lines.append(line)
+                self.index[line.item_id] = line
+                changes.append(["added", line.item_id])
+            else:
+                changes.append(["quantity", line.item_id, line.quantity])
+                line.quantity += quantity
+            self.subtotal += money(line.price) * quantity
+            added.append(line)
+        self._record(changes)
+        return added
+
+    def set_quantity(self, item_id: str, quantity: int) -> Optional[OrderItem]:
+        """Change a line's quantity; 0 or less removes it."""
+        line = self.index.get(item_id)
+        if line is None:
+            return None
+        if quantity <= 0:
+            return self.remove(item_id)
+        quantity = min(quantity, MAX_QUANTITY)
+        self.subtotal += money(line.price) * (quantity - line.quantity)
+        self._record([["quantity", item_id, line.quantity]])
+        line.quantity = quantity
+        return line
+
+    def remove(self, item_id: str) -> Optional[OrderItem]:
+        """Remove a line; returns it, or None if it was not in the order."""
+        line = self.index.pop(item_id, None)
+        if line is None:
+            return None
+        position = self.lines.index(line)
+        del self.lines[position]
+        self.subtotal -= self.line_total(line)
+        self._record([["removed", line.model_dump(), position]])
+        return line
+
+    def clear(self) -> None:
+        saved = [line.model_dump() for line in self.lines]
+        self.lines.clear()
+        self.index.clear()
+        self.subtotal = Decimal("0.00")
+        self._record([["cleared", saved]])
+
+    def undo(self) -> bool:
+        """Revert the last operation; False if there is nothing to undo."""
+        if not self._undo:
+            return False
+        for change in reversed(self._undo.pop()):
+            kind = change[0]
+            if kind == "added":
+                line = self.index.pop(change[1], None)
+                if line is None:
+                    # Dropped when the session was loaded (item left the menu)
+                    continue
+                if self.lines and self.lines[-1] is line:
+                    self.lines.pop()
+                else:
+                    self.lines.remove(line)
+                self.subtotal -= self.line_total(line)
+            elif kind == "quantity":
+                line = self.index.get(change[1])
+                if line is None:
+                    continue
+                self.subtotal += money(line.price) * (change[2] - line.quantity)
+                line.quantity = change[2]
+            elif kind == "removed":
+                line, position = OrderItem(**change[1]), change[2]
+                if line.item_id in self.index:
+                    continue
+                self.lines.insert(position, line)
+                self.index[line.item_id] = line
+                self.subtotal += self.line_total(line)
+            else:
+                self.lines[:] = [OrderItem(**saved) for saved in change[1]]
+                self.index = {line.item_id: line for line in self.lines}
+                self.subtotal = sum((self.line_total(line) for line in self.lines), Decimal("0.00"))
+        self._sync()
+        return True
+
+    def _record(self, changes: list) -> None:
+        self._undo.append(changes)
+        del self._undo[:-UNDO_DEPTH]
+        self._sync()
+
+    def _sync(self) -> None:
+        self.state.current_total = float(self.subtotal)
+
+
+def get_order(state: SessionState) -> Order:
+    """The order aggregate for a session, built once and reused while the session lives."""
+    order = state._order
+    if (order is None or order.lines is not state.current_order or order._undo is not state.order_undo
+            or len(order.index) != len(state.current_order)):
+        order = Order(state)
+        state._order = order
+    return order
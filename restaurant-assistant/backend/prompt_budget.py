@@ -0,0 +1,83 @@
+"""
+Prompt budgeting for Ollama calls.
+
+Prompts are built from compact structured context (item ids, names and
+prices) rather than the rendered chat menus, and conversation history is
+trimmed oldest-first so the whole prompt stays inside a token budget.
+Token counts are estimates; no tokenizer is loaded.
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+
+NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "3072"))
+HISTORY_BUDGET = int(os.getenv("PROMPT_HISTORY_BUDGET", "120"))
+HISTORY_MESSAGE_CHARS = int(os.getenv("PROMPT_HISTORY_MESSAGE_CHARS", "100"))
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+PROMPT_STATS = {"prompts": 0, "estimated_tokens": 0, "history_dropped": 0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token count: one per word or symbol, more for long words."""
+    if not text:
+        return 0
+    return sum(1 + len(piece) // 7 for piece in _PIECES.findall(text))
+
+
+def menu_context(items: Iterable[Dict], sep: str = "; ") -> str:
+    """One short line per item: id, name and price."""
+    return sep.join(f"{item['id']} {item['name']} €{item['price']:.2f}" for item in items)
+
+
+def order_context(order) -> str:
+    """Compact order lines, e.g. '2x Caesar Salad'."""
+    return ", ".join(f"{line.quantity}x {line.name}" for line in order)
+
+
+def history_context(history: Optional[List[Dict]], budget: int = HISTORY_BUDGET) -> str:
+    """Most recent history lines that fit in budget tokens, oldest first.
+
+    Older messages are dropped first; each message is cut to
+    HISTORY_MESSAGE_CHARS characters.
+    """
+    if not history or budget <= 0:
+        return ""
+
+    kept = []
+    used = 0
+    for msg in reversed(history):
+        line = f"{msg.get('role', '')}: {msg.get('content', '')[:HISTORY_MESSAGE_CHARS]}"
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+
+    PROMPT_STATS["history_dropped"] += len(history) - len(kept)
+    return "\n".join(reversed(kept))
+
+
+def history_budget(fixed_text: str, max_tokens: int) -> int:
+    """History tokens available once the fixed prompt and the reply fit in num_ctx."""
+    room = NUM_CTX - max_tokens - estimate_tokens(fixed_text)
+    return max(0, min(HISTORY_BUDGET, room))
+
+
+def record_prompt(*parts: Optional[str]) -> int:
+    """Count a prompt's estimated size in the stats; returns the estimate."""
+    tokens = sum(estimate_tokens(p) for p in parts if p)
+    PROMPT_STATS["prompts"] += 1
+    PROMPT_STATS["estimated_tokens"] += tokens
+    return tokens
+
+
+def prompt_stats() -> dict:
+    prompts = PROMPT_STATS["prompts"]
+    return {
+        **PROMPT_STATS,
+        "avg_tokens": round(PROMPT_STATS["estimated_tokens"] / prompts, 1) if prompts else 0.0,
+        "num_ctx": NUM_CTX,
+        "history_budget": HISTORY_BUDGET,
+    }
@@ -1,14 +1,50 @@
+import hashlib
 import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from array import array
 from pathlib import Path
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import SentenceTransformerEmbeddings
-from langchain_core.documents import Document
+
+from backend.cache import LRUCache
+from backend.embedding_batcher import BatchingEmbedder
+
+# LangChain, Chroma and SentenceTransformer are imported inside the functions
+# that need them, so importing this module (e.g. for load_menu) stays cheap.
 
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 MENU_PATH = DATA_DIR / "menu.json"
 FAQ_PATH = DATA_DIR / "faq.txt"
 
+# Persisted vector indexes, one sub-directory per corpus fingerprint
+INDEX_DIR = Path(os.getenv("RAG_INDEX_DIR", str(DATA_DIR / "index")))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+COLLECTION_NAME = "restaurant_assistant"
+# Vector store backend: "chroma" or "numpy" (brute force, for small corpora)
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma")
+NUMPY_INDEX_DIR = INDEX_DIR / "numpy"
+NUMPY_MMAP = os.getenv("RAG_NUMPY_MMAP", "1") == "1"
+# How many published indexes to keep on disk
+INDEX_KEEP = int(os.getenv("RAG_INDEX_KEEP", "3"))
+MODEL_FILE = "embedding_model.txt"
+
+# Cache sizes (0 disables)
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+RESULT_CACHE_SIZE = int(os.getenv("RAG_RESULT_CACHE_SIZE", "512"))
+
+# Normalized query -> embedding, and (index version, query) -> documents
+QUERY_CACHE = LRUCache(QUERY_CACHE_SIZE)
+RESULT_CACHE = LRUCache(RESULT_CACHE_SIZE)
+INDEX_VERSION = None
+
+# Micro-batching of concurrent query embeddings (batch size 1 disables)
+BATCH_SIZE = int(os.getenv("RAG_BATCH_SIZE", "32"))
+BATCH_WAIT_MS = float(os.getenv("RAG_BATCH_WAIT_MS", "5"))
+EMBEDDING_BATCHER = None
+
 
 def load_menu():
     """Load menu items list from JSON file."""
@@ -20,6 +56,8 @@ def load_menu():
 
 def build_documents():
     """Build LangChain documents from menu and FAQ."""
+    from langchain_core.documents import Document
+
     menu = load_menu()
     docs = []
 
@@ -69,15 +107,224 @@ def build_documents():
     return docs
 
 
-def get_vectorstore():
-    """Create and return a Chroma vector store."""
-    embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-    docs = build_documents()
-    vs = Chroma.from_documents(
-        docs,
-        embedding=embeddings,
-        collection_name="restaurant_assistant",
+def corpus_fingerprint(model_name: str = EMBEDDING_MODEL) -> str:
+    """Hash the menu, FAQ and embedding model that an index is built from."""
+    h = hashlib.sha256(model_name.encode("utf-8"))
+    for path in (MENU_PATH, FAQ_PATH):
+        h.update(b"\0")
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def document_id(doc) -> str:
+    """Stable id of a document: the item id for menu docs, a line hash for FAQ docs."""
+    if doc.metadata.get("type") == "menu":
+        return f"menu:{doc.metadata['id']}"
+    return "faq:" + hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()[:16]
+
+
+def _content_hash(doc) -> str:
+    """Hash everything that ends up in the index for a document."""
+    meta = {k: v for k, v in doc.metadata.items() if k != "content_hash"}
+    payload = doc.page_content + "\0" + json.dumps(meta, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def sync_index(vs, docs) -> tuple:
+    """Upsert changed documents and delete removed ones; returns (upserted, deleted)."""
+    wanted = {}
+    for doc in docs:
+        doc.metadata["content_hash"] = _content_hash(doc)
+        wanted[document_id(doc)] = doc
+
+    stored = vs.get(include=["metadatas"])
+    stored_hashes = {
+        doc_id: (meta or {}).get("content_hash")
+        for doc_id, meta in zip(stored["ids"], stored["metadatas"])
+    }
+
+    changed = [
+        doc_id for doc_id, doc in wanted.items()
+        if stored_hashes.get(doc_id) != doc.metadata["content_hash"]
+    ]
+    removed = [doc_id for doc_id in stored_hashes if doc_id not in wanted]
+
+    stale = removed + [doc_id for doc_id in changed if doc_id in stored_hashes]
+    if stale:
+        vs.delete(ids=stale)
+    if changed:
+        vs.add_documents([wanted[doc_id] for doc_id in changed], ids=changed)
+
+    return len(changed), len(removed)
+
+
+def _published_indexes(root: Path = INDEX_DIR) -> list:
+    """Published indexes built with the current embedding model, newest first."""
+    if not root.exists():
+        return []
+    indexes = []
+    for path in root.iterdir():
+        if path.name.startswith(".") or not path.is_dir():
+            continue
+        model_file = path / MODEL_FILE
+        if model_file.exists() and model_file.read_text(encoding="utf-8") == EMBEDDING_MODEL:
+            indexes.append(path)
+    return sorted(indexes, key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def _publish_index(tmp_path: Path, index_path: Path) -> None:
+    """Atomically move a finished index into place and prune old ones."""
+    try:
+        # If another worker got there first, keep theirs
+        os.rename(tmp_path, index_path)
+    except OSError:
+        pass
+    for old_path in _published_indexes(index_path.parent)[INDEX_KEEP:]:
+        shutil.rmtree(old_path, ignore_errors=True)
+
+
+def _build_chroma_index(index_path: Path, embeddings) -> None:
+    """Build the index at index_path, starting from the newest existing one."""
+    from langchain_community.vectorstores import Chroma
+
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    previous = _published_indexes()
+    tmp_path = Path(tempfile.mkdtemp(prefix=".build-", dir=INDEX_DIR))
+    try:
+        if previous:
+            shutil.copytree(previous[0], tmp_path, dirs_exist_ok=True)
+
+        vs = Chroma(
+            collection_name=COLLECTION_NAME,
+            embedding_function=embeddings,
+            persist_directory=str(tmp_path),
+        )
+        upserted, deleted = sync_index(vs, build_documents())
+        (tmp_path / MODEL_FILE).write_text(EMBEDDING_MODEL, encoding="utf-8")
+        print(f"📚 Index updated: {upserted} embedded, {deleted} removed")
+        _publish_index(tmp_path, index_path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def _build_numpy_index(index_path: Path, embeddings) -> None:
+    """Build a NumPy index at index_path, reusing vectors of unchanged documents."""
+    from backend.vector_index import NumpyVectorStore
+
+    NUMPY_INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    previous = _published_indexes(NUMPY_INDEX_DIR)
+    tmp_path = Path(tempfile.mkdtemp(prefix=".build-", dir=NUMPY_INDEX_DIR))
+    try:
+        docs = build_documents()
+        for doc in docs:
+            doc.metadata["content_hash"] = _content_hash(doc)
+
+        base = NumpyVectorStore.load(previous[0], embeddings, mmap=False) if previous else None
+        NumpyVectorStore.build(docs, embeddings, previous=base).save(tmp_path)
+        (tmp_path / MODEL_FILE).write_text(EMBEDDING_MODEL, encoding="utf-8")
+        _publish_index(tmp_path, index_path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a question so trivially different phrasings share cache entries."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+class CachedQueryEmbeddings:
+    """Wraps an embeddings model with an LRU cache of query embeddings."""
+
+    def __init__(self, embeddings, cache: LRUCache = QUERY_CACHE):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        key = normalize_query(text)
+        vector = self.cache.get(key)
+        if vector is None:
+            # float32 array: a quarter of the memory of a list of floats
+            vector = array("f", self.embeddings.embed_query(text))
+            self.cache.set(key, vector)
+        return list(vector)
+
+
+def _open_chroma_index(version: str, embeddings):
+    from langchain_community.vectorstores import Chroma
+
+    index_path = INDEX_DIR / version
+    if index_path.exists():
+        print(f"📚 Reusing vector index {version}")
+    else:
+        print(f"📚 Building vector index {version}...")
+        _build_chroma_index(index_path, embeddings)
+
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
+        persist_directory=str(index_path),
     )
+
+
+def _open_numpy_index(version: str, embeddings):
+    from backend.vector_index import NumpyVectorStore
+
+    index_path = NUMPY_INDEX_DIR / version
+    if index_path.exists():
+        print(f"📚 Reusing NumPy vector index {version}")
+    else:
+        print(f"📚 Building NumPy vector index {version}...")
+        _build_numpy_index(index_path, embeddings)
+
+    return NumpyVectorStore.load(index_path, embeddings, mmap=NUMPY_MMAP)
+
+
+def _embedding_model():
+    """Load the sentence-transformer that embeds documents and queries."""
+    from langchain_community.embeddings import SentenceTransformerEmbeddings
+
+    return SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL)
+
+
+def _open_vectorstore():
+    """Open the persisted vector store for the current corpus; returns (store, version)."""
+    global EMBEDDING_BATCHER
+
+    # The model is loaded once; a re-sync only re-embeds changed documents
+    if EMBEDDING_BATCHER is None:
+        EMBEDDING_BATCHER = BatchingEmbedder(
+            _embedding_model(),
+            max_batch=BATCH_SIZE,
+            max_wait_ms=BATCH_WAIT_MS,
+        )
+    embeddings = CachedQueryEmbeddings(EMBEDDING_BATCHER)
+    RAG_STATUS["embedding_model"] = True
+    version = corpus_fingerprint()[:16]
+
+    if RAG_BACKEND == "numpy":
+        vs = _open_numpy_index(version, embeddings)
+    else:
+        vs = _open_chroma_index(version, embeddings)
+
+    RAG_STATUS["index"] = True
+    return vs, version
+
+
+def _set_index_version(version: str) -> None:
+    """Record the index that retrieve() serves, dropping results cached for another one."""
+    global INDEX_VERSION
+    if INDEX_VERSION != version:
+        INDEX_VERSION = version
+        RESULT_CACHE.clear()
+
+
+def get_vectorstore():
+    """Open the persisted vector store, building it if the corpus changed."""
+    vs, version = _open_vectorstore()
+    _set_index_version(version)
     return vs
 
 
@@ -85,3 +332,103 @@ def get_retriever(k: int = 4):
     """Get a retriever for RAG."""
     vs = get_vectorstore()
     return vs.as_retriever(search_kwargs={"k": k})
+
+
+# Shared retriever, created on first use or by warm_retriever() and re-synced
+# when menu.json or faq.txt changes. Held with its index version as one tuple,
+# so a reader never pairs one index's results with another's version.
+RAG_STATUS = {"embedding_model": False, "index": False, "error": None}
+_SHARED = None
+_SHARED_MTIMES = None
+_SHARED_LOCK = threading.Lock()
+
+
+def _corpus_mtimes() -> tuple:
+    return tuple(os.stat(path).st_mtime_ns for path in (MENU_PATH, FAQ_PATH))
+
+
+def _shared_index(k: int = 4) -> tuple:
+    """(retriever, index version), loading on first use and re-syncing after edits.
+
+    When the menu or FAQ file changes, the caller that notices re-syncs the
+    index; other callers keep using the current retriever until it is done.
+    """
+    global _SHARED, _SHARED_MTIMES
+
+    try:
+        mtimes = _corpus_mtimes()
+    except OSError:
+        mtimes = _SHARED_MTIMES
+
+    shared = _SHARED
+    if shared is not None and mtimes == _SHARED_MTIMES:
+        return shared
+
+    if not _SHARED_LOCK.acquire(blocking=shared is None):
+        return shared
+    try:
+        try:
+            mtimes = _corpus_mtimes()
+        except OSError:
+            pass
+        if _SHARED is None or _SHARED_MTIMES != mtimes:
+            try:
+                vs, version = _open_vectorstore()
+                _SHARED = (vs.as_retriever(search_kwargs={"k": k}), version)
+                _set_index_version(version)
+                RAG_STATUS["error"] = None
+            except Exception as e:
+                RAG_STATUS["error"] = str(e)
+                if _SHARED is None:
+                    raise
+                print(f"❌ RAG re-sync failed, keeping the previous index: {e}")
+            # Not retried until the files change again
+            _SHARED_MTIMES = mtimes
+        return _SHARED
+    finally:
+        _SHARED_LOCK.release()
+
+
+def get_shared_retriever():
+    """Get the process-wide retriever, loading the model and index on first use."""
+    return _shared_index()[0]
+
+
+def warm_retriever() -> threading.Thread:
+    """Load the retriever in a background thread."""
+    def _warm():
+        try:
+            get_shared_retriever()
+            print("✅ RAG retriever ready")
+        except Exception as e:
+            print(f"❌ RAG warm-up failed: {e}")
+
+    thread = threading.Thread(target=_warm, name="rag-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def rag_ready() -> bool:
+    """Whether the shared retriever is loaded."""
+    return _SHARED is not None
+
+
+def retrieve(question: str):
+    """Retrieve documents for a question, reusing results for repeated questions."""
+    retriever, version = _shared_index()
+    key = (version, normalize_query(question))
+    docs = RESULT_CACHE.get(key)
+    if docs is None:
+        docs = retriever.invoke(question)
+        RESULT_CACHE.set(key, docs)
+    return docs
+
+
+def rag_stats() -> dict:
+    """Cache hit/miss and embedding batch counters."""
+    return {
+        "index_version": INDEX_VERSION,
+        "query_embeddings": QUERY_CACHE.stats(),
+        "results": RESULT_CACHE.stats(),
+        "batching": EMBEDDING_BATCHER.stats() if EMBEDDING_BATCHER else None,
+    }
@@ -0,0 +1,188 @@
+"""
+Compact binary encoding of SessionState for the session stores.
+
+Layout: a fixed header, one byte per order line (kind) and per history
+message (role enum), one struct-packed block of numbers (quantities, prices
+of off-menu lines, party size, string lengths), then every string
+concatenated into a single UTF-8 blob. Decoding is a handful of C-level
+unpack calls plus slicing, whatever the size of the session.
+
+Order lines that match the current menu are stored as just (item id,
+quantity); name and price come back from the catalog on decode. Lines that
+no longer match the menu (renamed item, changed price) are stored in full,
+so a round trip always gives back an equal model. Lines whose item has left
+the menu are dropped on decode and the total is recomputed without them.
+
+The order undo log, when there is one, is the last string, as compact JSON
+(it is short and bounded by orders.UNDO_DEPTH). Version 1 data, written
+before the undo log was saved, still decodes.
+"""
+import json
+import struct
+import sys
+from decimal import Decimal
+
+from backend.menu_catalog import get_catalog
+from backend.models import SessionState
+from backend.orders import money
+
+FORMAT_VERSION = 2
+_READABLE_VERSIONS = (1, 2)
+
+ROLES = ("user", "assistant", "system")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+_OTHER_ROLE = 255
+
+_LINE_REF = 0
+_LINE_FULL = 1
+
+_HAS_RESERVATION = 1
+_PREORDER = 2
+_NO_LAST_QUESTION = 4
+_HAS_UNDO = 8
+
+# version, flags, current_total, allergen count, order lines, history messages, strings
+_HEADER = struct.Struct("<BBdHIII")
+
+
+def encode_session(state: SessionState) -> bytes:
+    """Pack a session into bytes."""
+    by_id = get_catalog().by_id
+    strings = [state.mode, state.last_question or "", state.summary]
+    strings += state.allergens
+    flags = 0 if state.last_question is not None else _NO_LAST_QUESTION
+
+    kinds = bytearray()
+    quantities = []
+    prices = []
+    for line in state.current_order:
+        strings.append(line.item_id)
+        quantities.append(line.quantity)
+        item = by_id.get(line.item_id)
+        if item is not None and item["name"] == line.name and item["price"] == line.price:
+            kinds.append(_LINE_REF)
+        else:
+            kinds.append(_LINE_FULL)
+            strings.append(line.name)
+            prices.append(line.price)
+
+    people = []
+    r = state.reservation
+    if r is not None:
+        flags |= _HAS_RESERVATION | (_PREORDER if r.has_preorder else 0)
+        strings += (r.date, r.time)
+        people.append(r.people)
+
+    roles = bytearray()
+    for msg in state.history:
+        role = msg.get("role", "")
+        code = _ROLE_CODES.get(role, _OTHER_ROLE)
+        roles.append(code)
+        if code == _OTHER_ROLE:
+            strings.append(role)
+        strings.append(msg.get("content", ""))
+
+    if state.order_undo:
+        flags |= _HAS_UNDO
+        strings.append(json.dumps(state.order_undo, separators=(",", ":")))
+
+    header = _HEADER.pack(
+        FORMAT_VERSION, flags, state.current_total,
+        len(state.allergens), len(kinds), len(roles), len(strings),
+    )
+    numbers = struct.pack(
+        f"<{len(quantities)}I{len(prices)}d{len(people)}I{len(strings)}I",
+        *quantities, *prices, *people, *map(len, strings),
+    )
+    return b"".join((header, kinds, roles, numbers, "".join(strings).encode("utf-8")))
+
+
+def decode_session(data: bytes) -> SessionState:
+    """Unpack bytes written by encode_session (or a legacy JSON session)."""
+    if data[:1] == b"{":
+        return SessionState.model_validate_json(data)
+
+    version, flags, total, n_allergens, n_lines, n_history, n_strings = _HEADER.unpack_from(data)
+    if version not in _READABLE_VERSIONS:
+        raise ValueError(f"Unknown session format version: {version}")
+
+    pos = _HEADER.size
+    kinds = data[pos:pos + n_lines]
+    pos += n_lines
+    roles = data[pos:pos + n_history]
+    pos += n_history
+
+    n_full = kinds.count(_LINE_FULL)
+    n_people = 1 if flags & _HAS_RESERVATION else 0
+    fmt = f"<{n_lines}I{n_full}d{n_people}I{n_strings}I"
+    numbers = struct.unpack_from(fmt, data, pos)
+    text = data[pos + struct.calcsize(fmt):].decode("utf-8")
+
+    strings = []
+    start = 0
+    for length in numbers[len(numbers) - n_strings:]:
+        end = start + length
+        strings.append(text[start:end])
+        start = end
+
+    mode, last_question, summary = strings[0], strings[1], strings[2]
+    if flags & _NO_LAST_QUESTION:
+        last_question = None
+    s = 3 + n_allergens
+    allergens = strings[3:s]
+
+    by_id = get_catalog().by_id
+    prices = iter(numbers[n_lines:n_lines + n_full])
+    order = []
+    dropped = False
+    for kind, quantity in zip(kinds, numbers[:n_lines]):
+        item_id = strings[s]
+        s += 1
+        if kind == _LINE_FULL:
+            name, price = strings[s], next(prices)
+            s += 1
+        else:
+            item = by_id.get(item_id)
+            if item is None:
+                # Item left the menu since the session was saved
+                dropped = True
+                continue
+            name, price = item["name"], item["price"]
+        order.append({"item_id": item_id, "name": name, "quantity": quantity, "price": price})
+
+    if dropped:
+        total = float(sum((money(line["price"]) * line["quantity"] for line in order), Decimal("0.00")))
+
+    reservation = None
+    if n_people:
+        reservation = {
+            "date": strings[s],
+            "time": strings[s + 1],
+            "people": numbers[n_lines + n_full],
+            "has_preorder": bool(flags & _PREORDER),
+        }
+        s += 2
+
+    history = []
+    for code in roles:
+        if code == _OTHER_ROLE:
+            role = strings[s]
+            s += 1
+        else:
+            role = ROLES[code]
+        history.append({"role": role, "content": sys.intern(strings[s])})
+        s += 1
+
+    order_undo = json.loads(strings[s]) if flags & _HAS_UNDO else []
+
+    return SessionState.model_validate({
+        "history": history,
+        "summary": summary,
+        "current_order": order,
+        "current_total": total,
+        "allergens": allergens,
+        "reservation": reservation,
+        "mode": mode,
+        "last_question": last_question,
+        "order_undo": order_undo,
+    })
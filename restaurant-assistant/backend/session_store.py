@@ -0,0 +1,189 @@
+"""
+Conversation session storage.
+
+SESSION_STORE picks the backend:
+- "memory": bounded in-process LRU with idle TTL (single worker only);
+  SESSION_COMPACT=1 keeps sessions encoded to cut their memory ~6x
+- "sqlite": a SQLite file shared by workers on one host, survives restarts
+- "redis":  any Redis-protocol server, shared by workers on many hosts
+
+Every backend expires sessions SESSION_TTL seconds after their last turn.
+The async methods run blocking backends in a worker thread.
+"""
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from backend.cache import LRUCache
+from backend.models import SessionState
+from backend.session_codec import decode_session, encode_session
+
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(4 * 3600)))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "10000"))
+SESSION_COMPACT = os.getenv("SESSION_COMPACT", "0") == "1"
+SESSION_DB = os.getenv("SESSION_DB", "sessions.sqlite3")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_PREFIX = "session:"
+
+
+class SessionStore(abc.ABC):
+    """Interface: get/set/delete a SessionState by session id."""
+
+    @abc.abstractmethod
+    def get(self, session_id: str) -> Optional[SessionState]:
+        """The stored session, or None if missing or expired."""
+
+    @abc.abstractmethod
+    def set(self, session_id: str, state: SessionState) -> None:
+        """Save a session and restart its TTL."""
+
+    @abc.abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session; returns whether it existed."""
+
+    def stats(self) -> dict:
+        return {}
+
+    async def aget(self, session_id: str) -> Optional[SessionState]:
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def aset(self, session_id: str, state: SessionState) -> None:
+        await asyncio.to_thread(self.set, session_id, state)
+
+    async def adelete(self, session_id: str) -> bool:
+        return await asyncio.to_thread(self.delete, session_id)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions kept in an LRU; the oldest are evicted past maxsize.
+
+    With compact=True sessions are held encoded (see session_codec), trading
+    a few tens of microseconds per turn for a much smaller footprint.
+    """
+
+    def __init__(self, maxsize: int = SESSION_MAX, ttl: float = SESSION_TTL, compact: bool = SESSION_COMPACT):
+        self.cache = LRUCache(maxsize, ttl=ttl)
+        self.compact = compact
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        value = self.cache.get(session_id)
+        if self.compact and value is not None:
+            return decode_session(value)
+        return value
+
+    def set(self, session_id: str, state: SessionState) -> None:
+        self.cache.set(session_id, encode_session(state) if self.compact else state)
+
+    def delete(self, session_id: str) -> bool:
+        return self.cache.delete(session_id)
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "compact": self.compact, **self.cache.stats()}
+
+    # Nothing blocks, so skip the thread hop
+    async def aget(self, session_id: str) -> Optional[SessionState]:
+        return self.get(session_id)
+
+    async def aset(self, session_id: str, state: SessionState) -> None:
+        self.set(session_id, state)
+
+    async def adelete(self, session_id: str) -> bool:
+        return self.delete(session_id)
+
+
+class SqliteSessionStore(SessionStore):
+    """Encoded sessions in a SQLite table (WAL mode, so workers can share the file)."""
+
+    def __init__(self, path: str = SESSION_DB, ttl: float = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires)")
+        self.purge()
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires > ?", (session_id, time.time())
+            ).fetchone()
+        return decode_session(row[0]) if row else None
+
+    def set(self, session_id: str, state: SessionState) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+                (session_id, encode_session(state), time.time() + self.ttl),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE id = ? AND expires > ?", (session_id, time.time())
+            )
+            self._conn.commit()
+        return cur.rowcount > 0
+
+    def purge(self) -> int:
+        """Delete expired sessions; returns how many were removed."""
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE expires <= ?", (time.time(),))
+            self._conn.commit()
+        return cur.rowcount
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"backend": "sqlite", "size": size}
+
+
+class RedisSessionStore(SessionStore):
+    """Encoded sessions as Redis strings with an expiry refreshed on every save.
+
+    Pass a client (anything with redis-py's get/set/delete) to use an
+    existing connection or a fake; otherwise one is created from url.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = SESSION_TTL, client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = int(ttl)
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        data = self.client.get(REDIS_PREFIX + session_id)
+        return decode_session(data) if data is not None else None
+
+    def set(self, session_id: str, state: SessionState) -> None:
+        self.client.set(REDIS_PREFIX + session_id, encode_session(state), ex=self.ttl)
+
+    def delete(self, session_id: str) -> bool:
+        return bool(self.client.delete(REDIS_PREFIX + session_id))
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+
+def create_session_store(kind: str = SESSION_STORE) -> SessionStore:
+    """Build the configured session store."""
+    if kind == "memory":
+        return MemorySessionStore()
+    if kind == "sqlite":
+        return SqliteSessionStore()
+    if kind == "redis":
+        return RedisSessionStore()
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
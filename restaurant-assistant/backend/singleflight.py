@@ -0,0 +1,108 @@
+"""
+Request coalescing: concurrent calls with the same key share one execution.
+
+SingleFlight is for threads (sync handlers); AsyncSingleFlight is for
+coroutines running on one event loop.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class SingleFlight:
+    """Thread-based single-flight."""
+
+    def __init__(self):
+        self.leaders = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers with the same key."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.leaders += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Coroutine-based single-flight."""
+
+    def __init__(self):
+        self.leaders = 0
+        self.shared = 0
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    def pending(self, key: Hashable) -> Optional[asyncio.Future]:
+        """The in-flight future for key, if any (counts the caller as a sharer)."""
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+        return future
+
+    def start(self, key: Hashable) -> asyncio.Future:
+        """Register the caller as leader for key; it must call finish()."""
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        return future
+
+    def finish(self, key: Hashable, future: asyncio.Future, result: Any = None,
+               error: Optional[BaseException] = None) -> None:
+        """Resolve a leader's future and stop sharing it."""
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Waiters re-raise it; avoid "exception never retrieved" warnings
+            future.exception()
+        else:
+            future.set_result(result)
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Await factory() once for all concurrent callers with the same key."""
+        future = self.pending(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = self.start(key)
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            # Only the leader's caller went away; waiters get None (fallback)
+            self.finish(key, future, None)
+            raise
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
@@ -0,0 +1,123 @@
+"""
+Brute-force NumPy vector store for small corpora.
+
+Normalized embeddings live in one contiguous float32 matrix (optionally
+memory-mapped from disk); a query is a single matrix-vector product followed
+by argpartition. Selected with RAG_BACKEND=numpy.
+"""
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+DOCUMENTS_FILE = "documents.json"
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+class NumpyRetriever:
+    """Minimal retriever exposing invoke(), like a LangChain retriever."""
+
+    def __init__(self, store: "NumpyVectorStore", k: int = 4, filter: Optional[Dict] = None):
+        self.store = store
+        self.k = k
+        self.filter = filter
+
+    def invoke(self, query: str):
+        return self.store.similarity_search(query, k=self.k, filter=self.filter)
+
+
+class NumpyVectorStore:
+    """Top-k cosine search over a float32 matrix with metadata filters."""
+
+    def __init__(self, embeddings, vectors: np.ndarray, documents: List):
+        self.embeddings = embeddings
+        self.vectors = vectors
+        self.documents = documents
+        self._masks: Dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def build(cls, docs: List, embeddings, previous: Optional["NumpyVectorStore"] = None) -> "NumpyVectorStore":
+        """Embed docs, reusing vectors from a previous store for unchanged content."""
+        reusable = {}
+        if previous is not None:
+            for row, doc in enumerate(previous.documents):
+                content_hash = doc.metadata.get("content_hash")
+                if content_hash:
+                    reusable[content_hash] = row
+
+        dim = previous.vectors.shape[1] if previous is not None and len(previous.documents) else None
+        missing = [i for i, doc in enumerate(docs) if doc.metadata.get("content_hash") not in reusable]
+        new_vectors = embeddings.embed_documents([docs[i].page_content for i in missing]) if missing else []
+        if new_vectors:
+            dim = len(new_vectors[0])
+
+        vectors = np.zeros((len(docs), dim or 0), dtype=np.float32)
+        for i, vector in zip(missing, new_vectors):
+            vectors[i] = vector
+        for i, doc in enumerate(docs):
+            row = reusable.get(doc.metadata.get("content_hash"))
+            if row is not None:
+                vectors[i] = previous.vectors[row]
+
+        print(f"📚 NumPy index: {len(missing)} embedded, {len(docs) - len(missing)} reused")
+        return cls(embeddings, _normalize(vectors), docs)
+
+    def save(self, path: Path) -> None:
+        """Write vectors and documents to a directory."""
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / VECTORS_FILE, np.ascontiguousarray(self.vectors))
+        payload = [{"page_content": d.page_content, "metadata": d.metadata} for d in self.documents]
+        with open(path / DOCUMENTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Path, embeddings, mmap: bool = True) -> "NumpyVectorStore":
+        """Load a saved store, memory-mapping the vectors if requested."""
+        from langchain_core.documents import Document
+
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r" if mmap else None)
+        with open(path / DOCUMENTS_FILE, "r", encoding="utf-8") as f:
+            documents = [Document(page_content=d["page_content"], metadata=d["metadata"]) for d in json.load(f)]
+        return cls(embeddings, vectors, documents)
+
+    def _filter_mask(self, filter: Dict) -> np.ndarray:
+        """Boolean row mask for an equality filter like {"type": "menu"}."""
+        mask = np.ones(len(self.documents), dtype=bool)
+        for key, value in filter.items():
+            cache_key = (key, value)
+            if cache_key not in self._masks:
+                self._masks[cache_key] = np.array(
+                    [doc.metadata.get(key) == value for doc in self.documents], dtype=bool
+                )
+            mask &= self._masks[cache_key]
+        return mask
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict] = None) -> List:
+        """Return the k documents most similar to the query."""
+        if not self.documents:
+            return []
+
+        query_vector = _normalize(np.asarray(self.embeddings.embed_query(query), dtype=np.float32))
+        scores = self.vectors @ query_vector
+
+        if filter:
+            scores = np.where(self._filter_mask(filter), scores, -np.inf)
+            k = min(k, int(np.isfinite(scores).sum()))
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.documents[i] for i in top]
+
+    def as_retriever(self, search_kwargs: Optional[Dict] = None) -> NumpyRetriever:
+        search_kwargs = search_kwargs or {}
+        return NumpyRetriever(self, k=search_kwargs.get("k", 4), filter=search_kwargs.get("filter"))
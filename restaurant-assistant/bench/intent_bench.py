@@ -0,0 +1,55 @@
+"""
+Intent detection: per-message cost of the compiled matcher vs the old
+keyword matcher (tests/legacy_intents.py).
+
+Run from restaurant-assistant/:
+    python bench/intent_bench.py [--rounds 2000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend.intents import detect_intent  # noqa: E402
+from backend.models import SessionState  # noqa: E402
+from tests.legacy_intents import legacy_detect_intent  # noqa: E402
+
+MESSAGES = [
+    "hello there",
+    "I want 2 pizzas and a coke",
+    "What are the ingredients of the risotto?",
+    "Can you recommend a wine to go with my steak?",
+    "book a table for 4 people on 2025-12-15 at 19:00",
+    "show my order",
+    "I don't want the salad anymore",
+    "no thanks",
+    "do you have anything gluten free? my daughter is allergic to nuts",
+    "what time do you open on sunday and is there parking nearby",
+]
+
+
+def time_per_message(detect, rounds: int) -> float:
+    state = SessionState()
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            detect(message, state)
+    return (time.perf_counter() - started) / (rounds * len(MESSAGES)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    legacy = time_per_message(legacy_detect_intent, args.rounds)
+    compiled = time_per_message(detect_intent, args.rounds)
+    print(f"legacy:   {legacy:.1f} µs/message")
+    print(f"compiled: {compiled:.1f} µs/message ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
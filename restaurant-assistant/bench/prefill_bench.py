@@ -0,0 +1,166 @@
+"""
+Prompt prefill: the stable system prefix vs the old per-session system prompt.
+
+Replays the same conversation for a few interleaved sessions and builds each
+chat prompt two ways: the current one (llm.smart_response_steps, restaurant
+prefix first) and the one used before it (order, allergies and history inside
+the system prompt). Ollama keeps one prompt cache per slot and only evaluates
+the tokens after the part shared with the previous prompt, so that is what
+costs prefill time and time to first token.
+
+By default the prompt cache is modelled in-process (no server needed), at
+--ms-per-token of CPU prefill. With --ollama the prompts are streamed to a
+real server and its time to first token and prompt_eval_count are reported.
+
+Run from restaurant-assistant/:
+    python bench/prefill_bench.py [--sessions 3] [--ollama http://localhost:11434/api/generate]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend import llm  # noqa: E402
+from backend.models import OrderItem  # noqa: E402
+from backend.prompt_budget import estimate_tokens, history_budget, history_context, order_context  # noqa: E402
+
+SCRIPT = [
+    "what is good tonight?",
+    "what do you recommend for someone who likes spicy food?",
+    "tell me about the chef and the kitchen style",
+    "is the dessert homemade?",
+    "can you suggest a nice dinner for a birthday?",
+]
+REPLY = "Our chef recommends the truffle risotto tonight, it is a customer favourite and pairs well with white wine."
+GUIDELINES = """Guidelines:
+- Answer the customer's question directly
+- Suggest relevant next steps
+- Be enthusiastic about our food
+- Prioritize allergen safety"""
+
+
+def legacy_prompt(user_message: str, context: dict, history: list):
+    """The chat prompt before the shared prefix: session context in the system prompt."""
+    order_info = ""
+    if context.get("order"):
+        order_info = f"Current order: {order_context(context['order'])} (€{context.get('total', 0):.2f}). "
+    allergen_info = ""
+    if context.get("allergens"):
+        allergen_info = f"Customer allergies: {', '.join(context['allergens'])}. "
+    fixed = f"{order_info}{allergen_info}{GUIDELINES}{user_message}"
+    history_text = history_context(history, history_budget(fixed, 180))
+    if history_text:
+        history_text = f"\nRecent conversation:\n{history_text}\n"
+    system_prompt = f"""You are a professional restaurant assistant. Be warm, helpful, and concise (2-3 sentences).
+
+Context: {order_info}{allergen_info}
+{history_text}
+{GUIDELINES}"""
+    return user_message, system_prompt
+
+
+def stable_prompt(user_message: str, context: dict, history: list):
+    """The prompt the chat uses now, taken from the call its step generator yields."""
+    call = next(llm.smart_response_steps(user_message, context, history))
+    return call.args[0], call.args[1]
+
+
+def conversation(sessions: int):
+    """(session, message, context, history) in the order the turns reach the server."""
+    contexts = [
+        {"order": [OrderItem(item_id="m1", name="Margherita Pizza", quantity=2, price=9.5)], "total": 19.0,
+         "allergens": []},
+        {"order": [], "total": 0, "allergens": ["gluten", "nuts"]},
+        {"order": [OrderItem(item_id="m4", name="Caesar Salad", quantity=1, price=8.0)], "total": 8.0,
+         "allergens": ["dairy"]},
+    ]
+    histories = [[] for _ in range(sessions)]
+    for turn in range(len(SCRIPT)):
+        for s in range(sessions):
+            message = SCRIPT[(turn + s) % len(SCRIPT)]
+            yield s, message, contexts[s % len(contexts)], list(histories[s])
+            histories[s] += [{"role": "user", "content": message}, {"role": "assistant", "content": REPLY}]
+
+
+def full_prompts(builder, sessions: int):
+    prompts = []
+    for _, message, context, history in conversation(sessions):
+        prompt, system_prompt = builder(message, context, history)
+        prompts.append(llm._ollama_payload(prompt, system_prompt, 180)["prompt"])
+    return prompts
+
+
+def modelled(prompts, ms_per_token: float) -> dict:
+    """Single-slot prompt cache: only the part after the common prefix is evaluated."""
+    previous = ""
+    evaluated = []
+    for prompt in prompts:
+        shared = 0
+        limit = min(len(previous), len(prompt))
+        while shared < limit and previous[shared] == prompt[shared]:
+            shared += 1
+        evaluated.append(estimate_tokens(prompt[shared:]))
+        previous = prompt
+    # The very first call fills the cache in both variants; leave it out
+    steady = evaluated[1:]
+    return {
+        "prompt_tokens": statistics.mean(estimate_tokens(p) for p in prompts),
+        "evaluated": statistics.mean(steady),
+        "prefill_ms": statistics.mean(steady) * ms_per_token,
+    }
+
+
+def measured(prompts, url: str) -> dict:
+    """Stream each prompt to Ollama; time to first token and prompt_eval_count."""
+    import httpx
+
+    ttft, evaluated = [], []
+    with httpx.Client(timeout=120) as client:
+        for prompt in prompts:
+            payload = {"model": llm.MODEL, "prompt": prompt, "stream": True, "keep_alive": llm.KEEP_ALIVE,
+                       "options": {"num_predict": 8, "temperature": 0}}
+            started = time.perf_counter()
+            first = None
+            with client.stream("POST", url, json=payload) as response:
+                for line in response.iter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if first is None and chunk.get("response"):
+                        first = time.perf_counter() - started
+                    if chunk.get("done"):
+                        evaluated.append(chunk.get("prompt_eval_count", 0))
+            ttft.append((first or time.perf_counter() - started) * 1000)
+    return {
+        "prompt_tokens": statistics.mean(estimate_tokens(p) for p in prompts),
+        "evaluated": statistics.mean(evaluated[1:]),
+        "ttft_p50_ms": statistics.median(ttft[1:]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--ms-per-token", type=float, default=4.0, help="modelled CPU prefill rate")
+    parser.add_argument("--ollama", help="generate URL of a running Ollama server")
+    args = parser.parse_args()
+
+    for label, builder in (("old prompt", legacy_prompt), ("stable prefix", stable_prompt)):
+        prompts = full_prompts(builder, args.sessions)
+        if args.ollama:
+            r = measured(prompts, args.ollama)
+            print(f"{label:>13}: {len(prompts)} calls, {r['prompt_tokens']:.0f} prompt tokens, "
+                  f"{r['evaluated']:.0f} evaluated/call, TTFT p50 {r['ttft_p50_ms']:.0f} ms")
+        else:
+            r = modelled(prompts, args.ms_per_token)
+            print(f"{label:>13}: {len(prompts)} calls, {r['prompt_tokens']:.0f} prompt tokens, "
+                  f"{r['evaluated']:.0f} evaluated/call, ~{r['prefill_ms']:.0f} ms prefill/call")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Session encoding: bytes per session and encode/decode time of the binary
+codec (backend/session_codec.py) vs pydantic's model_dump_json.
+
+The session has a few order lines, a short conversation, a reservation and
+allergens, like one mid-way through a dinner booking. --history grows the
+conversation to see how both scale.
+
+Run from restaurant-assistant/:
+    python bench/session_codec_bench.py [--rounds 5000] [--history 8]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from backend.menu_catalog import get_catalog  # noqa: E402
+from backend.models import Reservation, SessionState  # noqa: E402
+from backend.orders import get_order  # noqa: E402
+from backend.session_codec import decode_session, encode_session  # noqa: E402
+
+TURNS = [
+    ("user", "Hi! Can I book a table for 4 tomorrow at 19:00?"),
+    ("assistant", "✅ Reservation confirmed for 4 people on 2025-12-15 at 19:00. Would you like to pre-order?"),
+    ("user", "Yes, 2 risotto, a caesar salad and the tiramisu please"),
+    ("assistant", "Added 2 x Truffle Mushroom Risotto, 1 x Caesar Salad and 1 x Tiramisu to your order."),
+]
+
+
+def make_session(history: int) -> SessionState:
+    state = SessionState(
+        allergens=["nuts", "shellfish"],
+        reservation=Reservation(date="2025-12-15", time="19:00", people=4, has_preorder=True),
+        summary="Booking dinner for four, one guest allergic to nuts.",
+        last_question="drink_offer",
+    )
+    items = list(get_catalog().by_id.values())[:6]
+    get_order(state).add_many([(item, 1 + i % 3) for i, item in enumerate(items)])
+    state.history = [{"role": role, "content": content} for role, content in (TURNS * history)[:history]]
+    return state
+
+
+def time_per_call(fn, arg, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(arg)
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=5000)
+    parser.add_argument("--history", type=int, default=8)
+    args = parser.parse_args()
+
+    state = make_session(args.history)
+    as_json = state.model_dump_json().encode()
+    as_binary = encode_session(state)
+    assert decode_session(as_binary).model_dump() == state.model_dump()
+
+    rows = [
+        ("model_dump_json", len(as_json),
+         time_per_call(lambda s: s.model_dump_json().encode(), state, args.rounds),
+         time_per_call(SessionState.model_validate_json, as_json, args.rounds)),
+        ("session_codec", len(as_binary),
+         time_per_call(encode_session, state, args.rounds),
+         time_per_call(decode_session, as_binary, args.rounds)),
+    ]
+    print(f"{len(state.current_order)} order lines, {len(state.history)} history messages")
+    for name, size, encode, decode in rows:
+        print(f"{name + ':':17}{size:6d} bytes, encode {encode:6.1f} µs, decode {decode:6.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Chroma vs NumPy vector store: query latency and resident memory.
+
+Each backend runs in its own subprocess so RSS numbers do not mix. Both
+index the documents from rag.build_documents() (repeated --scale times to
+try bigger corpora) and answer the same queries, with and without the
+{"type": "menu"} filter the chat uses.
+
+Embeddings come from a deterministic hashing embedder by default, so the
+numbers are the vector store's own cost; pass --model to use the real
+SentenceTransformer model instead.
+
+Run from restaurant-assistant/:
+    python bench/vector_store_bench.py [--scale 10] [--queries 500] [--model]
+"""
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+DIM = 384
+QUERIES = [
+    "vegetarian main course", "something with seafood", "gluten free dessert",
+    "what wine goes with steak", "do you have vegan options", "opening hours",
+    "is there parking", "spicy pasta", "kids menu", "cheap starter",
+]
+
+
+class HashEmbeddings:
+    """Bag-of-words hashing embedder with the same interface as LangChain's."""
+
+    def embed_query(self, text):
+        vector = [0.0] * DIM
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % DIM] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def run_backend(backend: str, scale: int, n_queries: int, use_model: bool) -> dict:
+    """Build, load and query one backend (runs inside the subprocess)."""
+    from langchain_core.documents import Document
+    from backend.rag import build_documents
+
+    if use_model:
+        from langchain_community.embeddings import SentenceTransformerEmbeddings
+        embeddings = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
+    else:
+        embeddings = HashEmbeddings()
+
+    docs = []
+    for copy in range(scale):
+        for doc in build_documents():
+            content = doc.page_content if copy == 0 else f"{doc.page_content} ({copy})"
+            docs.append(Document(page_content=content, metadata=dict(doc.metadata)))
+
+    base_rss = _rss_mb()
+    started = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmp:
+        if backend == "numpy":
+            from backend.vector_index import NumpyVectorStore
+
+            NumpyVectorStore.build(docs, embeddings).save(Path(tmp))
+            build_time = time.perf_counter() - started
+            started = time.perf_counter()
+            store = NumpyVectorStore.load(Path(tmp), embeddings, mmap=True)
+        else:
+            from langchain_community.vectorstores import Chroma
+
+            Chroma.from_documents(docs, embeddings, persist_directory=tmp, collection_name="bench")
+            build_time = time.perf_counter() - started
+            started = time.perf_counter()
+            store = Chroma(collection_name="bench", embedding_function=embeddings, persist_directory=tmp)
+        load_time = time.perf_counter() - started
+
+        timings = {}
+        for label, search_filter in (("all", None), ("menu", {"type": "menu"})):
+            samples = []
+            for i in range(n_queries):
+                query = QUERIES[i % len(QUERIES)]
+                t = time.perf_counter()
+                store.similarity_search(query, k=4, filter=search_filter)
+                samples.append((time.perf_counter() - t) * 1000)
+            timings[label] = {
+                "p50_ms": round(_percentile(samples, 0.5), 3),
+                "p95_ms": round(_percentile(samples, 0.95), 3),
+            }
+        rss = _rss_mb()
+
+    return {
+        "backend": backend,
+        "documents": len(docs),
+        "build_s": round(build_time, 3),
+        "load_ms": round(load_time * 1000, 1),
+        "query": timings,
+        "rss_mb": round(rss, 1),
+        "rss_added_mb": round(rss - base_rss, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="repeat the corpus this many times")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--model", action="store_true", help="use the real embedding model")
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.scale, args.queries, args.model)))
+        return
+
+    for backend in ("numpy", "chroma"):
+        cmd = [sys.executable, __file__, "--backend", backend, "--scale", str(args.scale),
+               "--queries", str(args.queries)] + (["--model"] if args.model else [])
+        proc = subprocess.run(cmd, capture_output=True, text=True, cwd=ROOT,
+                              env=dict(os.environ, ANONYMIZED_TELEMETRY="False"))
+        if proc.returncode != 0:
+            print(f"{backend}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+            continue
+        r = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(
+            f"{r['backend']:>6}: {r['documents']} docs, build {r['build_s']} s, load {r['load_ms']} ms, "
+            f"query p50/p95 {r['query']['all']['p50_ms']}/{r['query']['all']['p95_ms']} ms, "
+            f"filtered {r['query']['menu']['p50_ms']}/{r['query']['menu']['p95_ms']} ms, "
+            f"RSS {r['rss_mb']} MB (+{r['rss_added_mb']} MB for the backend)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -37,19 +37,50 @@ document.addEventListener("DOMContentLoaded", () => {
 
   const API_URL = "http://localhost:8000";
 
-  function addMessage(role, text) {
-    if (!chatDiv) return;
-    const div = document.createElement("div");
-    div.className = `message ${role}`;
-
+  function setMessageText(div, text) {
     if (text.includes("<") && text.includes(">")) {
       div.innerHTML = text;
     } else {
       div.textContent = text;
     }
+  }
+
+  function addMessage(role, text) {
+    if (!chatDiv) return null;
+    const div = document.createElement("div");
+    div.className = `message ${role}`;
+    setMessageText(div, text);
 
     chatDiv.appendChild(div);
     chatDiv.scrollTop = chatDiv.scrollHeight;
+    return div;
+  }
+
+  // Read Server-Sent Events from a fetch response, calling onEvent(name, data)
+  async function readEvents(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let sep;
+      while ((sep = buffer.indexOf("\n\n")) !== -1) {
+        const raw = buffer.slice(0, sep);
+        buffer = buffer.slice(sep + 2);
+
+        let event = "message";
+        let data = "";
+        raw.split("\n").forEach((line) => {
+          if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) data += line.slice(6);
+        });
+        if (data) onEvent(event, JSON.parse(data));
+      }
+    }
   }
 
   function updateOrderSummary(orders, total) {
@@ -67,6 +98,18 @@ document.addEventListener("DOMContentLoaded", () => {
     orderSummaryDiv.innerHTML = html;
   }
 
+  // The turn may have changed the order even if its reply did not arrive
+  async function refreshOrderSummary() {
+    try {
+      const res = await fetch(`${API_URL}/session/${sessionId}/order`);
+      if (!res.ok) return;
+      const data = await res.json();
+      updateOrderSummary(data.current_order, data.current_total);
+    } catch (error) {
+      console.error(error);
+    }
+  }
+
   async function sendMessage() {
     if (!msgInput) return;
     const text = msgInput.value.trim();
@@ -90,22 +133,49 @@ document.addEventListener("DOMContentLoaded", () => {
       user_allergens: allergens.length ? allergens : null,
     };
 
+    let replyDiv = null;
+    let partial = "";
+    let finished = false;
+    let errorText = "Sorry, there was an error connecting to the server.";
+
     try {
-      const res = await fetch(`${API_URL}/chat`, {
+      const res = await fetch(`${API_URL}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(body),
       });
+      if (!res.ok) {
+        errorText = "Sorry, the server could not answer right now. Please try again.";
+        throw new Error(`HTTP ${res.status}`);
+      }
 
-      const data = await res.json();
-      addMessage("assistant", data.assistant_message);
-      updateOrderSummary(data.current_order, data.current_total);
+      // Show tokens as they arrive, then replace with the final message
+      replyDiv = addMessage("assistant", "…");
+      errorText = "Sorry, the reply was interrupted. Please try again.";
+
+      await readEvents(res, (event, data) => {
+        if (event === "token") {
+          partial += data.text;
+          replyDiv.textContent = partial;
+        } else if (event === "done") {
+          finished = true;
+          setMessageText(replyDiv, data.assistant_message);
+          updateOrderSummary(data.current_order, data.current_total);
+        }
+        chatDiv.scrollTop = chatDiv.scrollHeight;
+      });
     } catch (error) {
-      addMessage(
-        "assistant",
-        "Sorry, there was an error connecting to the server."
-      );
       console.error(error);
+    } finally {
+      // No "done" event: the stream failed or ended early
+      if (!finished) {
+        if (replyDiv && !partial) {
+          replyDiv.textContent = errorText;
+        } else {
+          addMessage("assistant", errorText);
+        }
+        refreshOrderSummary();
+      }
     }
   }
 
@@ -6,17 +6,23 @@ echo "🚀 Starting AI Restaurant Assistant..."
 # Activate virtual environment
 source .venv/bin/activate
 
+# Shared secret the backend presents to the email server
+export EMAIL_SERVER_TOKEN="${EMAIL_SERVER_TOKEN:-$(python -c 'import secrets; print(secrets.token_urlsafe(32))')}"
+
 # Start MCP email server in background
 echo "📧 Starting MCP email server..."
-python backend/mcp_email_server/server.py &
+python -m backend.mcp_email_server.server &
 MCP_PID=$!
 
+# Cleanup on exit
+trap "kill $MCP_PID" EXIT
+
 # Wait a moment for MCP server to start
 sleep 2
 
+# The backend hands emails to the server instead of sending them itself
+export EMAIL_SERVER="127.0.0.1:${EMAIL_SERVER_PORT:-5000}"
+
 # Start FastAPI backend
 echo "🔧 Starting FastAPI backend..."
 uvicorn backend.main:app --reload --host 0.0.0.0 --port 8000
-
-# Cleanup on exit
-trap "kill $MCP_PID" EXIT
@@ -0,0 +1,37 @@
+"""
+In-process stand-in for a redis-py client: the get/set/delete subset that
+RedisSessionStore uses, with EX expiry. Values are stored as bytes, as a
+real server returns them.
+"""
+import time
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            del self.data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        self.data[key] = (bytes(value), time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys if self._live(key))
+
+    def ttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int(entry[1] - time.time())
@@ -0,0 +1,119 @@
+"""
+The keyword intent matcher as it was before backend.intents, kept verbatim
+as the reference for the parity test and the benchmark.
+
+Only change: the last availability check reads (state.last_question or "");
+the original raised TypeError there when no question was pending.
+"""
+import re
+
+from backend.models import SessionState
+
+
+def legacy_detect_intent(user_message: str, state: SessionState) -> str:
+    """Advanced intent detection with context."""
+    text = user_message.lower().strip()
+
+    # Clear whole order – BEFORE generic remove
+    if any(p in text for p in [
+        "delete my order", "delete order", "clear order",
+        "remove all", "cancel order", "empty basket", "empty my order"
+    ]):
+        return "clear_order"
+
+    # Negative order like "i don't want X anymore" → remove
+    if any(p in text for p in ["don't want", "dont want", "no longer want", "i dont want"]):
+        return "remove"
+
+    # Ingredients questions
+    if "ingredient" in text:
+        return "ingredients"
+
+    # Reservation status questions
+    if any(p in text for p in [
+        "do i have a reservation", "do i have reservation",
+        "my reservation", "any reservation for me"
+    ]):
+        return "reservation_status"
+
+    # Exit phrases
+    if text in ["no", "nope", "nah", "nothing", "that's all", "nothing else", "no thanks"]:
+        return "goodbye"
+
+    # Yes/affirmative
+    if text in ["yes", "yeah", "yep", "sure", "ok", "okay", "please", "yes please"]:
+        if state.last_question == "need_reservation_details":
+            return "reservation_followup"
+        return "affirmative"
+
+    # Dish information – avoid "what's the best..." questions
+    if (("what is" in text) or ("what's the" in text)) and "best" not in text:
+        return "dish_info"
+
+    # Show current order
+    if any(phrase in text for phrase in [
+        "show order", "show my order", "my order", "current order",
+        "what did i order", "what's in my order", "check my order"
+    ]):
+        return "show_order"
+
+    # Recommendations (with context)
+    if any(w in text for w in [
+        "recommend", "suggest", "best", "popular",
+        "good", "which", "legendary", "favorite", "favourite"
+    ]):
+        if any(w in text for w in ["drink", "wine", "beer", "beverage", "juice"]):
+            return "recommend_drinks"
+        if any(phrase in text for phrase in ["for my", "with my", "suit", "pair", "goes with", "match"]):
+            return "recommend_pairing"
+        return "recommend"
+
+    # Drink-specific queries
+    if any(w in text for w in ["drink", "wine", "beer", "beverage", "juice", "water"]) and \
+            any(w in text for w in ["have", "any", "do you", "is there", "what"]):
+        return "show_drinks"
+
+    # Order with numbers
+    if re.search(r'\d+', text) and any(w in text for w in ["want", "order", "add", "get", "wanna"]):
+        return "order"
+
+    has_reservation = any(w in text for w in ["book", "reserve", "reservation", "table"])
+    has_order = any(w in text for w in ["want", "order", "add", "get", "wanna"])
+
+    # Multi-intent: order + reservation
+    if has_reservation and has_order:
+        return "order_with_reservation"
+
+    # Menu
+    if any(w in text for w in ["menu", "show me", "what do you have", "see menu", "see your menu"]):
+        return "show_menu"
+
+    # Bill/checkout
+    if any(phrase in text for phrase in [
+        "bill", "pay", "checkout", "check out", "finish", "done", "get bill", "invoice"
+    ]):
+        return "bill"
+
+    # Order
+    if has_order or any(phrase in text for phrase in ["i'll have", "give me", "can i", "i would like", "i'd like"]):
+        return "order"
+
+    # Remove single item
+    if any(w in text for w in ["remove", "delete", "cancel", "take off"]):
+        return "remove"
+
+    # Allergen – only if explicit allergy words appear
+    if any(w in text for w in ["allergic", "allergy", "allergen"]) \
+       or "allergy to" in text or "allergic to" in text:
+        return "allergen"
+
+    # Reservation
+    if has_reservation:
+        return "reservation"
+
+    # Availability query
+    if any(phrase in text for phrase in ["available", "when", "which day", "what day", "what time"]):
+        if has_reservation or "reservation" in (state.last_question or ""):
+            return "reservation_info"
+
+    return "chat"
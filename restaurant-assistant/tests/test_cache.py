@@ -0,0 +1,27 @@
+"""Disk cache bounds and setup."""
+from backend.cache import DiskCache
+
+
+def test_disk_cache_creates_missing_directory(tmp_path):
+    cache = DiskCache(str(tmp_path / "not" / "there" / "cache.sqlite3"))
+    cache.set("k", "v")
+    assert cache.get("k") == "v"
+
+
+def test_disk_cache_evicts_oldest_entries(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+    for i in range(5):
+        cache.set(f"k{i}", i)
+    assert cache.stats()["size"] == 3
+    assert cache.stats()["evictions"] == 2
+    assert cache.get("k0") is None and cache.get("k1") is None
+    assert [cache.get(f"k{i}") for i in range(2, 5)] == [2, 3, 4]
+
+
+def test_disk_cache_bound_applies_on_reopen(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    big = DiskCache(path, max_entries=0)
+    for i in range(10):
+        big.set(f"k{i}", i)
+    assert DiskCache(path, max_entries=4).stats()["size"] == 4
+
@@ -0,0 +1,223 @@
+"""Outbox delivery against an in-process SMTP server: batching over one session, retry, dead letters."""
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from backend import email_outbox  # noqa: E402
+from backend.email_outbox import DEAD, Outbox, OutboxWorkers, SmtpConnection  # noqa: E402
+
+
+class SinkHandler:
+    """Accepts everything, except RCPTs to bounce@ (550) and a number of 451s on request.
+
+    Advertises PIPELINING unless told not to, so batches take the pipelined path.
+    """
+
+    def __init__(self):
+        self.delivered = []
+        self.sessions = set()
+        self.temp_failures = 0
+        self.pipelining = True
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        session.host_name = hostname
+        if self.pipelining:
+            responses.insert(-1, "250-PIPELINING")
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce@"):
+            return "550 no such user"
+        if self.temp_failures:
+            self.temp_failures -= 1
+            return "451 try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def _message(recipient):
+    return f"From: bot@example.test\r\nTo: {recipient}\r\nSubject: Bill\r\n\r\nThank you!\r\n".encode()
+
+
+class SmtpSink:
+    def __init__(self):
+        self.handler = SinkHandler()
+        self.port = _free_port()
+        self.controller = None
+
+    def start(self):
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.port)
+        self.controller.start()
+
+    def stop(self):
+        self.controller.stop()
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = SmtpSink()
+    sink.start()
+    yield sink
+    sink.stop()
+
+
+@pytest.fixture
+def outbox(tmp_path, smtp_sink, monkeypatch):
+    """An outbox with one worker pointed at the sink and near-instant retries."""
+    port = smtp_sink.port
+    monkeypatch.setattr(email_outbox, "retry_delay", lambda attempts: 0.05)
+    box = Outbox(str(tmp_path / "outbox.sqlite3"), max_attempts=3)
+    workers = OutboxWorkers(
+        box,
+        workers=1,
+        batch_size=10,
+        connection_factory=lambda: SmtpConnection("127.0.0.1", port, user="", password="",
+                                                  starttls=False),
+        poll_interval=0.05,
+    )
+    yield box, workers
+    workers.stop()
+
+
+def test_messages_share_one_smtp_session(outbox, smtp_sink):
+    handler = smtp_sink.handler
+    box, workers = outbox
+    recipients = [f"guest{i}@example.test" for i in range(8)]
+    for recipient in recipients:
+        box.enqueue("bot@example.test", recipient, _message(recipient))
+    workers.start()
+    assert _wait_for(lambda: len(handler.delivered) == len(recipients))
+
+    # A later burst goes over the session that is still open
+    box.enqueue("bot@example.test", "late@example.test", _message("late@example.test"))
+    assert _wait_for(lambda: "late@example.test" in handler.delivered)
+
+    assert sorted(handler.delivered) == sorted(recipients + ["late@example.test"])
+    assert len(handler.sessions) == 1
+    assert workers.stats()["smtp_connections"] == 1
+    assert box.stats()["pending"] == 0
+
+
+def test_temporary_failure_is_retried(outbox, smtp_sink):
+    handler = smtp_sink.handler
+    box, workers = outbox
+    handler.temp_failures = 1
+    box.enqueue("bot@example.test", "retry@example.test", _message("retry@example.test"))
+    workers.start()
+
+    assert _wait_for(lambda: "retry@example.test" in handler.delivered)
+    assert workers.stats()["retried"] == 1
+    assert workers.stats()["smtp_connections"] == 1
+
+
+def test_permanent_failure_is_dead_lettered_at_once(outbox, smtp_sink):
+    handler = smtp_sink.handler
+    box, workers = outbox
+    box.enqueue("bot@example.test", "bounce@example.test", _message("bounce@example.test"))
+    box.enqueue("bot@example.test", "ok@example.test", _message("ok@example.test"))
+    workers.start()
+
+    assert _wait_for(lambda: box.stats()["dead"] == 1 and "ok@example.test" in handler.delivered)
+    dead = box.dead_letters()
+    assert dead[0]["recipient"] == "bounce@example.test" and dead[0]["attempts"] == 1
+    assert "550" in dead[0]["error"]
+
+
+def test_reconnects_after_server_restart(outbox, smtp_sink):
+    handler = smtp_sink.handler
+    box, workers = outbox
+    box.enqueue("bot@example.test", "first@example.test", _message("first@example.test"))
+    workers.start()
+    assert _wait_for(lambda: "first@example.test" in handler.delivered)
+
+    # The kept-open session dies with the server
+    smtp_sink.stop()
+    smtp_sink.start()
+    box.enqueue("bot@example.test", "second@example.test", _message("second@example.test"))
+    assert _wait_for(lambda: "second@example.test" in handler.delivered)
+    assert box.stats()["dead"] == 0
+
+
+@pytest.mark.parametrize("pipelining", [True, False])
+def test_invalid_addresses_are_rejected_per_message(outbox, smtp_sink, pipelining):
+    handler = smtp_sink.handler
+    handler.pipelining = pipelining
+    box, workers = outbox
+    recipients = ["one@example.test", "jürgen@example.test", "two@example.test", "x@example.test\r\nRSET"]
+    for recipient in recipients:
+        box.enqueue("bot@example.test", recipient, _message("guest"))
+    workers.start()
+
+    assert _wait_for(lambda: box.stats()["dead"] == 2 and len(handler.delivered) == 2)
+    assert sorted(handler.delivered) == ["one@example.test", "two@example.test"]
+    assert all("553" in d["error"] and d["attempts"] == 1 for d in box.dead_letters())
+
+    # The worker is still running
+    box.enqueue("bot@example.test", "after@example.test", _message("after@example.test"))
+    assert _wait_for(lambda: "after@example.test" in handler.delivered)
+
+
+def test_worker_survives_unexpected_errors(outbox, smtp_sink, monkeypatch):
+    handler = smtp_sink.handler
+    box, workers = outbox
+    original = box.mark_sent
+    calls = []
+
+    def flaky_mark_sent(message_id):
+        calls.append(message_id)
+        if len(calls) == 1:
+            raise RuntimeError("disk I/O error")
+        original(message_id)
+
+    monkeypatch.setattr(box, "mark_sent", flaky_mark_sent)
+    box.lease = 0.2
+    box.enqueue("bot@example.test", "first@example.test", _message("first@example.test"))
+    workers.start()
+
+    # The failed bookkeeping leaves the message leased; it is sent again once the lease expires
+    assert _wait_for(lambda: box.stats()["pending"] + box.stats()["sending"] == 0)
+    assert workers._threads[0].is_alive()
+    assert handler.delivered == ["first@example.test", "first@example.test"]
+
+
+def test_message_that_keeps_crashing_its_worker_is_dead_lettered(outbox, smtp_sink, monkeypatch):
+    handler = smtp_sink.handler
+    box, workers = outbox
+
+    def broken_mark_sent(message_id):
+        raise RuntimeError("disk I/O error")
+
+    monkeypatch.setattr(box, "mark_sent", broken_mark_sent)
+    box.lease = 0.2
+    box.enqueue("bot@example.test", "poison@example.test", _message("poison@example.test"))
+    workers.start()
+
+    # Each claim counts as an attempt, so the lease stops handing it out after max_attempts
+    assert _wait_for(lambda: box.stats()["dead"] == 1)
+    dead = box.dead_letters()
+    assert dead[0]["attempts"] == box.max_attempts and "Lease expired" in dead[0]["error"]
+    assert handler.delivered == ["poison@example.test"] * box.max_attempts
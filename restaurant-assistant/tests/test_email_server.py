@@ -0,0 +1,167 @@
+"""Email server: a client must present the shared token before anything else."""
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from backend.email_outbox import Outbox, OutboxWorkers
+from backend.mcp_email_server import server as server_module
+from backend.mcp_email_server.client import EmailServerClient, EmailServerError, EmailServerNoReply
+from backend.mcp_email_server.server import EmailServer
+
+TOKEN = "s3cret-token"
+
+
+@pytest.fixture
+def server(tmp_path):
+    """An EmailServer on a free port, run by an event loop in a background thread."""
+    outbox = Outbox(str(tmp_path / "server.sqlite3"))
+    email_server = EmailServer(outbox, OutboxWorkers(outbox, workers=1), token=TOKEN)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    tcp_server = asyncio.run_coroutine_threadsafe(email_server.start("127.0.0.1", 0), loop).result(5)
+    port = tcp_server.sockets[0].getsockname()[1]
+    yield email_server, f"127.0.0.1:{port}"
+
+    async def shutdown():
+        tcp_server.close()
+        await tcp_server.wait_closed()
+
+    asyncio.run_coroutine_threadsafe(shutdown(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+@pytest.fixture
+def small_requests(monkeypatch):
+    """Lower the request size limit; list it before the server fixture."""
+    monkeypatch.setattr(server_module, "MAX_REQUEST_BYTES", 4096)
+
+
+class ScriptedServer:
+    """A one-connection-at-a-time TCP server that answers auth, then runs a script per request."""
+
+    def __init__(self, script):
+        self.script = script
+        self.received = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.address = "127.0.0.1:%d" % self.listener.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            with conn, conn.makefile("rb") as reader:
+                while line := reader.readline():
+                    request = json.loads(line)
+                    if request["method"] == "auth":
+                        conn.sendall(json.dumps({"id": request["id"], "result": "ok"}).encode() + b"\n")
+                        continue
+                    self.received.append(request["method"])
+                    step = self.script.pop(0)
+                    if step == "hang up":
+                        break
+                    conn.sendall(json.dumps({"id": request["id"], "result": "pong"}).encode() + b"\n")
+                    if step == "reply and hang up":
+                        break
+
+    def close(self):
+        self.listener.close()
+
+
+def test_client_with_token_can_queue_mail(server):
+    email_server, address = server
+    client = EmailServerClient(address, token=TOKEN)
+    assert client.call("ping") == "pong"
+    message_id = client.send_email("bot@example.test", "anna@example.test", b"Subject: hi\r\n\r\nhello\r\n")
+    assert email_server.outbox.stats()["pending"] == 1
+    assert message_id > 0
+    client.close()
+
+
+def test_wrong_token_is_refused(server):
+    email_server, address = server
+    client = EmailServerClient(address, token="guess")
+    with pytest.raises(EmailServerError):
+        client.send_email("bot@example.test", "anna@example.test", b"x")
+    assert email_server.outbox.stats()["pending"] == 0
+    assert email_server.rejected == 1
+
+
+def test_request_without_auth_closes_the_connection(server):
+    email_server, address = server
+    host, _, port = address.rpartition(":")
+    with socket.create_connection((host, int(port)), timeout=5) as sock:
+        request = {"jsonrpc": "2.0", "id": 1, "method": "send_email",
+                   "params": {"sender": "bot@example.test", "recipient": "a@example.test", "message": "x"}}
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        reader = sock.makefile("rb")
+        assert json.loads(reader.readline())["error"]["message"] == "Unauthorized"
+        assert reader.readline() == b""
+    assert email_server.outbox.stats()["pending"] == 0
+
+
+def test_server_requires_a_token(tmp_path):
+    outbox = Outbox(str(tmp_path / "server.sqlite3"))
+    with pytest.raises(ValueError):
+        EmailServer(outbox, OutboxWorkers(outbox), token="")
+
+
+def test_oversized_request_gets_an_error(small_requests, server):
+    email_server, address = server
+    client = EmailServerClient(address, token=TOKEN)
+    with pytest.raises(EmailServerError, match="larger than 4096"):
+        client.call("ping", padding="x" * 5000)
+    # The server hung up; the next call reconnects
+    assert client.call("ping") == "pong"
+    assert email_server.errors == 1
+    client.close()
+
+
+def test_idle_connection_closed_by_server_is_reopened():
+    scripted = ScriptedServer(["reply and hang up", "reply"])
+    client = EmailServerClient(scripted.address, token=TOKEN)
+    assert client.call("ping") == "pong"
+    time.sleep(0.05)
+    assert client.call("ping") == "pong"
+    assert scripted.received == ["ping", "ping"]
+    client.close()
+    scripted.close()
+
+
+def test_request_without_reply_is_not_sent_again():
+    scripted = ScriptedServer(["reply", "hang up", "reply"])
+    client = EmailServerClient(scripted.address, token=TOKEN)
+    assert client.call("ping") == "pong"
+    with pytest.raises(EmailServerNoReply):
+        client.send_email("bot@example.test", "anna@example.test", b"x")
+    assert scripted.received == ["ping", "send_email"]
+    client.close()
+    scripted.close()
+
+
+def test_no_reply_is_not_queued_locally_as_well(monkeypatch):
+    from email.mime.multipart import MIMEMultipart
+
+    from backend import email_service
+
+    class NoReplyClient:
+        def send_email(self, *args):
+            raise EmailServerNoReply("no reply from the email server")
+
+    queued = []
+    monkeypatch.setattr(email_service, "EMAIL_SERVER_CLIENT", NoReplyClient())
+    monkeypatch.setattr(email_service, "EMAIL_OUTBOX", True)
+    monkeypatch.setattr(email_service, "queue_email", lambda *args: queued.append(args))
+    msg = MIMEMultipart()
+    msg["From"], msg["To"] = "bot@example.test", "anna@example.test"
+    email_service._deliver(msg)
+    assert queued == []
@@ -0,0 +1,76 @@
+"""
+Deterministic answer tiers: the FAQ index and the canned handlers.
+
+POSITIVE and NEGATIVE are the calibration set for FAQ_THRESHOLD and
+FAQ_MIN_TERMS; change the defaults only together with this file.
+"""
+import pytest
+
+from backend.faq import get_faq_index
+from backend.graph_app import _fast_path_answer
+from backend.models import SessionState
+
+# Question and a fragment of the FAQ line that must answer it
+POSITIVE = [
+    ("do you take credit cards", "credit cards"),
+    ("can I pay with cash", "cash"),
+    ("is there wifi", "WiFi"),
+    ("what's the wifi password?", "WiFi"),
+    ("do you have internet", "WiFi"),
+    ("can I book a table for 25 people", "parties of 2 to 20"),
+    ("how many people can a reservation be for", "parties of 2 to 20"),
+    ("do you do takeaway", "takeaway"),
+    ("is there a discount for kids", "Children under 12"),
+    ("do children get a discount?", "Children under 12"),
+    ("are your ingredients local", "local organic farms"),
+    ("do you have vegan options", "vegan options"),
+    ("can you make it gluten-free", "gluten-free"),
+    ("can dishes be nut free", "nut-free"),
+    ("I have an allergy, what should I do", "allergies"),
+]
+
+# Questions that share a word with some FAQ line but are not answered by it
+NEGATIVE = [
+    "do you have a discount for students",
+    "do you have a senior discount",
+    "my kids love pasta",
+    "is the tiramisu available?",
+    "do kids eat free",
+    "free dessert?",
+    "local beer?",
+    "organic wine?",
+    "is the food organic",
+    "I love your food",
+    "do you have a kids menu",
+    "what payment apps",
+    "the card reader is broken",
+    "my husband has a nut allergy, is the risotto safe",
+    "can I bring my dog",
+    "tell me a joke",
+]
+
+
+@pytest.mark.parametrize("question,fragment", POSITIVE)
+def test_faq_answers_known_questions(question, fragment):
+    answer = get_faq_index().answer(question)
+    assert answer is not None and fragment in answer
+
+
+@pytest.mark.parametrize("question", NEGATIVE)
+def test_faq_leaves_other_questions_to_the_llm(question):
+    assert get_faq_index().answer(question) is None
+
+
+@pytest.mark.parametrize("question", [
+    "is the tiramisu available?",
+    "my kids love pasta",
+    "do you have a discount for students",
+    "what do you do sometimes on weekends",
+])
+def test_fast_path_falls_through(question):
+    assert _fast_path_answer(question, SessionState()) is None
+
+
+@pytest.mark.parametrize("question", ["when do you open?", "what time do you close", "opening hours please"])
+def test_fast_path_answers_hours(question):
+    assert "11:00 AM to 10:00 PM" in _fast_path_answer(question, SessionState())
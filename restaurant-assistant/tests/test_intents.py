@@ -0,0 +1,85 @@
+"""
+Parity of backend.intents.detect_intent with the old keyword matcher.
+
+The corpus is every phrase the classifier knows, alone, in pairs and inside
+sentence templates, with and without digits, across the pending-question
+states that change the result. Messages that are exact undo commands are
+left out: "undo_order" is the one intent the compiled matcher added.
+"""
+import itertools
+
+import pytest
+
+from backend.intents import AFFIRMATIVE_MESSAGES, GOODBYE_MESSAGES, UNDO_MESSAGES, _GROUPS, detect_intent
+from backend.models import SessionState
+from tests.legacy_intents import legacy_detect_intent
+
+PHRASES = sorted({phrase for group in _GROUPS for phrase in group})
+TEMPLATES = ["{}", "I {} please", "can you {} for 2 people?", "  {} 3 Pizzas  ", "what about {}"]
+LAST_QUESTIONS = [None, "need_reservation_details", "reservation_time", "drink_offer"]
+
+# Hand-checked messages and the intent both matchers must give them
+GOLDEN = [
+    ("Please clear order", "clear_order"),
+    ("I don't want the salad anymore", "remove"),
+    ("What are the ingredients of the risotto?", "ingredients"),
+    ("Do I have a reservation?", "reservation_status"),
+    ("no thanks", "goodbye"),
+    ("yes please", "affirmative"),
+    ("What is the tiramisu?", "dish_info"),
+    ("what's the best dessert", "recommend"),
+    ("show my order", "show_order"),
+    ("Can you recommend a wine?", "recommend_drinks"),
+    ("what goes with my steak, any suggestion?", "recommend_pairing"),
+    ("do you have beer", "show_drinks"),
+    ("I want 2 pizzas", "order"),
+    ("I want a steak and book a table", "order_with_reservation"),
+    ("show me the menu", "show_menu"),
+    ("I'd like to pay", "bill"),
+    ("I'll have the salmon", "order"),
+    ("take off the soup", "remove"),
+    ("I'm allergic to nuts", "allergen"),
+    ("book for 4 people on 2025-12-15 at 19:00", "reservation"),
+    ("hello there", "chat"),
+]
+
+
+def _corpus():
+    messages = set(PHRASES) | GOODBYE_MESSAGES | AFFIRMATIVE_MESSAGES
+    for phrase in PHRASES:
+        messages.update(template.format(phrase) for template in TEMPLATES)
+    for a, b in itertools.permutations(PHRASES, 2):
+        messages.add(f"{a} {b}")
+        messages.add(f"{a} and 2 {b}")
+    return sorted(m for m in messages if m.lower().strip().rstrip(".!") not in UNDO_MESSAGES)
+
+
+CORPUS = _corpus()
+
+
+@pytest.mark.parametrize("last_question", LAST_QUESTIONS)
+def test_parity_with_legacy_matcher(last_question):
+    state = SessionState(last_question=last_question)
+    mismatches = [
+        (message, legacy, new)
+        for message in CORPUS
+        if (legacy := legacy_detect_intent(message, state)) != (new := detect_intent(message, state))
+    ]
+    assert len(CORPUS) > 10000
+    assert mismatches == []
+
+
+@pytest.mark.parametrize("message,intent", GOLDEN)
+def test_golden_messages(message, intent):
+    state = SessionState()
+    assert legacy_detect_intent(message, state) == intent
+    assert detect_intent(message, state) == intent
+
+
+def test_reservation_followup_depends_on_pending_question():
+    assert detect_intent("yes", SessionState(last_question="need_reservation_details")) == "reservation_followup"
+    assert detect_intent("yes", SessionState()) == "affirmative"
+
+
+def test_undo_is_recognized():
+    assert detect_intent("Undo!", SessionState()) == "undo_order"
@@ -0,0 +1,70 @@
+"""Cancelled requests must not leak scheduler slots or single-flight entries."""
+import asyncio
+
+from backend import llm
+from backend.llm_scheduler import OllamaScheduler
+
+
+async def _cancel(task):
+    await asyncio.sleep(0.01)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def test_waiter_cancelled_in_queue_gives_up_its_place():
+    async def scenario():
+        scheduler = OllamaScheduler(max_concurrency=1, wait_budget=5)
+        assert await scheduler.acquire()
+        await _cancel(asyncio.create_task(scheduler.acquire()))
+        scheduler.release(0.1)
+        assert scheduler.active == 0
+        assert await scheduler.acquire()
+        assert scheduler.stats()["queue_depth"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_after_handover_returns_the_slot():
+    async def scenario():
+        scheduler = OllamaScheduler(max_concurrency=1, wait_budget=5)
+        assert await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0.01)
+        # Slot handed over and the waiter cancelled before it could resume
+        scheduler.release(0.1)
+        waiter.cancel()
+        try:
+            # Depending on the Python version wait_for may still report the admission
+            if await waiter:
+                scheduler.release(0.1)
+        except asyncio.CancelledError:
+            pass
+        assert scheduler.active == 0
+        for _ in range(scheduler.max_concurrency):
+            assert await scheduler.acquire()
+
+    asyncio.run(scenario())
+
+
+def test_stream_cancelled_while_queued_finishes_its_flight(monkeypatch):
+    scheduler = OllamaScheduler(max_concurrency=1, wait_budget=5)
+    monkeypatch.setattr(llm, "SCHEDULER", scheduler)
+    monkeypatch.setattr(llm, "LLM_CACHE_ENABLED", False)
+
+    async def scenario():
+        assert await scheduler.acquire()
+
+        async def consume():
+            async for _ in llm.astream_ollama("queued prompt", "system"):
+                pass
+
+        await _cancel(asyncio.create_task(consume()))
+        key = llm._cache_key("queued prompt", "system", 200)
+        assert llm.ASYNC_FLIGHT.pending(key) is None
+        scheduler.release(0.1)
+        assert scheduler.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,114 @@
+"""Circuit breaker: a half-open trial always gets a verdict."""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from backend import ollama_client
+from backend.ollama_client import CircuitBreaker
+
+
+def _stream_handler(request):
+    lines = [json.dumps({"response": word, "done": False}) for word in ("a", "b", "c")]
+    return httpx.Response(200, content="\n".join(lines).encode())
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """A breaker that has just cooled down, and a mocked Ollama."""
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    monkeypatch.setattr(ollama_client, "BREAKER", breaker)
+
+    def use(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(ollama_client, "_ASYNC_CLIENT", client)
+        return client
+
+    return breaker, use
+
+
+def test_trial_stream_closed_early_reopens_breaker(half_open):
+    breaker, use = half_open
+    use(_stream_handler)
+
+    async def consume_one():
+        stream = ollama_client.astream_generate({"prompt": "hi"})
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(consume_one())
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.allow()
+
+
+def test_trial_with_bad_body_reopens_breaker(half_open):
+    breaker, use = half_open
+    use(lambda request: httpx.Response(200, content=b"not json"))
+
+    assert asyncio.run(ollama_client.agenerate({"prompt": "hi"})) is None
+    assert breaker.state == "open"
+    assert not breaker._trial_in_flight
+
+
+def test_bad_stream_line_ends_stream_and_reopens_breaker(half_open):
+    breaker, use = half_open
+    lines = [json.dumps({"response": "a", "done": False}), "{not json"]
+    use(lambda request: httpx.Response(200, content="\n".join(lines).encode()))
+
+    async def consume_all():
+        return [chunk async for chunk in ollama_client.astream_generate({"prompt": "hi"})]
+
+    assert asyncio.run(consume_all()) == [{"response": "a", "done": False}]
+    assert breaker.state == "open"
+
+
+def test_blocking_generate_with_bad_body_returns_none(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    monkeypatch.setattr(ollama_client, "BREAKER", breaker)
+
+    class BadBody:
+        status_code = 200
+
+        def json(self):
+            return json.loads("not json")
+
+    monkeypatch.setattr(ollama_client.SESSION, "post", lambda *args, **kwargs: BadBody())
+    assert ollama_client.generate({"prompt": "hi"}) is None
+    assert breaker.state == "open"
+
+
+def test_cancelled_trial_reopens_breaker(half_open):
+    breaker, use = half_open
+
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    use(slow)
+
+    async def cancel_trial():
+        task = asyncio.create_task(ollama_client.agenerate({"prompt": "hi"}))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_trial())
+    assert breaker.state == "open"
+
+
+def test_completed_trial_closes_breaker(half_open):
+    breaker, use = half_open
+    use(_stream_handler)
+
+    async def consume_all():
+        return [chunk async for chunk in ollama_client.astream_generate({"prompt": "hi"})]
+
+    assert len(asyncio.run(consume_all())) == 3
+    assert breaker.state == "closed"
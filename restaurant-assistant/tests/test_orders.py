@@ -0,0 +1,156 @@
+"""Order aggregate: Decimal totals and an undo log that survives the session stores."""
+from decimal import Decimal
+
+import pytest
+
+from backend.graph_app import run_turn
+from backend.menu_catalog import get_catalog
+from backend.models import SessionState
+from backend.orders import UNDO_DEPTH, get_order
+from backend.session_codec import decode_session, encode_session
+from tests.test_session_store import BACKENDS, make_store
+
+
+def _items(*names):
+    catalog = get_catalog()
+    return [catalog.get_by_name(name) for name in names]
+
+
+def test_totals_are_exact():
+    state = SessionState()
+    order = get_order(state)
+    salad, = _items("Caesar Salad")
+    for _ in range(30):
+        order.add(salad)
+    assert order.subtotal == Decimal(str(salad["price"])) * 30
+    assert state.current_total == float(order.subtotal)
+
+
+def test_undo_reverts_each_kind_of_change():
+    state = SessionState()
+    order = get_order(state)
+    salad, tiramisu = _items("Caesar Salad", "Tiramisu")
+    order.add_many([(salad, 2), (tiramisu, 1)])
+    order.set_quantity(salad["id"], 5)
+    order.remove(tiramisu["id"])
+    order.clear()
+
+    snapshots = []
+    while order.undo():
+        snapshots.append([(line.name, line.quantity) for line in state.current_order])
+    assert snapshots == [
+        [("Caesar Salad", 5)],
+        [("Caesar Salad", 5), ("Tiramisu", 1)],
+        [("Caesar Salad", 2), ("Tiramisu", 1)],
+        [],
+    ]
+    assert state.current_total == 0.0
+
+
+def test_undo_log_is_bounded():
+    state = SessionState()
+    order = get_order(state)
+    salad, = _items("Caesar Salad")
+    for _ in range(UNDO_DEPTH + 5):
+        order.add(salad)
+    assert len(state.order_undo) == UNDO_DEPTH
+
+
+def test_codec_round_trips_the_undo_log():
+    state = SessionState()
+    order = get_order(state)
+    salad, tiramisu = _items("Caesar Salad", "Tiramisu")
+    order.add_many([(salad, 2), (tiramisu, 1)])
+    order.remove(salad["id"])
+
+    loaded = decode_session(encode_session(state))
+    assert loaded.order_undo == state.order_undo
+    assert get_order(loaded).undo()
+    assert [(line.name, line.quantity) for line in loaded.current_order] == [("Caesar Salad", 2), ("Tiramisu", 1)]
+
+
+def test_codec_reads_version_1_sessions():
+    data = bytearray(encode_session(SessionState(allergens=["nuts"])))
+    data[0] = 1
+    assert decode_session(bytes(data)).allergens == ["nuts"]
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_undo_on_a_later_turn(kind, tmp_path):
+    store = make_store(kind, tmp_path)
+    store.set("s", SessionState())
+
+    for message in ["I want 2 tiramisu", "undo"]:
+        state, answer = run_turn(store.get("s"), message)
+        store.set("s", state)
+
+    assert "nothing to undo" not in answer
+    assert store.get("s").current_order == []
+    assert store.get("s").current_total == 0.0
+
+
+def test_dish_list_without_order_verb_is_ordered():
+    state, answer = run_turn(SessionState(), "2 risotto, a caesar salad and 3 lemonades")
+    assert [(line.name, line.quantity) for line in state.current_order] == [
+        ("Truffle Mushroom Risotto", 2),
+        ("Caesar Salad", 1),
+    ]
+    assert "lemonades" in answer
+    # One undo takes back the whole list
+    state, answer = run_turn(state, "undo")
+    assert state.current_order == []
+
+
+@pytest.mark.parametrize("message", [
+    "what is in the risotto and the caesar salad?",
+    "the tiramisu and the lava cake look great",
+])
+def test_questions_about_several_dishes_are_not_orders(message, monkeypatch):
+    from backend import graph_app
+
+    def no_llm(*args):
+        return "They are both lovely."
+        yield
+
+    monkeypatch.setattr(graph_app, "smart_response_steps", no_llm)
+    state, _ = run_turn(SessionState(), message)
+    assert state.current_order == []
+
+
+def test_vat_label_follows_the_configured_rate(monkeypatch):
+    from backend import orders
+    from backend.agents import get_order_summary
+
+    monkeypatch.setattr(orders, "VAT_RATE", Decimal("0.2"))
+    state = SessionState()
+    get_order(state).add(_items("Tiramisu")[0])
+    assert orders.vat_label() == "VAT (20%)"
+    assert "VAT (20%)" in get_order_summary(state)
+
+
+def test_go_back_is_not_an_undo():
+    from backend.intents import detect_intent
+
+    assert detect_intent("go back", SessionState()) != "undo_order"
+
+
+def test_dish_list_is_parsed_once(monkeypatch):
+    from backend import graph_app
+
+    calls = []
+    parse = graph_app.extract_order_items_ai
+
+    def counting(*args):
+        calls.append(args[0])
+        return parse(*args)
+
+    monkeypatch.setattr(graph_app, "extract_order_items_ai", counting)
+    run_turn(SessionState(), "2 risotto, a caesar salad and 3 lemonades")
+    assert len(calls) == 1
+
+
+def test_dishes_named_with_a_booking_are_reported_not_ordered():
+    state, answer = run_turn(SessionState(), "a table for 2 and 2 risotto")
+    # The booking path does not take orders; the reply says the dish was not added
+    assert state.current_order == []
+    assert "haven't added 2 x Truffle Mushroom Risotto" in answer
@@ -0,0 +1,103 @@
+"""Shared retriever: a runtime edit to menu.json or faq.txt is re-indexed."""
+import json
+import os
+import zlib
+
+import pytest
+
+from backend import rag
+from backend.cache import LRUCache
+
+MENU = [
+    {"id": "m1", "name": "Truffle Risotto", "price": 18.0, "description": "Creamy arborio rice with truffle"},
+    {"id": "m2", "name": "Caesar Salad", "price": 11.0, "description": "Romaine, parmesan and croutons"},
+]
+FAQ = ["We are open from 11:00 to 22:00 every day.", "We accept cards and cash."]
+
+
+class WordEmbeddings:
+    """Hashed bag of words; counts the documents it embeds."""
+
+    def __init__(self):
+        self.embedded = []
+
+    def _vector(self, text):
+        vector = [0.0] * 64
+        for word in rag.normalize_query(text).split():
+            vector[zlib.crc32(word.encode()) % 64] += 1.0
+        return vector
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _write(path, text):
+    # Bump the mtime explicitly so a fast rewrite is always noticed
+    stamp = path.stat().st_mtime_ns + 1_000_000 if path.exists() else None
+    path.write_text(text, encoding="utf-8")
+    if stamp is not None:
+        os.utime(path, ns=(stamp, stamp))
+
+
+def _write_menu(path, items):
+    _write(path, json.dumps({"menu_items": items}))
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    """A NumPy-backed shared retriever over a menu and FAQ in tmp_path."""
+    menu_path, faq_path = tmp_path / "menu.json", tmp_path / "faq.txt"
+    _write_menu(menu_path, MENU)
+    _write(faq_path, "\n".join(FAQ))
+    embeddings = WordEmbeddings()
+
+    monkeypatch.setattr(rag, "MENU_PATH", menu_path)
+    monkeypatch.setattr(rag, "FAQ_PATH", faq_path)
+    monkeypatch.setattr(rag, "NUMPY_INDEX_DIR", tmp_path / "index")
+    monkeypatch.setattr(rag, "RAG_BACKEND", "numpy")
+    monkeypatch.setattr(rag, "BATCH_SIZE", 1)
+    monkeypatch.setattr(rag, "_embedding_model", lambda: embeddings)
+    monkeypatch.setattr(rag, "EMBEDDING_BATCHER", None)
+    monkeypatch.setattr(rag, "INDEX_VERSION", None)
+    monkeypatch.setattr(rag, "RESULT_CACHE", LRUCache(16))
+    monkeypatch.setattr(rag, "_SHARED", None)
+    monkeypatch.setattr(rag, "_SHARED_MTIMES", None)
+    rag.QUERY_CACHE.clear()
+    return menu_path, faq_path, embeddings
+
+
+def test_menu_edit_is_reindexed_without_restart(corpus):
+    menu_path, _, embeddings = corpus
+    docs = rag.get_shared_retriever().invoke("truffle risotto")
+    assert "€18.00" in docs[0].page_content
+    assert len(embeddings.embedded) == len(MENU) + len(FAQ)
+
+    _write_menu(menu_path, [{**MENU[0], "price": 21.0}, MENU[1]])
+    docs = rag.get_shared_retriever().invoke("truffle risotto")
+    assert "€21.00" in docs[0].page_content
+    # Only the changed dish was embedded again
+    assert len(embeddings.embedded) == len(MENU) + len(FAQ) + 1
+
+
+def test_unchanged_corpus_keeps_the_retriever(corpus):
+    assert rag.get_shared_retriever() is rag.get_shared_retriever()
+
+
+def test_corpus_change_drops_cached_results(corpus):
+    _, faq_path, _ = corpus
+    question = "When are you open?"
+    first = rag.retrieve(question)
+    assert rag.retrieve(question) is first
+    assert rag.RESULT_CACHE.hits == 1
+    old_version = rag.INDEX_VERSION
+
+    _write(faq_path, "\n".join(["We are open from 12:00 to 23:00 every day.", FAQ[1]]))
+    docs = rag.retrieve(question)
+    assert docs is not first
+    assert rag.INDEX_VERSION != old_version
+    assert any("12:00 to 23:00" in doc.page_content for doc in docs)
+    assert not any("11:00 to 22:00" in doc.page_content for doc in docs)
@@ -0,0 +1,79 @@
+"""Binary session codec: round trips, versioning and menu changes."""
+from types import SimpleNamespace
+
+import pytest
+
+from backend import session_codec
+from backend.graph_app import run_turn
+from backend.menu_catalog import get_catalog
+from backend.models import OrderItem, Reservation, SessionState
+from backend.orders import MAX_QUANTITY, get_order
+from backend.session_codec import FORMAT_VERSION, decode_session, encode_session
+
+
+def _round_trip(state):
+    return decode_session(encode_session(state))
+
+
+def test_empty_state():
+    assert _round_trip(SessionState()) == SessionState()
+
+
+def test_unicode_strings():
+    state = SessionState(
+        summary="Gäste möchten Crème brûlée 🍮",
+        allergens=["sésame", "乳製品"],
+        history=[{"role": "user", "content": "¿Tienen paella? 🥘"}, {"role": "tool", "content": "—"}],
+        reservation=Reservation(date="2025-12-15", time="19:00", people=4, has_preorder=True),
+        last_question="drink_offer",
+    )
+    assert _round_trip(state) == state
+
+
+def test_large_history():
+    history = [
+        {"role": ("user", "assistant")[i % 2], "content": f"message {i} " + "x" * (i % 300)}
+        for i in range(5000)
+    ]
+    state = SessionState(history=history)
+    assert _round_trip(state) == state
+
+
+def test_off_menu_lines_are_kept_in_full():
+    state = SessionState(current_order=[OrderItem(item_id="gone", name="Old Special", quantity=2, price=9.5)],
+                         current_total=19.0)
+    assert _round_trip(state) == state
+
+
+def test_unknown_version_byte():
+    data = bytearray(encode_session(SessionState()))
+    data[0] = FORMAT_VERSION + 1
+    with pytest.raises(ValueError, match="Unknown session format version"):
+        decode_session(bytes(data))
+
+
+def test_legacy_json_sessions_still_decode():
+    state = SessionState(allergens=["nuts"])
+    assert decode_session(state.model_dump_json().encode()) == state
+
+
+def test_dropped_lines_leave_the_total(monkeypatch):
+    catalog = get_catalog()
+    salad, tiramisu = catalog.get_by_name("Caesar Salad"), catalog.get_by_name("Tiramisu")
+    state = SessionState()
+    get_order(state).add_many([(salad, 2), (tiramisu, 1)])
+    data = encode_session(state)
+
+    # Salad leaves the menu before the session is loaded again
+    by_id = {item_id: item for item_id, item in catalog.by_id.items() if item_id != salad["id"]}
+    monkeypatch.setattr(session_codec, "get_catalog", lambda: SimpleNamespace(by_id=by_id))
+    loaded = decode_session(data)
+    assert [line.name for line in loaded.current_order] == ["Tiramisu"]
+    assert loaded.current_total == tiramisu["price"]
+
+
+def test_huge_quantity_is_capped_and_saved():
+    state, answer = run_turn(SessionState(), "add 5000000000 risotto")
+    assert [line.quantity for line in state.current_order] == [MAX_QUANTITY]
+    assert f"at most {MAX_QUANTITY}" in answer
+    assert _round_trip(state).current_order == state.current_order
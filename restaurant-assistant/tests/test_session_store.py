@@ -0,0 +1,105 @@
+"""Every session store backend keeps, refreshes, expires and deletes sessions the same way."""
+import asyncio
+import time
+
+import pytest
+
+from backend.models import OrderItem, Reservation, SessionState
+from backend.session_store import (
+    REDIS_PREFIX,
+    MemorySessionStore,
+    RedisSessionStore,
+    SessionStore,
+    SqliteSessionStore,
+)
+from tests.fake_redis import FakeRedis
+
+BACKENDS = ["memory", "memory-compact", "sqlite", "redis"]
+
+
+def make_store(kind, tmp_path, ttl=60.0):
+    if kind == "memory":
+        return MemorySessionStore(maxsize=100, ttl=ttl, compact=False)
+    if kind == "memory-compact":
+        return MemorySessionStore(maxsize=100, ttl=ttl, compact=True)
+    if kind == "sqlite":
+        return SqliteSessionStore(str(tmp_path / "sessions.sqlite3"), ttl=ttl)
+    return RedisSessionStore(ttl=ttl, client=FakeRedis())
+
+
+def sample_state():
+    state = SessionState(allergens=["nuts"], last_question="drink_offer", summary="likes spicy food")
+    state.current_order = [OrderItem(item_id="m1", name="Caesar Salad", quantity=2, price=12.5)]
+    state.current_total = 25.0
+    state.reservation = Reservation(date="2025-12-15", time="19:00", people=4)
+    state.history = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "Hello!"}]
+    return state
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class Partial(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_round_trip_and_delete(kind, tmp_path):
+    store = make_store(kind, tmp_path)
+    state = sample_state()
+    assert store.get("s1") is None
+
+    store.set("s1", state)
+    loaded = store.get("s1")
+    assert loaded.model_dump() == state.model_dump()
+
+    assert store.delete("s1") is True
+    assert store.get("s1") is None
+    assert store.delete("s1") is False
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_sessions_expire(kind, tmp_path):
+    store = make_store(kind, tmp_path, ttl=1)
+    store.set("s1", sample_state())
+    time.sleep(1.1)
+    assert store.get("s1") is None
+
+
+@pytest.mark.parametrize("kind", BACKENDS)
+def test_async_methods(kind, tmp_path):
+    store = make_store(kind, tmp_path)
+
+    async def scenario():
+        await store.aset("s1", sample_state())
+        assert (await store.aget("s1")).allergens == ["nuts"]
+        assert await store.adelete("s1")
+
+    asyncio.run(scenario())
+
+
+def test_memory_store_evicts_least_recent(tmp_path):
+    store = MemorySessionStore(maxsize=2, ttl=60, compact=False)
+    for sid in ("a", "b", "c"):
+        store.set(sid, SessionState())
+    assert store.get("a") is None
+    assert store.get("c") is not None
+
+
+def test_redis_store_refreshes_expiry_on_save():
+    client = FakeRedis()
+    store = RedisSessionStore(ttl=600, client=client)
+    store.set("s1", sample_state())
+    assert 590 < client.ttl(REDIS_PREFIX + "s1") <= 600
+    assert isinstance(client.get(REDIS_PREFIX + "s1"), bytes)
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    SqliteSessionStore(path).set("s1", sample_state())
+    assert SqliteSessionStore(path).get("s1").last_question == "drink_offer"
@@ -0,0 +1,58 @@
+"""AsyncSingleFlight: one caller leaving must not abort the others."""
+import asyncio
+
+import pytest
+
+from backend.singleflight import AsyncSingleFlight
+
+
+def test_waiters_share_leader_result():
+    flight = AsyncSingleFlight()
+    calls = 0
+
+    async def factory():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def run():
+        return await asyncio.gather(*(flight.do("k", factory) for _ in range(3)))
+
+    assert asyncio.run(run()) == ["answer"] * 3
+    assert calls == 1
+    assert flight.stats() == {"leaders": 1, "shared": 2, "in_flight": 0}
+
+
+def test_cancelled_leader_resolves_waiters_with_none():
+    flight = AsyncSingleFlight()
+
+    async def slow():
+        await asyncio.sleep(10)
+        return "answer"
+
+    async def run():
+        leader = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await waiter
+
+    assert asyncio.run(run()) is None
+
+
+def test_leader_error_reaches_waiters():
+    flight = AsyncSingleFlight()
+
+    async def broken():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def run():
+        return await asyncio.gather(flight.do("k", broken), flight.do("k", broken), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)